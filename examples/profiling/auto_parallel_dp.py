@@ -0,0 +1,82 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates
+# Times the inter-op DP of the auto-parallelization on deep models, comparing
+# the pure-Python inner loop, its vectorized NumPy equivalent, and the
+# numba-compiled loop (if numba is installed). Stage costs are random and
+# memory is unbounded, so that only the DP itself is measured.
+#
+# Run command:
+# python auto_parallel_dp.py --layers 48 64 96 --python_max_layers 48
+
+import argparse
+import time
+
+import numpy as np
+
+from pippy.auto_parallelization import (
+    get_possible_submesh_shapes,
+    HAS_NUMBA,
+    inter_op_dp,
+    inter_op_dp_inner_loop,
+    inter_op_dp_inner_loop_numpy,
+    SubmeshSpace,
+)
+
+
+def time_dp(args, n_layers, inner_loop):
+    submesh_shapes = get_possible_submesh_shapes(
+        args.n_compute_nodes, args.n_devices_per_node, SubmeshSpace.ALL
+    )
+    rng = np.random.RandomState(42)
+    intra_costs = rng.rand(n_layers, n_layers, len(submesh_shapes), 1)
+    max_n_succ_stages = np.full(intra_costs.shape, 4096)
+    start = time.time()
+    assignments = inter_op_dp(
+        n_layers,
+        args.n_compute_nodes * args.n_devices_per_node,
+        args.n_microbatches,
+        submesh_shapes,
+        intra_costs,
+        max_n_succ_stages,
+        inner_loop=inner_loop,
+    )
+    return time.time() - start, assignments
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--layers", type=int, nargs="+", default=[48, 64, 80, 96]
+    )
+    parser.add_argument("--n_compute_nodes", type=int, default=2)
+    parser.add_argument("--n_devices_per_node", type=int, default=4)
+    parser.add_argument("--n_microbatches", type=int, default=16)
+    # The pure-Python loop takes minutes beyond that
+    parser.add_argument("--python_max_layers", type=int, default=48)
+    args = parser.parse_args(args)
+
+    paths = {"numpy": inter_op_dp_inner_loop_numpy}
+    if HAS_NUMBA:
+        paths["python"] = inter_op_dp_inner_loop.py_func
+        paths["numba"] = inter_op_dp_inner_loop
+        # Compile ahead of the timed runs
+        time_dp(args, 4, inter_op_dp_inner_loop)
+    else:
+        paths["python"] = inter_op_dp_inner_loop
+
+    print(f"{'layers':>8} {'path':>8} {'time (s)':>10} {'stages':>8}")
+    for n_layers in args.layers:
+        reference = None
+        for path, inner_loop in paths.items():
+            if path == "python" and n_layers > args.python_max_layers:
+                continue
+            elapsed, assignments = time_dp(args, n_layers, inner_loop)
+            print(
+                f"{n_layers:>8} {path:>8} {elapsed:>10.2f} {len(assignments):>8}"
+            )
+            if reference is None:
+                reference = assignments
+            assert assignments == reference, f"{path} disagrees with numpy"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates
+# Reports per-stage compute vs exposed communication time of the c10d
+# PipelineStage, with and without posting the recvs of the next chunk ahead of
+# the current chunk's compute.
+#
+# Run command:
+# torchrun --nproc-per-node 4 c10d_overlap.py
+
+import argparse
+import os
+
+import torch
+import torch.distributed as dist
+
+from pippy.compile import compile_stage
+from pippy.IR import pipe_split
+
+
+d_hid = 1024
+chunk_size = 128
+
+
+class ExampleCode(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.lin0 = torch.nn.Linear(d_hid, d_hid)
+        self.lin1 = torch.nn.Linear(d_hid, d_hid)
+        self.lin2 = torch.nn.Linear(d_hid, d_hid)
+        self.lin3 = torch.nn.Linear(d_hid, d_hid)
+        self.mse_loss = torch.nn.MSELoss(reduction="sum")
+
+    def forward(self, x, target):
+        x = torch.relu(self.lin0(x))
+        pipe_split()
+        x = torch.relu(self.lin1(x))
+        pipe_split()
+        x = torch.relu(self.lin2(x))
+        pipe_split()
+        x = self.lin3(x)
+        return {"loss": self.mse_loss(x, target)}
+
+
+def run_worker(args):
+    torch.manual_seed(0)
+    ec = ExampleCode().to(args.device)
+    x = torch.randn(args.chunks * chunk_size, d_hid, device=args.device)
+    target = torch.randn(args.chunks * chunk_size, d_hid, device=args.device)
+
+    for overlap_p2p in [False, True]:
+        stage = compile_stage(
+            ec,
+            args.rank,
+            args.world_size,
+            args.chunks,
+            args.device,
+            None,
+            [x, target],
+            schedule=args.schedule,
+            overlap_p2p=overlap_p2p,
+        )
+        totals = dict.fromkeys(stage.step_timing, 0.0)
+        for i in range(args.warmup + args.iters):
+            if args.rank == 0:
+                stage(x)
+            elif args.rank == args.world_size - 1:
+                stage(target)
+            else:
+                stage()
+            if i >= args.warmup:
+                for k, v in stage.step_timing.items():
+                    totals[k] += v
+            dist.barrier()
+
+        print(
+            f"[rank {args.rank}] overlap={overlap_p2p!s:<5} "
+            + " ".join(
+                f"{k}={v / args.iters * 1e3:.2f}ms" for k, v in totals.items()
+            )
+        )
+        dist.barrier()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--world_size", type=int, default=int(os.getenv("WORLD_SIZE", 4))
+    )
+    parser.add_argument("--rank", type=int, default=int(os.getenv("RANK", -1)))
+    parser.add_argument(
+        "--cuda", type=int, default=int(torch.cuda.is_available())
+    )
+    parser.add_argument("--chunks", type=int, default=8)
+    parser.add_argument(
+        "--schedule", type=str, default="1F1B", choices=["FillDrain", "1F1B"]
+    )
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--iters", type=int, default=5)
+    args = parser.parse_args(args)
+
+    if args.cuda:
+        dev_id = args.rank % torch.cuda.device_count()
+        args.device = torch.device(f"cuda:{dev_id}")
+    else:
+        args.device = torch.device("cpu")
+
+    backend = "nccl" if args.cuda else "gloo"
+    dist.init_process_group(
+        backend=backend,
+        rank=args.rank,
+        world_size=args.world_size,
+    )
+
+    run_worker(args)
+
+
+if __name__ == "__main__":
+    main()
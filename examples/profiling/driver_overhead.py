@@ -0,0 +1,134 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates
+# Measures root-side dispatch overhead of the RPC pipeline driver, comparing the
+# precompiled static schedule with per-microbatch RemoteInterpreters, and with
+# fused dispatch (one `invoke_many` RPC per stage per step).
+#
+# Run command:
+# python driver_overhead.py --world_size 4 --cuda 0
+
+import argparse
+import os
+import time
+
+import torch
+
+from pippy import run_pippy
+from pippy.IR import pipe_split, Pipe, TrivialLossWrapper
+from pippy.PipelineDriver import PipelineDriver1F1B, PipelineDriverFillDrain
+
+
+schedules = {
+    "FillDrain": PipelineDriverFillDrain,
+    "1F1B": PipelineDriver1F1B,
+}
+
+d_hid = 16
+
+
+class ExampleCode(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.lin0 = torch.nn.Linear(d_hid, d_hid)
+        self.lin1 = torch.nn.Linear(d_hid, d_hid)
+        self.lin2 = torch.nn.Linear(d_hid, d_hid)
+        self.lin3 = torch.nn.Linear(d_hid, d_hid)
+
+    def forward(self, x):
+        x = self.lin0(x)
+        pipe_split()
+        x = self.lin1(x)
+        pipe_split()
+        x = self.lin2(x)
+        pipe_split()
+        x = self.lin3(x)
+        return x
+
+
+def time_steps(driver, x, target, n_iters):
+    # Time spent issuing work, i.e. until the driver starts waiting for outputs
+    dispatch_times = []
+    step_start = 0.0
+    fetch_output_values = driver._fetch_output_values
+
+    def timed_fetch(output_vals):
+        dispatch_times.append(time.time() - step_start)
+        return fetch_output_values(output_vals)
+
+    driver._fetch_output_values = timed_fetch
+
+    step_times = []
+    for _ in range(n_iters):
+        step_start = time.time()
+        driver(x, target)
+        step_times.append(time.time() - step_start)
+
+    driver._fetch_output_values = fetch_output_values
+    return sum(dispatch_times) / n_iters, sum(step_times) / n_iters
+
+
+def run_master(_, args):
+    torch.manual_seed(42)
+    ec = ExampleCode()
+    ec.to(args.device)
+    wrapper = TrivialLossWrapper(ec, torch.nn.MSELoss(reduction="sum"))
+    ec_pipe = Pipe.from_tracing(wrapper)
+
+    print(
+        f"{'chunks':>8} {'mode':>12} {'dispatch (ms)':>14} {'step (ms)':>10}"
+    )
+    for chunks in args.chunks:
+        x = torch.randn(chunks, d_hid, device=args.device)
+        target = torch.randn(chunks, d_hid, device=args.device)
+        for mode, static_schedule, fused_dispatch in [
+            ("interpreter", False, False),
+            ("static", True, False),
+            ("fused", True, True),
+        ]:
+            driver = schedules[args.schedule](
+                ec_pipe,
+                chunks,
+                args.world_size,
+                static_schedule=static_schedule,
+                fused_dispatch=fused_dispatch,
+            )
+            # Warm up, also compiles the static schedule
+            time_steps(driver, x, target, 1)
+            dispatch, step = time_steps(driver, x, target, args.iters)
+            print(
+                f"{chunks:>8} {mode:>12} {dispatch * 1e3:>14.2f} {step * 1e3:>10.2f}"
+            )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--world_size", type=int, default=int(os.getenv("WORLD_SIZE", 4))
+    )
+    parser.add_argument("--rank", type=int, default=int(os.getenv("RANK", -1)))
+    parser.add_argument(
+        "--master_addr", type=str, default=os.getenv("MASTER_ADDR", "localhost")
+    )
+    parser.add_argument(
+        "--master_port", type=str, default=os.getenv("MASTER_PORT", "29500")
+    )
+    parser.add_argument(
+        "-s",
+        "--schedule",
+        type=str,
+        default="FillDrain",
+        choices=schedules.keys(),
+    )
+    parser.add_argument(
+        "--cuda", type=int, default=int(torch.cuda.is_available())
+    )
+    parser.add_argument(
+        "--chunks", type=int, nargs="+", default=[32, 64, 128]
+    )
+    parser.add_argument("--iters", type=int, default=5)
+    args = parser.parse_args(args)
+
+    run_pippy(run_master, args)
+
+
+if __name__ == "__main__":
+    main()
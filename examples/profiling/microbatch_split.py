@@ -0,0 +1,63 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates
+# Measures the cost of splitting HF-style nested kwargs into microbatches,
+# with the chunk plan compiled on every step ("cold") and reused from the
+# cache ("cached").
+#
+# Run command:
+# python microbatch_split.py --chunks 8 32 128 --layers 24
+
+import argparse
+import time
+
+import torch
+
+from pippy.microbatch import _build_chunk_plan, split_args_kwargs_into_chunks
+
+
+def make_kwargs(batch_size, seq_len, layers):
+    # Mimics the inputs of a decoder with a KV cache
+    return {
+        "input_ids": torch.randint(0, 1000, (batch_size, seq_len)),
+        "attention_mask": torch.ones(batch_size, seq_len),
+        "position_ids": torch.arange(seq_len).expand(batch_size, seq_len),
+        "past_key_values": [
+            (
+                torch.randn(batch_size, 4, seq_len, 8),
+                torch.randn(batch_size, 4, seq_len, 8),
+            )
+            for _ in range(layers)
+        ],
+        "use_cache": True,
+        "output_attentions": False,
+    }
+
+
+def time_split(kwargs, chunks, iters, cached):
+    start = time.time()
+    for _ in range(iters):
+        if not cached:
+            _build_chunk_plan.cache_clear()
+        split_args_kwargs_into_chunks((), kwargs, chunks)
+    return (time.time() - start) / iters
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, nargs="+", default=[8, 32, 128])
+    parser.add_argument("--layers", type=int, default=24)
+    parser.add_argument("--seq_len", type=int, default=16)
+    parser.add_argument("--iters", type=int, default=20)
+    args = parser.parse_args(args)
+
+    print(f"{'chunks':>8} {'cold (ms)':>10} {'cached (ms)':>12}")
+    for chunks in args.chunks:
+        kwargs = make_kwargs(chunks, args.seq_len, args.layers)
+        # Warm up
+        split_args_kwargs_into_chunks((), kwargs, chunks)
+        cold = time_split(kwargs, chunks, args.iters, cached=False)
+        cached = time_split(kwargs, chunks, args.iters, cached=True)
+        print(f"{chunks:>8} {cold * 1e3:>10.2f} {cached * 1e3:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
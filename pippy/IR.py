@@ -1,8 +1,13 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates
 import copy
+import functools
+import hashlib
+import inspect
 import logging
 import operator
 import os
+import pickle
+import tempfile
 import threading
 from enum import Enum
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
@@ -535,6 +540,158 @@ class QualnameMapMixin:
         return self.new_to_old_qualname_mapping[qualname]
 
 
+# Bump when the layout of cached pipes changes
+_PIPE_CACHE_VERSION = 1
+
+
+def _describe_for_cache(obj, depth: int = 0) -> str:
+    """
+    Stable description of a value configuring the pipe (split policy, tracer
+    arguments, ...) for cache keys: tensors are described by their shape and
+    dtype, functions by their code and closure
+    """
+    if depth > 8:
+        return "..."
+    if obj is None or isinstance(obj, (bool, int, float, str, Enum)):
+        return repr(obj)
+    if isinstance(obj, torch.Tensor):
+        return f"Tensor({list(obj.shape)}, {obj.dtype})"
+    if isinstance(obj, (list, tuple)):
+        items = ", ".join(_describe_for_cache(v, depth + 1) for v in obj)
+        return f"{type(obj).__name__}({items})"
+    if isinstance(obj, dict):
+        items = ", ".join(
+            f"{_describe_for_cache(k, depth + 1)}: "
+            f"{_describe_for_cache(v, depth + 1)}"
+            for k, v in obj.items()
+        )
+        return f"dict({items})"
+    if isinstance(obj, functools.partial):
+        return (
+            f"partial({_describe_for_cache(obj.func, depth + 1)}, "
+            f"{_describe_for_cache(obj.args, depth + 1)}, "
+            f"{_describe_for_cache(obj.keywords, depth + 1)})"
+        )
+    if inspect.isfunction(obj):
+        closure = [cell.cell_contents for cell in obj.__closure__ or ()]
+        return (
+            f"{obj.__module__}.{obj.__qualname__}("
+            f"{hashlib.sha256(obj.__code__.co_code).hexdigest()}, "
+            f"{_describe_for_cache(obj.__defaults__, depth + 1)}, "
+            f"{_describe_for_cache(closure, depth + 1)})"
+        )
+    if inspect.isclass(obj) or inspect.isbuiltin(obj):
+        return f"{obj.__module__}.{obj.__qualname__}"
+    # Only look one level into other objects, e.g. a tracer may hold on to
+    # the graph it traced last
+    attrs = {
+        k: v if depth == 0 else type(v)
+        for k, v in getattr(obj, "__dict__", {}).items()
+        if not isinstance(v, torch.nn.Module)
+    }
+    return (
+        f"{type(obj).__module__}.{type(obj).__qualname__}"
+        f"({_describe_for_cache(attrs, depth + 1)})"
+    )
+
+
+# Attributes every module has, hashed separately or not at all
+_MODULE_BASE_ATTRS = frozenset(torch.nn.Module().__dict__)
+
+
+def _pipe_cache_key(mod: torch.nn.Module, tracer, **config) -> str:
+    """
+    Hash of the structure of `mod` -- its modules and their code, their plain
+    attributes (e.g. scalars or an HF `config`, which tracing may bake into
+    the graph), and the names, shapes and dtypes of its parameters and
+    buffers, not their values -- and of the configuration the pipe is built
+    with
+    """
+    h = hashlib.sha256()
+    h.update(f"{_PIPE_CACHE_VERSION} {torch.__version__}".encode())
+
+    forward_sources: Dict[type, str] = {}
+    for name, submod in mod.named_modules(remove_duplicate=False):
+        cls = type(submod)
+        if cls not in forward_sources:
+            try:
+                forward_sources[cls] = inspect.getsource(cls.forward)
+            except (OSError, TypeError):
+                forward_sources[cls] = ""
+            h.update(forward_sources[cls].encode())
+        h.update(
+            f"{name} {cls.__module__}.{cls.__qualname__} "
+            f"{submod.extra_repr()} {submod.training}\n".encode()
+        )
+        for attr, value in sorted(submod.__dict__.items()):
+            if attr in _MODULE_BASE_ATTRS or isinstance(
+                value, (torch.nn.Module, torch.Tensor)
+            ):
+                continue
+            if hasattr(value, "to_dict"):
+                # HF configs
+                value = value.to_dict()
+            h.update(f"{attr} {_describe_for_cache(value)}\n".encode())
+
+    # Tensors shared under several names are tied to the first one
+    tensor_names: Dict[torch.Tensor, str] = {}
+    for name, tensor in list(mod.named_parameters(remove_duplicate=False)) + (
+        list(mod.named_buffers(remove_duplicate=False))
+    ):
+        tied_to = tensor_names.setdefault(tensor, name)
+        h.update(
+            f"{name} {list(tensor.shape)} {tensor.dtype} "
+            f"{tensor.requires_grad} {tied_to}\n".encode()
+        )
+
+    h.update(_describe_for_cache(tracer).encode())
+    h.update(f"{getattr(tracer, 'proxy_buffer_attributes', None)}".encode())
+    h.update(_describe_for_cache(config).encode())
+    return h.hexdigest()
+
+
+class _PipeCachePickler(pickle.Pickler):
+    """
+    Pickles a pipe without the values of its parameters and buffers, which
+    are recorded by shape, dtype and name only
+    """
+
+    def __init__(self, file, tensor_names: Dict[int, str]):
+        super().__init__(file)
+        self.tensor_names = tensor_names
+
+    def persistent_id(self, obj):
+        if isinstance(obj, torch.Tensor) and id(obj) in self.tensor_names:
+            return (
+                self.tensor_names[id(obj)],
+                list(obj.shape),
+                obj.dtype,
+                isinstance(obj, torch.nn.Parameter),
+                obj.requires_grad,
+            )
+        return None
+
+
+class _PipeCacheUnpickler(pickle.Unpickler):
+    """
+    Unpickles a pipe pickled by `_PipeCachePickler` with meta tensors in place
+    of its parameters and buffers
+    """
+
+    def __init__(self, file):
+        super().__init__(file)
+        self.tensors: Dict[str, torch.Tensor] = {}
+
+    def persistent_load(self, pid):
+        name, shape, dtype, is_param, requires_grad = pid
+        if name not in self.tensors:
+            tensor = torch.empty(shape, dtype=dtype, device="meta")
+            if is_param:
+                tensor = torch.nn.Parameter(tensor, requires_grad)
+            self.tensors[name] = tensor
+        return self.tensors[name]
+
+
 class Pipe(QualnameMapMixin, torch.nn.Module):
     def __init__(
         self,
@@ -1038,10 +1195,45 @@ class Pipe(QualnameMapMixin, torch.nn.Module):
             Callable[[pippy.fx.GraphModule], pippy.fx.GraphModule]
         ] = None,
         return_to_0: bool = True,
+        cache_dir: Optional[Union[str, os.PathLike]] = None,
         **kwargs,
     ):
+        """
+        If ``cache_dir`` is given, the pipe is saved there without its
+        parameter and buffer values, keyed by a hash of the module structure,
+        the tracer and the split configuration. Later calls with the same
+        structure and configuration load it and bind the parameters and
+        buffers of ``mod`` into it, skipping tracing and splitting. Only
+        point ``cache_dir`` at a trusted directory, as cached pipes are
+        unpickled.
+        """
         # TODO: abstract partitioning policy
 
+        cache_path = None
+        if cache_dir is not None:
+            cache_key = _pipe_cache_key(
+                mod,
+                tracer or pippy.fx.Tracer(),
+                multi_use_param_spec=multi_use_param_spec,
+                output_loss_value_spec=output_loss_value_spec,
+                split_policy=split_policy,
+                return_to_0=return_to_0,
+                kwargs=kwargs,
+            )
+            cache_path = os.path.join(cache_dir, f"pipe-{cache_key}.pkl")
+            if os.path.exists(cache_path):
+                if deep_copy_module:
+                    mod = copy.deepcopy(mod)
+                try:
+                    pipe = Pipe._load_from_cache(cache_path, mod)
+                    logging.info(f"Loaded pipe from cache {cache_path}")
+                    return pipe
+                except Exception as e:
+                    logging.warning(
+                        f"Failed to load pipe from cache {cache_path}, "
+                        f"re-tracing: {e}"
+                    )
+
         global _pipeline_tracer
         old__pipeline_tracer = _pipeline_tracer
         _pipeline_tracer = tracer or pippy.fx.Tracer()
@@ -1076,7 +1268,7 @@ class Pipe(QualnameMapMixin, torch.nn.Module):
         if split_policy is not None:
             traced = split_policy(traced)
 
-        return Pipe._from_traced(
+        pipe = Pipe._from_traced(
             mod,
             traced,
             multi_use_param_spec,
@@ -1084,6 +1276,127 @@ class Pipe(QualnameMapMixin, torch.nn.Module):
             return_to_0=return_to_0,
         )
 
+        if cache_path is not None:
+            try:
+                pipe._save_to_cache(cache_path)
+                logging.info(f"Saved pipe to cache {cache_path}")
+            except Exception as e:
+                # E.g. the pipe holds objects that cannot be pickled
+                logging.warning(
+                    f"Failed to save pipe to cache {cache_path}: {e}"
+                )
+
+        return pipe
+
+    def _save_to_cache(self, path: Union[str, os.PathLike]):
+        # Write to a temporary file first, several ranks may save the same
+        # pipe concurrently
+        cache_dir = os.path.dirname(os.path.abspath(path))
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as f:
+            try:
+                self._dump_without_weights(f)
+            except BaseException:
+                f.close()
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, path)
+
+    @staticmethod
+    def _load_from_cache(
+        path: Union[str, os.PathLike],
+        mod: torch.nn.Module,
+    ) -> "Pipe":
+        with open(path, "rb") as f:
+            return Pipe._load_without_weights(f, mod)
+
+    def _dump_without_weights(self, f):
+        """
+        Pickle the pipe to file `f`, with placeholders in place of its
+        parameters and buffers
+        """
+        tensor_names: Dict[int, str] = {}
+        for name, tensor in list(
+            self.split_gm.named_parameters(remove_duplicate=False)
+        ) + list(self.split_gm.named_buffers(remove_duplicate=False)):
+            tensor_names.setdefault(id(tensor), name)
+
+        body = dict(self.split_gm.__dict__)
+        body.pop("_graph")
+        # Set by `Pipe.__init__`, which runs again on load
+        body.pop("forward", None)
+        _PipeCachePickler(f, tensor_names).dump(
+            {
+                "body": body,
+                "nodes": _LinearNodeList(self.split_gm.graph.nodes),
+                "qualname_mapping": self.new_to_old_qualname_mapping,
+                "num_stages": self.num_stages,
+                "has_loss_and_backward": self.has_loss_and_backwards,
+                "loss_spec": self.loss_spec,
+            }
+        )
+
+    @staticmethod
+    def _load_without_weights(
+        f,
+        mod: torch.nn.Module,
+        stage_idx: Optional[int] = None,
+    ) -> "Pipe":
+        """
+        Unpickle a pipe pickled by `_dump_without_weights` from file `f`, and
+        bind the parameters and buffers of `mod` into it. If `stage_idx` is
+        given, only the stage `stage_idx` gets them, the other stages keep
+        meta tensors.
+        """
+        unpickler = _PipeCacheUnpickler(f)
+        cached = unpickler.load()
+
+        split_gm = _direct_serialization_deserialize(
+            cached["body"], cached["nodes"]
+        )
+
+        # Bind the parameters and buffers of `mod` in place of the
+        # placeholders
+        qualname_mapper = QualnameMapMixin(cached["qualname_mapping"])
+        if stage_idx is not None:
+            stage = split_gm.get_submodule(f"submod_{stage_idx}")
+            stage_tensors = {
+                id(tensor)
+                for tensor in list(stage.parameters()) + list(stage.buffers())
+            }
+        bound: Dict[int, torch.Tensor] = {}
+        for name, placeholder in unpickler.tensors.items():
+            if stage_idx is not None and id(placeholder) not in stage_tensors:
+                continue
+            atoms = qualname_mapper.remap_qualname(name).split(".")
+            mod_itr = mod
+            for atom in atoms[:-1]:
+                mod_itr = getattr(mod_itr, atom)
+            tensor = getattr(mod_itr, atoms[-1])
+            if (
+                not isinstance(tensor, torch.Tensor)
+                or tensor.shape != placeholder.shape
+                or tensor.dtype != placeholder.dtype
+            ):
+                raise RuntimeError(
+                    f"{name} does not match {'.'.join(atoms)} of the module"
+                )
+            bound[id(placeholder)] = tensor
+
+        for submod in split_gm.modules():
+            for tensors in (submod._parameters, submod._buffers):
+                for key, tensor in tensors.items():
+                    if tensor is not None and id(tensor) in bound:
+                        tensors[key] = bound[id(tensor)]
+
+        return Pipe(
+            split_gm,
+            cached["qualname_mapping"],
+            cached["num_stages"],
+            cached["has_loss_and_backward"],
+            cached["loss_spec"],
+        )
+
     def __str__(self):
         return self.split_gm.__str__()
 
@@ -1,8 +1,13 @@
 import gc
+import inspect
 import json
 import logging
 import os
-from typing import Dict, List, Optional, Tuple, Union
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
 
 import torch
 import torch.distributed as dist
@@ -10,6 +15,22 @@ from torch import nn
 
 from pippy.utils import _get_binary_filename
 
+# `torch.load(..., mmap=True)` is only available from PyTorch 2.1
+_TORCH_LOAD_HAS_MMAP = "mmap" in inspect.signature(torch.load).parameters
+
+# Tensor dtypes, by their name in safetensors binaries
+_SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
 
 TYPICAL_PREFIXES = [
     "model",  # facebook/opt-6.7b
@@ -24,16 +45,35 @@ def load_checkpoint(
     device: torch.device = None,
     dtype: torch.dtype = None,
     checkpoint_prefix: str = None,
+    mmap: bool = True,
+    num_io_threads: int = 2,
+    max_inflight_bytes: Optional[int] = None,
 ):
     """
     Load a checkpoint from a model (and optimizer) file.
     Args:
         model (`torch.nn.Module`): the model to load the checkpoint into
-        index_filename (`Union[str, os.PathLike]`): path to the checkpoint's index (metadata file)
+        index_filename (`Union[str, os.PathLike]`): path to the checkpoint's index (metadata file),
+            e.g. `pytorch_model.bin.index.json` or `model.safetensors.index.json`. Binaries
+            with a `.safetensors` extension are read as safetensors, others with `torch.load`.
+            The checkpoint may have been saved by a pipeline split differently from the one
+            `model` belongs to: only the bytes of the tensors of `model` are read from the
+            safetensors binaries, and from pickled binaries if they are memory-mapped
         optim (`torch.optim.Optimizer`): optimizer object to load ckpt state dict into
         device (`torch.device`): the device on which to load the checkpoint
         dtype (`torch.dtype`): the dtype on which to load the checkpoint
         checkpoint_prefix (`str`): the prefix of the checkpoint to load
+        mmap (`bool`): whether to memory-map the pickled checkpoint binaries, so
+            that only the tensors used by `model` are read from disk, instead of
+            whole binaries. Requires PyTorch >= 2.1, ignored otherwise, and for
+            binaries saved in the legacy format of `torch.save`.
+            safetensors binaries are always read in part
+        num_io_threads (`int`): the number of threads reading binaries ahead,
+            while the tensors of the binary read last are copied into `model`
+        max_inflight_bytes (`Optional[int]`): caps the total size of the
+            binaries being read or copied at once, which bounds the host memory
+            used by read-ahead. Binaries are still read one at a time if one
+            exceeds the cap. Unbounded by default
     Returns:
         The loaded checkpoint model, or, if an optimizer is passed as an argument,
         both the loaded checkpoint model and a optimizer
@@ -55,35 +95,75 @@ def load_checkpoint(
 
     file_to_weights = _get_file_to_weight_map(model, index, prefix_to_test)
 
-    used_files = file_to_weights.keys()
-    import time
+    used_files = list(file_to_weights.keys())
 
     logging.info(
         f"Timestamp {time.time():.2f} " f"Opening checkpoint: {used_files}"
     )
 
-    for file in used_files:
-        file_path = os.path.join(checkpoint_folder, file)
-        checkpoint = torch.load(file_path)
-
-        if file in file_to_weights:
-            weights = file_to_weights[file]
-            for new_name, old_name, clone in weights:
-                assert (
-                    old_name in checkpoint.keys()
-                ), f"{old_name} not in {file}"
-                loaded_weight = checkpoint[old_name]
+    mmap = mmap and _TORCH_LOAD_HAS_MMAP
+    # Upper bound of the host memory a binary takes while in flight
+    file_sizes = {
+        file: os.path.getsize(os.path.join(checkpoint_folder, file))
+        for file in used_files
+    }
+    inflight_bytes = 0
+    next_file_idx = 0
+    pending: Deque[Tuple[str, Future]] = deque()
+
+    def read_ahead(executor: ThreadPoolExecutor):
+        nonlocal inflight_bytes, next_file_idx
+        while next_file_idx < len(used_files) and len(pending) < num_io_threads:
+            file = used_files[next_file_idx]
+            if (
+                max_inflight_bytes is not None
+                and inflight_bytes > 0
+                and inflight_bytes + file_sizes[file] > max_inflight_bytes
+            ):
+                break
+            pending.append(
+                (
+                    file,
+                    executor.submit(
+                        _read_checkpoint_file,
+                        os.path.join(checkpoint_folder, file),
+                        [old_name for _, old_name, _ in file_to_weights[file]],
+                        mmap,
+                    ),
+                )
+            )
+            inflight_bytes += file_sizes[file]
+            next_file_idx += 1
+
+    with ThreadPoolExecutor(
+        max_workers=num_io_threads, thread_name_prefix="load_checkpoint"
+    ) as executor:
+        while pending or next_file_idx < len(used_files):
+            read_ahead(executor)
+            file, future = pending.popleft()
+            loaded_weights = future.result()
+            # Read the next binaries while copying this one's tensors
+            read_ahead(executor)
+
+            start = time.time()
+            for new_name, old_name, clone in file_to_weights[file]:
                 _set_module_tensor_to_device(
                     model,
                     new_name,
                     device,
-                    value=loaded_weight,
+                    value=loaded_weights[old_name],
                     dtype=dtype,
                     clone=clone,
                 )
+            logging.info(
+                f"Copied {len(file_to_weights[file])} tensors of {file} "
+                f"to {device} in {time.time() - start:.2f}s"
+            )
 
-        del checkpoint
-        gc.collect()
+            del loaded_weights
+            inflight_bytes -= file_sizes[file]
+            if not (mmap or file.endswith(".safetensors")):
+                gc.collect()
 
     if optim:
         optim.load_state_dict(
@@ -100,6 +180,145 @@ def load_checkpoint(
     return model
 
 
+def _read_checkpoint_file(
+    file_path: str,
+    weight_names: List[str],
+    mmap: bool,
+) -> Dict[str, torch.Tensor]:
+    """
+    A helper function to read the tensors named `weight_names` from a checkpoint binary
+    Args:
+        file_path (`str`): path to the checkpoint binary
+        weight_names (`List[str]`): names of the tensors to read
+        mmap (`bool`): whether to memory-map the binary if it is pickled
+    Returns:
+        `Dict[str, torch.Tensor]`: the tensors read, by name. They do not share memory
+        with the binary, if it is mapped
+    """
+    start = time.time()
+    file = os.path.basename(file_path)
+
+    weights: Dict[str, torch.Tensor] = {}
+    if file.endswith(".safetensors"):
+        weights = _read_safetensors_file(file_path, weight_names)
+    else:
+        # Tensors of mapped binaries are not read until used: only the pages
+        # of `weight_names` are read from disk, into the page cache shared
+        # with the other processes loading the same binary. Binaries in the
+        # legacy (non-zip) format of `torch.save` cannot be mapped
+        mmap = mmap and zipfile.is_zipfile(file_path)
+        if mmap:
+            checkpoint = torch.load(file_path, map_location="cpu", mmap=True)
+        else:
+            checkpoint = torch.load(file_path)
+        for name in weight_names:
+            assert name in checkpoint.keys(), f"{name} not in {file}"
+            weights[name] = checkpoint[name]
+            if mmap:
+                # Copy mapped tensors out of the binary, reading them from
+                # disk in this thread rather than while they are copied into
+                # the model
+                weights[name] = weights[name].clone()
+
+    nbytes = sum(
+        weight.numel() * weight.element_size() for weight in weights.values()
+    )
+    logging.info(
+        f"Read {len(weights)} tensors ({nbytes / 2**20:.1f} MiB "
+        f"of {os.path.getsize(file_path) / 2**20:.1f} MiB) "
+        f"of {file} in {time.time() - start:.2f}s"
+    )
+    return weights
+
+
+def _read_safetensors_header(f) -> Tuple[Dict[str, Any], int]:
+    """
+    A helper function to read the header of a safetensors binary
+    Args:
+        f: the binary, opened in binary mode, at its start
+    Returns:
+        The dtype, shape and data offsets of the tensors in the binary, by name,
+        and the offset of the data in the binary
+    """
+    header_size = int.from_bytes(f.read(8), "little")
+    header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+    return header, 8 + header_size
+
+
+def _get_read_ranges(
+    header: Dict[str, Any],
+    weight_names: List[str],
+) -> List[Tuple[int, int, List[str]]]:
+    """
+    A helper function to compute the byte ranges of a safetensors binary to read
+    Args:
+        header (`Dict[str, Any]`): the header of the binary, see `_read_safetensors_header`
+        weight_names (`List[str]`): names of the tensors to read
+    Returns:
+        `List[Tuple[int, int, List[str]]]`: the `[start, end)` ranges of the data of the
+        binary covering the tensors named `weight_names` and nothing else, with the names
+        of the tensors in each. Ranges of tensors adjacent in the binary are merged, so
+        that they are read at once
+    """
+    ranges: List[Tuple[int, int, List[str]]] = []
+    for (start, end), name in sorted(
+        (header[name]["data_offsets"], name) for name in set(weight_names)
+    ):
+        if ranges and start <= ranges[-1][1]:
+            last_start, last_end, names = ranges[-1]
+            ranges[-1] = (last_start, max(last_end, end), names + [name])
+        else:
+            ranges.append((start, end, [name]))
+    return ranges
+
+
+def _read_safetensors_file(
+    file_path: str,
+    weight_names: List[str],
+) -> Dict[str, torch.Tensor]:
+    """
+    A helper function to read the tensors named `weight_names` from a safetensors binary.
+    Only their bytes are read, as located by the header of the binary, so that a stage
+    reads only its share of the binaries saved by a pipeline split differently
+    Args:
+        file_path (`str`): path to the safetensors binary
+        weight_names (`List[str]`): names of the tensors to read
+    Returns:
+        `Dict[str, torch.Tensor]`: the tensors read, by name
+    """
+    file = os.path.basename(file_path)
+    weights: Dict[str, torch.Tensor] = {}
+    with open(file_path, "rb") as f:
+        header, data_offset = _read_safetensors_header(f)
+        for name in weight_names:
+            assert name in header, f"{name} not in {file}"
+
+        for start, end, names in _get_read_ranges(header, weight_names):
+            buffer = bytearray(end - start)
+            f.seek(data_offset + start)
+            f.readinto(buffer)
+            for name in names:
+                dtype = _SAFETENSORS_DTYPES[header[name]["dtype"]]
+                shape = header[name]["shape"]
+                tensor_start, tensor_end = header[name]["data_offsets"]
+                if tensor_start == tensor_end:
+                    weights[name] = torch.empty(shape, dtype=dtype)
+                    continue
+                tensor_data = torch.frombuffer(
+                    buffer,
+                    dtype=torch.uint8,
+                    count=tensor_end - tensor_start,
+                    offset=tensor_start - start,
+                )
+                itemsize = torch.empty((), dtype=dtype).element_size()
+                if (tensor_start - start) % itemsize != 0:
+                    # Only aligned bytes can be viewed as `dtype`
+                    tensor_data = tensor_data.clone()
+                weights[name] = tensor_data.view(dtype).reshape(shape)
+    return weights
+
+
 def _get_file_to_weight_map(
     model: nn.Module,
     index: Dict[str, str],
@@ -1,11 +1,16 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates
 import logging
-from typing import Callable, Dict, List, Tuple
+import operator
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import torch
+from torch._subclasses.fake_tensor import FakeTensorMode
 
 import pippy.fx
+from pippy.fx.passes import shape_prop
 from pippy.IR import pipe_split
+from pippy.utils import _numel, _tensor_meta_bytes
 
 """
 Analyze size of parameters/buffers used by each node in the graph
@@ -161,7 +166,8 @@ def split_on_size_threshold(
 
 
 """
-Create a Callable that splits a model into given number of stages, based on equal stage size
+Create a Callable that splits a model into given number of stages, based on equal stage size. The split minimizes the
+number of parameter and buffer elements of the largest stage.
 Input:
   nstages: number of stages to split the module into
 Output:
@@ -190,10 +196,438 @@ def split_into_equal_size(
             f"per stage size: {per_stage_size}"
         )
 
-        gm, rv_nstages = _split_on_size_threshold_with_max_stages(
-            gm, per_stage_size, nstages
-        )
-        assert rv_nstages == nstages
-        return gm
+        # A parameter shared by several functions is counted at its first use
+        node_param_sizes = _analyze_node_size(gm)
+        node_sizes: Dict[pippy.fx.Node, float] = {}
+        seen_params: Dict = {}
+        for node in gm.graph.nodes:
+            if node not in node_param_sizes:
+                continue
+            size = 0
+            for param_name, param_size in node_param_sizes[node].items():
+                if node.op == "call_module":
+                    size += param_size
+                elif param_name not in seen_params:
+                    seen_params.setdefault(param_name)
+                    size += param_size
+            node_sizes[node] = size
+
+        return _split_on_node_costs(gm, node_sizes, nstages)
 
     return _split_into_nstages_equal_size
+
+
+"""
+Estimate the FLOPs of each compute node in the graph and the bytes it reads and writes (its tensor inputs, including
+parameters and buffers, and its outputs). Shapes are propagated with fake tensors, i.e. without running the model.
+Input:
+  gm: `pippy.fx.GraphModule` to analyze
+  example_inputs: example values of the placeholders of `gm`, in order
+Output:
+  a Dict that uses Node as key, where value is a (FLOPs, bytes) tuple, for each `call_module`, `call_function` and
+  `call_method` node
+"""
+
+
+def _analyze_node_flops_and_bytes(
+    gm: pippy.fx.GraphModule,
+    example_inputs: List[Any],
+) -> Dict[pippy.fx.Node, Tuple[int, int]]:
+    with FakeTensorMode(allow_non_fake_inputs=True) as fake_mode:
+        fake_inputs = pippy.fx.node.map_aggregate(
+            example_inputs,
+            lambda a: fake_mode.from_tensor(a)
+            if isinstance(a, torch.Tensor)
+            else a,
+        )
+        shape_prop.ShapeProp(gm).propagate(*fake_inputs)
+
+    node_flops_and_bytes: Dict[pippy.fx.Node, Tuple[int, int]] = {}
+    for node in gm.graph.nodes:
+        if node.op not in ("call_module", "call_function", "call_method"):
+            continue
+        out_meta = node.meta.get("tensor_meta", None)
+        nbytes = _tensor_meta_bytes(out_meta)
+        if _is_embedding(gm, node):
+            # Only the looked up rows of the table are read
+            nbytes += _tensor_meta_bytes(out_meta)
+            nbytes += _tensor_meta_bytes(node.args[0].meta.get("tensor_meta"))
+            node_flops_and_bytes[node] = (_node_flops(gm, node), nbytes)
+            continue
+        for arg in node.all_input_nodes:
+            nbytes += _tensor_meta_bytes(arg.meta.get("tensor_meta", None))
+        if node.op == "call_module":
+            submod = gm.get_submodule(node.target)
+            for param in submod.parameters():
+                nbytes += param.numel() * param.element_size()
+            for buffer in submod.buffers():
+                nbytes += buffer.numel() * buffer.element_size()
+        node_flops_and_bytes[node] = (_node_flops(gm, node), nbytes)
+        logging.debug(
+            f"{node} has {node_flops_and_bytes[node][0]} FLOPs, "
+            f"{nbytes} bytes"
+        )
+
+    return node_flops_and_bytes
+
+
+def _is_embedding(gm: pippy.fx.GraphModule, node: pippy.fx.Node) -> bool:
+    if node.op == "call_module":
+        return isinstance(gm.get_submodule(node.target), torch.nn.Embedding)
+    return node.op == "call_function" and (
+        node.target is torch.nn.functional.embedding
+    )
+
+
+def _tensor_meta_numel(tensor_meta) -> int:
+    if not isinstance(tensor_meta, shape_prop.TensorMetadata):
+        return 0
+    return _numel(tensor_meta.shape)
+
+
+def _arg_shape(arg) -> Optional[torch.Size]:
+    if isinstance(arg, pippy.fx.Node):
+        tensor_meta = arg.meta.get("tensor_meta", None)
+        if isinstance(tensor_meta, shape_prop.TensorMetadata):
+            return tensor_meta.shape
+    return None
+
+
+# Matrix multiplications, as (function or method, index of the argument whose
+# last dimension is contracted)
+_MATMUL_OPS = {
+    torch.mm: 0,
+    torch.matmul: 0,
+    torch.bmm: 0,
+    operator.matmul: 0,
+    torch.nn.functional.linear: 0,
+    torch.addmm: 1,
+    torch.baddbmm: 1,
+    "mm": 0,
+    "matmul": 0,
+    "bmm": 0,
+}
+
+_CONV_MODULES = (torch.nn.Conv1d, torch.nn.Conv2d, torch.nn.Conv3d)
+_CONV_FUNCTIONS = (
+    torch.nn.functional.conv1d,
+    torch.nn.functional.conv2d,
+    torch.nn.functional.conv3d,
+)
+
+
+def _node_flops(gm: pippy.fx.GraphModule, node: pippy.fx.Node) -> int:
+    """
+    FLOPs of a node, counting a multiply-add as 2 FLOPs. Matrix
+    multiplications, convolutions and attention are counted exactly, other
+    ops are assumed to cost one FLOP per output element.
+    """
+    out_numel = _tensor_meta_numel(node.meta.get("tensor_meta", None))
+    if node.op == "call_module":
+        submod = gm.get_submodule(node.target)
+        if isinstance(submod, torch.nn.Linear):
+            return 2 * out_numel * submod.in_features
+        if isinstance(submod, _CONV_MODULES):
+            return 2 * out_numel * submod.weight[0].numel()
+        return out_numel
+
+    # For `call_method`, `self` is the first argument
+    target, args = node.target, node.args
+    if target in _MATMUL_OPS:
+        shape = _arg_shape(args[_MATMUL_OPS[target]])
+        if shape is not None and len(shape) > 0:
+            return 2 * out_numel * shape[-1]
+    elif target in _CONV_FUNCTIONS:
+        weight_shape = _arg_shape(
+            args[1] if len(args) > 1 else node.kwargs.get("weight")
+        )
+        if weight_shape is not None:
+            kernel_numel = 1
+            for dim in weight_shape[1:]:
+                kernel_numel *= dim
+            return 2 * out_numel * kernel_numel
+    elif target is getattr(
+        torch.nn.functional, "scaled_dot_product_attention", None
+    ):
+        # q: (..., L, E), k: (..., S, E), v: (..., S, Ev), out: (..., L, Ev)
+        q_shape, k_shape = _arg_shape(args[0]), _arg_shape(args[1])
+        if q_shape is not None and k_shape is not None:
+            q_numel = 1
+            for dim in q_shape:
+                q_numel *= dim
+            return 2 * k_shape[-2] * (q_numel + out_numel)
+
+    return out_numel
+
+
+"""
+Estimate the run time (in seconds) of each compute node in the graph, with a roofline model: a node takes as long as
+the larger of its FLOPs at `flops_per_sec` and its bytes at `bytes_per_sec`. Optionally, the estimates are replaced by
+timings measured by running the graph on `example_inputs` `profile_iters` times (minimum over the runs).
+Input:
+  gm: `pippy.fx.GraphModule` to analyze
+  example_inputs: example values of the placeholders of `gm`, in order
+  flops_per_sec: compute throughput of the device
+  bytes_per_sec: memory bandwidth of the device
+  profile_iters: number of profiling runs; default = 0, no profiling
+Output:
+  a Dict that uses Node as key, where value is the estimated run time of the node
+"""
+
+
+def _analyze_node_cost(
+    gm: pippy.fx.GraphModule,
+    example_inputs: List[Any],
+    flops_per_sec: float,
+    bytes_per_sec: float,
+    profile_iters: int = 0,
+) -> Dict[pippy.fx.Node, float]:
+    node_costs = {
+        node: max(flops / flops_per_sec, nbytes / bytes_per_sec)
+        for node, (flops, nbytes) in _analyze_node_flops_and_bytes(
+            gm, example_inputs
+        ).items()
+    }
+
+    if profile_iters > 0:
+        timer = _NodeTimer(gm)
+        with torch.no_grad():
+            for _ in range(profile_iters):
+                timer.run(*example_inputs)
+        for node in node_costs:
+            if node in timer.node_times:
+                node_costs[node] = timer.node_times[node]
+
+    return node_costs
+
+
+class _NodeTimer(pippy.fx.Interpreter):
+    """
+    Interpreter recording the shortest run time of each node over all runs
+    """
+
+    def __init__(self, gm: pippy.fx.GraphModule):
+        super().__init__(gm)
+        self.node_times: Dict[pippy.fx.Node, float] = {}
+
+    def run_node(self, n: pippy.fx.Node) -> Any:
+        sync = torch.cuda.synchronize if torch.cuda.is_initialized() else None
+        if sync:
+            sync()
+        start = time.perf_counter()
+        result = super().run_node(n)
+        if sync:
+            sync()
+        elapsed = time.perf_counter() - start
+        self.node_times[n] = min(self.node_times.get(n, elapsed), elapsed)
+        return result
+
+
+"""
+Compute the bytes of activations crossing a cut before each compute node of the graph, i.e. of the values defined before
+the node and used at or after it. Requires the `tensor_meta` of the nodes, see `_analyze_node_flops_and_bytes`.
+Input:
+  gm: `pippy.fx.GraphModule` to analyze
+Output:
+  a Dict that uses Node as key, where value is the number of bytes a stage ending before that Node sends to the stages
+  after it
+"""
+
+
+def _analyze_cut_bytes(
+    gm: pippy.fx.GraphModule,
+) -> Dict[pippy.fx.Node, int]:
+    nodes = [
+        node
+        for node in gm.graph.nodes
+        if node.op in ("call_module", "call_function", "call_method")
+    ]
+
+    # Index of the first compute node at or after each node
+    node_idx: Dict[pippy.fx.Node, int] = {}
+    idx = 0
+    for node in gm.graph.nodes:
+        node_idx[node] = idx
+        if node.op in ("call_module", "call_function", "call_method"):
+            idx += 1
+
+    # A value defined before nodes[i] and last used by nodes[j] crosses the
+    # cuts before nodes[i + 1], ..., nodes[j]
+    diff = [0] * (len(nodes) + 2)
+    for node in gm.graph.nodes:
+        if node.op not in (
+            "placeholder",
+            "call_module",
+            "call_function",
+            "call_method",
+        ):
+            continue
+        nbytes = _tensor_meta_bytes(node.meta.get("tensor_meta", None))
+        if not nbytes or not node.users:
+            continue
+        last_use = max(node_idx[user] for user in node.users)
+        if last_use > node_idx[node]:
+            diff[node_idx[node] + 1] += nbytes
+            diff[last_use + 1] -= nbytes
+
+    cut_bytes: Dict[pippy.fx.Node, int] = {}
+    crossing = 0
+    for i, node in enumerate(nodes):
+        crossing += diff[i]
+        cut_bytes[node] = crossing
+    return cut_bytes
+
+
+"""
+Partition a sequence of nodes into `nstages` non-empty contiguous stages minimizing the cost of the most expensive
+stage, with dynamic programming. The cost of a stage is the cost of its nodes plus the costs of the cuts it starts and
+ends at, as a stage both receives its inputs and sends its outputs.
+Input:
+  node_costs: cost of each node, in order
+  cut_costs: cost of cutting before each node, plus a trailing element for the end of the sequence; the first and last
+    elements are ignored
+  nstages: number of stages
+Output:
+  the indices of the nodes starting stages 1, ..., `nstages` - 1
+"""
+
+
+def _min_max_partition(
+    node_costs: List[float],
+    cut_costs: List[float],
+    nstages: int,
+) -> List[int]:
+    n = len(node_costs)
+    prefix = torch.zeros(n + 1, dtype=torch.float64)
+    prefix[1:] = torch.tensor(node_costs, dtype=torch.float64).cumsum(0)
+    cuts = torch.tensor(cut_costs, dtype=torch.float64)
+    cuts[0] = cuts[n] = 0.0
+
+    # bottleneck[j]: smallest bottleneck of the first j nodes in k stages
+    bottleneck = prefix + cuts
+    bottleneck[0] = float("inf")
+    # stage_start[k][j]: start of the last stage in that partition
+    stage_start: List[List[int]] = []
+    for k in range(2, nstages + 1):
+        new_bottleneck = torch.full((n + 1,), float("inf"), dtype=torch.float64)
+        start = [0] * (n + 1)
+        # Leave at least one node to each of the stages after the k-th
+        for j in range(k, n - (nstages - k) + 1):
+            # The last stage spans nodes i, ..., j - 1, for i >= k - 1
+            candidates = torch.maximum(
+                bottleneck[k - 1 : j],
+                prefix[j] - prefix[k - 1 : j] + cuts[k - 1 : j] + cuts[j],
+            )
+            new_bottleneck[j], best = candidates.min(0)
+            start[j] = k - 1 + int(best)
+        bottleneck = new_bottleneck
+        stage_start.append(start)
+
+    # Walk the stage starts back from the end of the sequence
+    split_indices: List[int] = []
+    j = n
+    for start in reversed(stage_start):
+        j = start[j]
+        split_indices.append(j)
+    split_indices.reverse()
+    return split_indices
+
+
+"""
+Split a model at the given per-node costs into `nstages` stages, minimizing the cost of the most expensive stage (see
+`_min_max_partition`). Stages start at compute nodes.
+Input:
+  gm: `pippy.fx.GraphModule` to split
+  node_costs: cost of each compute node, nodes missing from it cost nothing
+  nstages: number of stages to split the module into
+  cut_costs: cost of cutting before each compute node, nodes missing from it are free to cut before; default = None
+Output:
+  a `fx.GraphModule` transformed from the input module with `pipe_split` inserted
+"""
+
+
+def _split_on_node_costs(
+    gm: pippy.fx.GraphModule,
+    node_costs: Dict[pippy.fx.Node, float],
+    nstages: int,
+    cut_costs: Optional[Dict[pippy.fx.Node, float]] = None,
+) -> pippy.fx.GraphModule:
+    nodes = [
+        node
+        for node in gm.graph.nodes
+        if node.op in ("call_module", "call_function", "call_method")
+    ]
+    if len(nodes) < nstages:
+        raise ValueError(
+            f"Cannot split a graph with {len(nodes)} compute nodes into "
+            f"{nstages} stages"
+        )
+    costs = [node_costs.get(node, 0.0) for node in nodes]
+    # The inputs of the first stage and the outputs of the last stage do not
+    # depend on where the model is cut
+    cuts = [0.0] * (len(nodes) + 1)
+    if cut_costs is not None:
+        for i, node in enumerate(nodes[1:], 1):
+            cuts[i] = cut_costs.get(node, 0.0)
+    split_indices = _min_max_partition(costs, cuts, nstages)
+
+    stage_costs = [
+        sum(costs[start:end]) + cuts[start] + cuts[end]
+        for start, end in zip([0] + split_indices, split_indices + [len(nodes)])
+    ]
+    logging.debug(f"Stage costs: {stage_costs}")
+
+    for idx in split_indices:
+        with gm.graph.inserting_before(nodes[idx]):
+            gm.graph.call_function(pipe_split, (), {})
+
+    # Since we transformed the graph, we need to recompile the module
+    gm.recompile()
+
+    return gm
+
+
+"""
+Create a Callable that splits a model into given number of stages, based on equal stage compute cost. The cost of each
+node is estimated from its FLOPs and the bytes it accesses (see `_analyze_node_cost`), so that e.g. embeddings, which
+have many parameters but little compute, do not get a stage of their own. Sending the activations crossing a cut to the
+next stage adds to the cost of the stages on both sides of the cut, and the split minimizes the cost of the most
+expensive stage.
+Input:
+  nstages: number of stages to split the module into
+  example_inputs: example values of the inputs of the module, in order
+  flops_per_sec: compute throughput of the device; default = 100 TFLOP/s
+  bytes_per_sec: memory bandwidth of the device; default = 1 TB/s
+  profile_iters: number of profiling runs refining the estimates; default = 0, no profiling
+  interconnect_bytes_per_sec: bandwidth between the devices of adjacent stages; default = 50 GB/s
+Output:
+  a Callable that transforms an input `fx.GraphModule` into an output `fx.GraphModule` that has `pipe_split` inserted
+  between `nstages` stages
+"""
+
+
+def split_into_equal_cost(
+    nstages: int,
+    example_inputs: List[Any],
+    flops_per_sec: float = 100e12,
+    bytes_per_sec: float = 1e12,
+    profile_iters: int = 0,
+    interconnect_bytes_per_sec: float = 50e9,
+) -> Callable[[pippy.fx.GraphModule], pippy.fx.GraphModule]:
+    def _split_into_nstages_equal_cost(
+        gm: pippy.fx.GraphModule,
+    ) -> pippy.fx.GraphModule:
+        node_costs = _analyze_node_cost(
+            gm, example_inputs, flops_per_sec, bytes_per_sec, profile_iters
+        )
+        cut_costs = {
+            node: nbytes / interconnect_bytes_per_sec
+            for node, nbytes in _analyze_cut_bytes(gm).items()
+        }
+        logging.debug(
+            f"Total model cost: {sum(node_costs.values())}, "
+            f"per stage cost: {sum(node_costs.values()) / nstages}"
+        )
+        return _split_on_node_costs(gm, node_costs, nstages, cut_costs)
+
+    return _split_into_nstages_equal_cost
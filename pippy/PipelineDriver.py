@@ -1,20 +1,35 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates
+import heapq
+import itertools
 import logging
 import operator
 import threading
 import time
 import warnings
+from collections import deque
 from enum import Enum
 from inspect import Parameter, Signature
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 import torch
 import torch.distributed.rpc as rpc
+from torch._subclasses.fake_tensor import FakeTensorMode
 
 import pippy.fx
 from pippy.backward import (
     _null_coalesce_accumulate,
     stage_backward,
+    stage_backward_input,
     sync_barrier,
 )
 from pippy.events import Allocator, Event, EventRecorder, EventsContext
@@ -28,7 +43,17 @@ from pippy.microbatch import (
     split_args_kwargs_into_chunks,
     sum_reducer,
 )
-from pippy.utils import flatten_args_detach
+from pippy.utils import (
+    _packed_offsets,
+    _storage_ptrs,
+    _tensor_meta_bytes,
+    ActivationOffloader,
+    flatten_args,
+    flatten_args_detach,
+    pack_tensors,
+    RecvBufferPool,
+    unpack_tensors,
+)
 
 # TODO: Define the strategy for replicating the computation. In particular, we will likely make the assumption
 # that the operations in the program are batch-wise commutative (my term), i.e. we can guarantee equivalence
@@ -168,6 +193,150 @@ class WorkItem:
         return f"WorkItem({self.debug_str})"
 
 
+class PhasePriorityPolicy:
+    """
+    Scheduling policy used by RankWorker to order READY WorkItems. WorkItems
+    are dequeued phase by phase following `phase_order`, i.e. a WorkItem of an
+    earlier phase always runs before one of a later phase. Within a phase,
+    WorkItems are ordered by `sort_key`, which defaults to
+    (batch_id, microbatch_id).
+
+    The default order runs BACKWARD before ACCUMULATE_GRAD before FORWARD, so
+    that a rank always drains backward work (and thus frees a slot under
+    `max_outstanding`) before admitting a new microbatch, which is what 1F1B
+    requires.
+
+    Subclasses can override `sort_key` to implement other orderings within a
+    phase.
+    """
+
+    DEFAULT_PHASE_ORDER = (
+        Phase.BACKWARD,
+        Phase.ACCUMULATE_GRAD,
+        Phase.FORWARD,
+        Phase.SYNC_BARRIER,
+    )
+
+    def __init__(self, phase_order: Optional[Tuple[Phase, ...]] = None):
+        self.phase_order = tuple(phase_order or self.DEFAULT_PHASE_ORDER)
+        if set(self.phase_order) != set(Phase):
+            raise ValueError(
+                f"phase_order must list every phase exactly once, got {self.phase_order}"
+            )
+
+    def sort_key(self, work_item: WorkItem) -> Any:
+        return work_item.batch_id, work_item.microbatch_id
+
+
+class CheckpointPolicy:
+    """
+    Activation checkpointing policy of a RankWorker. For each forward
+    WorkItem, decides whether to stash the activations of the stage for the
+    backward, or to only keep the inputs and rerun the forward in the
+    backward (~33% extra compute for the microbatch).
+
+    A microbatch is checkpointed when stashing its activations would exceed
+    one of the limits:
+
+    * `max_stashed_microbatches`: number of microbatches of a stage with
+      stashed activations, e.g. under 1F1B the first K microbatches in flight
+      are stashed and the later ones checkpointed
+    * `activation_budget_bytes`: total bytes of stashed activations on the
+      rank, over all its stages. The activation footprint of a microbatch is
+      estimated from the `tensor_meta` of the stage graph, so that only the
+      stages and microbatches that do not fit are recomputed
+
+    Without any limit, nothing is checkpointed. Subclasses can override
+    `should_checkpoint` to implement other policies.
+    """
+
+    def __init__(
+        self,
+        max_stashed_microbatches: Optional[int] = None,
+        activation_budget_bytes: Optional[int] = None,
+    ):
+        self.max_stashed_microbatches = max_stashed_microbatches
+        self.activation_budget_bytes = activation_budget_bytes
+
+    def should_checkpoint(
+        self,
+        stage_id: int,
+        microbatch_id: int,
+        num_stashed: int,
+        stashed_bytes: int,
+        activation_bytes: int,
+    ) -> bool:
+        """
+        `num_stashed` is the number of microbatches of stage `stage_id` with
+        stashed activations, `stashed_bytes` their total size on the rank, and
+        `activation_bytes` the estimated size of the activations of
+        `microbatch_id`.
+        """
+        if (
+            self.max_stashed_microbatches is not None
+            and num_stashed >= self.max_stashed_microbatches
+        ):
+            return True
+        return (
+            self.activation_budget_bytes is not None
+            and stashed_bytes + activation_bytes > self.activation_budget_bytes
+        )
+
+
+class WorkItemScheduler:
+    """
+    Ready queue of a RankWorker. Keeps one heap per phase, so that enqueue and
+    dequeue cost does not depend on the number of microbatches in flight (it
+    is O(log n) in the size of a single phase's queue, and O(1) in the number
+    of phases).
+
+    Not thread-safe; RankWorker guards it with `ready_runlist_cv`.
+    """
+
+    def __init__(self, policy: Optional[PhasePriorityPolicy] = None):
+        self.policy = policy or PhasePriorityPolicy()
+        self.queues: Dict[Phase, List[Tuple[Any, int, str, WorkItem]]] = {
+            phase: [] for phase in self.policy.phase_order
+        }
+        # Tie breaker so that items with equal sort key run in arrival order
+        # and `WorkItem`s themselves are never compared
+        self._seq = itertools.count()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def keys(self):
+        return [key for q in self.queues.values() for _, _, key, _ in q]
+
+    def push(self, unique_key: str, work_item: WorkItem):
+        heapq.heappush(
+            self.queues[work_item.phase],
+            (
+                self.policy.sort_key(work_item),
+                next(self._seq),
+                unique_key,
+                work_item,
+            ),
+        )
+        self._size += 1
+
+    def pop(
+        self, can_run_phase: Callable[[Phase], bool]
+    ) -> Optional[Tuple[str, WorkItem]]:
+        """
+        Dequeue the highest priority WorkItem among the phases for which
+        `can_run_phase` returns True. Returns None if no such WorkItem exists.
+        """
+        for phase in self.policy.phase_order:
+            queue = self.queues[phase]
+            if queue and can_run_phase(phase):
+                _, _, unique_key, work_item = heapq.heappop(queue)
+                self._size -= 1
+                return unique_key, work_item
+        return None
+
+
 class ValueReference:
     def __init__(self, stage_id, unique_key):
         self.stage_id = stage_id
@@ -210,9 +379,14 @@ class RankWorker(EventRecorder):
     * Queueing of jobs and execution schedule, e.g.
         * Static Schedules
             * Fill-drain (GPipe) pipeline by serializing jobs
-            * TODO: 1F1B scheduling by serializing jobs and stalling for a specific
-                    phase to come through
+            * 1F1B scheduling by prioritizing backward jobs (see
+              `PhasePriorityPolicy`) and stalling forward jobs beyond
+              `max_outstanding`
             * TODO: Interleaved 1F1B (TODO: how to set up these data dependencies)
+            * Zero bubble 1F1B by splitting backward WorkItems
+              (`split_backward`): input gradients are computed and sent
+              first, weight gradients are deferred until the rank has no
+              READY WorkItem, or until the last backward of the batch
         * Dynamic Schedules
             * TODO: Varuna dynamic schedule
             * TODO: dynamic scheduling via registers and back-pressure (TODO: how to
@@ -226,7 +400,11 @@ class RankWorker(EventRecorder):
         max_outstanding=None,
         pp_rank=None,
         _record_mem_dumps=False,
-        checkpoint=False,
+        checkpoint: Union[bool, CheckpointPolicy] = False,
+        schedule_policy: Optional[PhasePriorityPolicy] = None,
+        coalesce_p2p: bool = False,
+        split_backward: bool = False,
+        activation_offload_budget: Optional[int] = None,
     ):
         logging.info(f"[{rank}] Instantiating RankWorker")
         self.rank = rank
@@ -234,7 +412,12 @@ class RankWorker(EventRecorder):
         self.rank = rank
         self.pp_rank = pp_rank
         self._record_mem_dumps = _record_mem_dumps
+        # Either checkpoint all microbatches (True) or none (False), or decide
+        # per microbatch
         self.checkpoint = checkpoint
+        self.coalesce_p2p = coalesce_p2p
+        self.split_backward = split_backward
+        self.activation_offload_budget = activation_offload_budget
 
         # Maximum outstanding micro-batches of the pipeline schedule
         self.max_outstanding = max_outstanding
@@ -250,7 +433,8 @@ class RankWorker(EventRecorder):
 
         self.ready_runlist_lock = threading.Lock()
         self.ready_runlist_cv = threading.Condition(self.ready_runlist_lock)
-        self.ready_runlist: Dict[str, WorkItem] = {}
+        # READY WorkItems, ordered by phase priority and then microbatch
+        self.ready_runlist = WorkItemScheduler(schedule_policy)
 
         self.worker_thread = threading.Thread(
             target=self.worker_loop, name=f"worker_{self.rank}", daemon=True
@@ -284,6 +468,8 @@ class RankWorker(EventRecorder):
             mod=mod or Pipe.materialize_stage(mod_name),  # type: ignore[attr-defined]
             rank_worker=self,
             _record_mem_dumps=self._record_mem_dumps,
+            coalesce_p2p=self.coalesce_p2p,
+            activation_offload_budget=self.activation_offload_budget,
         )
         return self.stage_executors[stage_id]
 
@@ -292,7 +478,7 @@ class RankWorker(EventRecorder):
             logging.debug(
                 f"[{self.rank}] Current ready runlist keys: {self.ready_runlist.keys()}"
             )
-            self.ready_runlist[unique_key] = work_item
+            self.ready_runlist.push(unique_key, work_item)
             self.ready_runlist_cv.notify()
 
     def enqueue_waiting_runlist(self, unique_key, work_item):
@@ -308,35 +494,30 @@ class RankWorker(EventRecorder):
     def worker_loop(self):
         batch_id_to_remaining_backward_microbatches: Dict[int, int] = {}
         while True:
-            work_item = None
             with self.ready_runlist_cv:
-                while len(self.ready_runlist) == 0:
+                while True:
+                    logging.debug(
+                        f"[{self.rank}] Dequeueing workitem from set of {len(self.ready_runlist)}"
+                    )
+                    # Forward work items are skipped if we hit the max outstanding limit.
+                    # If there are no other READY WorkItems, we block, waiting for another scheduled WorkItem to
+                    # wake us back up. This works because `outstanding` is only decremented by this thread, after
+                    # running a backward WorkItem, which itself must have been enqueued (and notified) first
+                    dequeued = self.ready_runlist.pop(self._can_run_phase)
+                    if dequeued is not None:
+                        break
+                    deferred_executor = self._executor_with_deferred_work()
+                    if deferred_executor is not None:
+                        break
                     self.ready_runlist_cv.wait()
 
-                logging.debug(
-                    f"[{self.rank}] Dequeueing workitem from set of {len(self.ready_runlist)}"
-                )
-                # TODO: extra priorities
-                for key in iter(self.ready_runlist.keys()):
-                    # Skip forward work items if we hit the max outstanding limit
-                    # If there are no other READY WorkItems, the runloop wraps around to the beginning and blocks again,
-                    # waiting for another scheduled WorkItem to wake it back up. This works because the only condition
-                    # that can schedule a WAITING Workitem is if another backward WorkItem executes and reduces the number
-                    # of outstanding mciro-batches;
-                    # If there are other READY WorkItems, the runloop executes as normally processing those
-                    if (
-                        self.ready_runlist[key].phase == Phase.FORWARD
-                        and self.max_outstanding is not None
-                        and self.outstanding >= self.max_outstanding
-                    ):
-                        continue
-                    work_item = self.ready_runlist.pop(key)
-                    break
-
-            # We may not fetch any actionable work item in the above loop, go
-            # back to the loop in this case
-            if work_item is None:
+            if dequeued is None:
+                # Nothing is READY: fill the bubble with a deferred weight
+                # gradient computation
+                deferred_executor.deferred_weight_grads.popleft()(False)
                 continue
+
+            key, work_item = dequeued
             logging.debug(
                 f"[{self.rank}][{work_item.microbatch_id}] Got WorkItem {work_item}"
             )
@@ -397,7 +578,7 @@ class RankWorker(EventRecorder):
                 kwargs_value_refs, retrieve_value_ref_args_by_idx
             )
 
-            def forward(args, kwargs, no_grad):
+            def forward(args, kwargs, no_grad, offload=False):
                 args, flat_args = flatten_args_detach(args)
                 kwargs, flat_kwargs = flatten_args_detach(kwargs)
                 # Contains all tensors from args and kwargs, in flattened form
@@ -432,14 +613,26 @@ class RankWorker(EventRecorder):
                         out_val = pippy.fx.node.map_aggregate(
                             out_val, set_requires_grad, dont_traverse_size
                         )
+                elif offload:
+                    with torch.enable_grad(), offloader.offload(
+                        microbatch_id, exclude=stage_executor.mod.parameters()
+                    ):
+                        out_val = forward_maybe_with_ddp(args, kwargs)
                 else:
                     with torch.enable_grad():
                         out_val = forward_maybe_with_ddp(args, kwargs)
 
                 return out_val, flat_args
 
+            offloader = stage_executor.activation_offloader
+
             if phase == Phase.BACKWARD:
-                if self.checkpoint:
+                if offloader is not None:
+                    offloader.prefetch(microbatch_id)
+                if microbatch_id in stage_executor.checkpointed_microbatches:
+                    stage_executor.checkpointed_microbatches.remove(
+                        microbatch_id
+                    )
                     logging.debug(
                         f"[{self.rank}][{work_item.microbatch_id}] Running backward phase. "
                         f"Rerunning forward because of checkpointing"
@@ -468,19 +661,47 @@ class RankWorker(EventRecorder):
                         kwargs["stage_output"],
                         kwargs["input_values"],
                     ) = stage_executor.fwd_cache.pop(microbatch_id)
+                    stage_executor.stashed_activation_bytes.pop(microbatch_id)
 
             if work_item.phase == Phase.FORWARD:
                 self.outstanding += 1
+                # The previous entry for this microbatch, if any, is replaced
+                # (i.e. no backward ran on it)
+                stage_executor.checkpointed_microbatches.discard(microbatch_id)
+                stage_executor.stashed_activation_bytes.pop(microbatch_id, None)
+                if offloader is not None:
+                    offloader.release(microbatch_id)
+                activation_bytes = 0
+                if isinstance(self.checkpoint, CheckpointPolicy):
+                    activation_bytes = stage_executor.estimate_activation_bytes(
+                        args, kwargs
+                    )
+                    checkpoint = self.checkpoint.should_checkpoint(
+                        work_item.stage_id,
+                        microbatch_id,
+                        len(stage_executor.stashed_activation_bytes),
+                        self._stashed_activation_bytes(),
+                        activation_bytes,
+                    )
+                else:
+                    checkpoint = self.checkpoint
                 out_val, flat_tensor_args = forward(
-                    args, kwargs, no_grad=self.checkpoint
+                    args,
+                    kwargs,
+                    no_grad=checkpoint,
+                    offload=offloader is not None,
                 )
-                if self.checkpoint:
+                if checkpoint:
                     stage_executor.fwd_cache[microbatch_id] = args, kwargs
+                    stage_executor.checkpointed_microbatches.add(microbatch_id)
                 else:
                     stage_executor.fwd_cache[microbatch_id] = (
                         out_val if isinstance(out_val, tuple) else (out_val,),
                         flat_tensor_args,
                     )
+                    stage_executor.stashed_activation_bytes[
+                        microbatch_id
+                    ] = activation_bytes
 
             elif work_item.phase == Phase.BACKWARD:
                 logging.info(
@@ -488,14 +709,25 @@ class RankWorker(EventRecorder):
                 )
 
                 batch_id_to_remaining_backward_microbatches[batch_id] -= 1
+                is_last_backward = (
+                    batch_id_to_remaining_backward_microbatches[batch_id] == 0
+                )
 
-                if (
+                if self.split_backward:
+                    out_val = self._run_split_backward(
+                        stage_executor,
+                        key,
+                        microbatch_id,
+                        args,
+                        kwargs,
+                        is_last_backward,
+                    )
+                elif (
                     isinstance(
                         stage_executor.mod,
                         torch.nn.parallel.distributed.DistributedDataParallel,
                     )
-                    and batch_id_to_remaining_backward_microbatches[batch_id]
-                    == 0
+                    and is_last_backward
                 ):
                     # HACK: reaching into DDP implementation details here. Is there a better way?
                     stage_executor.mod.reducer.prepare_for_backward(  # type: ignore[union-attr, operator]
@@ -506,7 +738,14 @@ class RankWorker(EventRecorder):
                         )
                     )
 
-                out_val = stage_backward(*args, **kwargs)
+                if not self.split_backward:
+                    out_val = stage_backward(*args, **kwargs)
+                    if offloader is not None:
+                        offloader.release(microbatch_id)
+                if offloader is not None:
+                    # Backwards usually run in microbatch order, the next one
+                    # comes back during the compute in between
+                    offloader.prefetch(microbatch_id + 1)
 
                 # Schedule forward stage of a new micro-batch
                 self.outstanding -= 1
@@ -531,6 +770,12 @@ class RankWorker(EventRecorder):
             )
             future.set_result(out_val)
             work_item.state = SchedState.DONE
+            if not (self.split_backward and phase == Phase.BACKWARD):
+                # Buffers of a split backward are retired by its weight
+                # gradient computation
+                stage_executor.retire_recv_buffers(
+                    key, phase, microbatch_id, out_val
+                )
 
             prev_name = prev_event_name(
                 work_item.phase,
@@ -566,6 +811,78 @@ class RankWorker(EventRecorder):
                     f"M{id}_finish", finish_ts
                 )
 
+    def _stashed_activation_bytes(self) -> int:
+        return sum(
+            sum(stage_executor.stashed_activation_bytes.values())
+            for stage_executor in self.stage_executors.values()
+        )
+
+    def _executor_with_deferred_work(self) -> Optional["PipeStageExecutor"]:
+        for stage_executor in self.stage_executors.values():
+            if stage_executor.deferred_weight_grads:
+                return stage_executor
+        return None
+
+    def _run_split_backward(
+        self,
+        stage_executor: "PipeStageExecutor",
+        runlist_key: str,
+        microbatch_id: int,
+        args,
+        kwargs,
+        is_last_backward: bool,
+    ):
+        """
+        Compute the input gradients of a backward WorkItem and defer its
+        weight gradients. The last backward of a batch runs all the deferred
+        weight gradient computations of the stage, so that gradients are
+        complete once the pipeline outputs (which depend on all backwards
+        through `sync_barrier`) are available.
+        """
+        grads_input, weight_grad_fn = stage_backward_input(*args, **kwargs)
+        # Same structure as the `stage_backward` output
+        out_val = (grads_input, None)
+        mod = stage_executor.mod
+
+        def run_weight_grads(prepare_ddp: bool):
+            if prepare_ddp and isinstance(
+                mod, torch.nn.parallel.distributed.DistributedDataParallel
+            ):
+                # HACK: reaching into DDP implementation details here. Is there a better way?
+                mod.reducer.prepare_for_backward(  # type: ignore[union-attr, operator]
+                    list(
+                        torch.nn.parallel.distributed._find_tensors(  # type: ignore[attr-defined]
+                            kwargs["stage_output"]
+                        )
+                    )
+                )
+            logging.debug(
+                f"[{self.rank}][{microbatch_id}] Running weight gradients"
+            )
+            weight_grad_fn(mod.parameters())
+            # Inputs, output grads and activations were needed until now
+            stage_executor.retire_recv_buffers(
+                runlist_key, Phase.BACKWARD, microbatch_id, out_val
+            )
+            if stage_executor.activation_offloader is not None:
+                stage_executor.activation_offloader.release(microbatch_id)
+
+        deferred = stage_executor.deferred_weight_grads
+        deferred.append(run_weight_grads)
+        if is_last_backward:
+            while deferred:
+                run_weight_grads_fn = deferred.popleft()
+                # DDP all-reduces gradients along the last computation
+                run_weight_grads_fn(not deferred)
+        return out_val
+
+    def _can_run_phase(self, phase: Phase) -> bool:
+        return not (
+            phase == Phase.FORWARD
+            and self.max_outstanding is not None
+            and self.outstanding >= self.max_outstanding
+        )
+
     # For work item marked with runlist_key, update its operand list with value
     def update_run_list(self, runlist_key, arg_idx, value):
         with self.waiting_runlist_lock:
@@ -575,8 +892,8 @@ class RankWorker(EventRecorder):
             if work_item.blocked_args_count == 0:
                 with self.ready_runlist_cv:
                     work_item.state = SchedState.READY
-                    self.ready_runlist[runlist_key] = self.waiting_runlist.pop(
-                        runlist_key
+                    self.ready_runlist.push(
+                        runlist_key, self.waiting_runlist.pop(runlist_key)
                     )
                     self.ready_runlist_cv.notify()
                 logging.debug(
@@ -594,13 +911,31 @@ class PipeStageExecutor(EventRecorder):
     * TODO: gradient checkpointing
     """
 
-    def __init__(self, stage_id, mod, rank_worker, _record_mem_dumps=False):
+    def __init__(
+        self,
+        stage_id,
+        mod,
+        rank_worker,
+        _record_mem_dumps=False,
+        coalesce_p2p=False,
+        activation_offload_budget: Optional[int] = None,
+    ):
         logging.info(f"Instantiating PipeStageExecutor for stage {stage_id}")
         self.stage_id = stage_id
         self.mod = mod
         self.rank_worker = rank_worker
+        # Whether `batch_send` packs all the values of a batch in one message
+        self.coalesce_p2p = coalesce_p2p
         # map microbatch ID to list of forward tensor args
         self.fwd_cache: Dict[int, Tuple[Any, List[torch.Tensor]]] = {}
+        # Microbatches whose `fwd_cache` entry holds the forward inputs, to be
+        # rerun in backward
+        self.checkpointed_microbatches: Set[int] = set()
+        # Microbatch ID : estimated size of its stashed activations
+        self.stashed_activation_bytes: Dict[int, int] = {}
+        # Input shapes : activation size estimated by
+        # `estimate_activation_bytes`
+        self.activation_bytes_cache: Dict[Tuple, int] = {}
 
         self.value_store_lock = threading.Lock()
         self.value_store_cv = threading.Condition(self.value_store_lock)
@@ -617,6 +952,13 @@ class PipeStageExecutor(EventRecorder):
         self.lr_scheduler = None
         self.device = self._find_mod_device()
 
+        # Offloads the activations stashed in `fwd_cache` to host memory
+        self.activation_offloader = (
+            ActivationOffloader(self.device, activation_offload_budget)
+            if activation_offload_budget is not None
+            else None
+        )
+
         # Send/recv order normalization
         self.callee_send_tag: Dict[int, int] = {}  # callee stage: tag seq num
         self.caller_recv_tag: Dict[int, int] = {}  # caller stage: tag seq num
@@ -624,6 +966,18 @@ class PipeStageExecutor(EventRecorder):
         self.caller_recv_tag_lock = threading.Lock()
         self.caller_recv_tag_cv = threading.Condition(self.caller_recv_tag_lock)
 
+        # Buffers for values received by `batch_recv`
+        self.recv_buffer_pool = RecvBufferPool(self.device)
+        # runlist key : buffers received for that work item
+        self.recv_buffers: Dict[str, List[torch.Tensor]] = {}
+        self.recv_buffers_lock = threading.Lock()
+        # microbatch ID : received buffers referenced by `fwd_cache`
+        self.fwd_recv_buffers: Dict[int, List[torch.Tensor]] = {}
+
+        # Weight gradient computations deferred by split backward, oldest
+        # first. Only accessed by the worker thread
+        self.deferred_weight_grads: Deque[Callable[[bool], None]] = deque()
+
     def _find_mod_device(self):
         # We assume that all parameters in the module are on the same device
         # HACK: we assume the module has at least one parameter
@@ -648,6 +1002,82 @@ class PipeStageExecutor(EventRecorder):
         # tensors
         pass
 
+    def retire_recv_buffers(
+        self, runlist_key: str, phase: Phase, microbatch_id: int, out_val
+    ):
+        """
+        Called by the worker thread once the work item `runlist_key` has run.
+        Returns the buffers it received to the recv buffer pool, unless they
+        are still referenced by `fwd_cache` (in which case they are retired by
+        the backward of the microbatch) or aliased by `out_val`.
+        """
+        with self.recv_buffers_lock:
+            buffers = self.recv_buffers.pop(runlist_key, [])
+        if phase == Phase.FORWARD:
+            # The previous entry of `fwd_cache` for this microbatch, if any, has
+            # just been replaced (i.e. no backward ran on it)
+            self.recv_buffer_pool.release_unaliased(
+                self.fwd_recv_buffers.pop(microbatch_id, []), out_val
+            )
+            live_ptrs = _storage_ptrs(out_val)
+            self.fwd_recv_buffers[microbatch_id] = [
+                b
+                for b in buffers
+                if b.untyped_storage().data_ptr() not in live_ptrs
+            ]
+            return
+        if phase == Phase.BACKWARD:
+            buffers += self.fwd_recv_buffers.pop(microbatch_id, [])
+        self.recv_buffer_pool.release_unaliased(buffers, out_val)
+
+    def estimate_activation_bytes(self, args, kwargs) -> int:
+        """
+        Estimate the size of the activations of one forward of the stage, as
+        the size of all the intermediate values in the `tensor_meta` of the
+        stage graph. Shapes are propagated with fake tensors, i.e. without
+        running any compute, once per input shapes.
+        """
+        key = tuple(
+            (tuple(a.shape), a.dtype)
+            for a in flatten_args(args) + flatten_args(kwargs)
+            if isinstance(a, torch.Tensor)
+        )
+        if key in self.activation_bytes_cache:
+            return self.activation_bytes_cache[key]
+
+        mod = self.mod
+        if isinstance(
+            mod, torch.nn.parallel.distributed.DistributedDataParallel
+        ):
+            mod = mod.module
+        activation_bytes = 0
+        if isinstance(mod, pippy.fx.GraphModule):
+            with FakeTensorMode(allow_non_fake_inputs=True) as fake_mode:
+                fake_args = pippy.fx.node.map_aggregate(
+                    _bind_placeholder_args(mod.graph, args, kwargs),
+                    lambda a: fake_mode.from_tensor(a)
+                    if isinstance(a, torch.Tensor)
+                    else a,
+                )
+                shape_prop.ShapeProp(mod).propagate(*fake_args)
+
+            for node in mod.graph.nodes:
+                if node.op in ("placeholder", "output"):
+                    continue
+                activation_bytes += _tensor_meta_bytes(
+                    node.meta.get("tensor_meta", None)
+                )
+        else:
+            logging.warning(
+                f"Cannot estimate activations of stage {self.stage_id}, "
+                f"{type(mod)} is not a GraphModule"
+            )
+        self.activation_bytes_cache[key] = activation_bytes
+        return activation_bytes
+
+    def get_recv_buffer_pool_stats(self) -> Dict[str, int]:
+        return self.recv_buffer_pool.stats()
+
     def install_peer_executors(self, peer_executors):
         assert self.peer_executors is None
         self.peer_executors = peer_executors
@@ -878,6 +1308,24 @@ class PipeStageExecutor(EventRecorder):
 
         return ValueReference(self.stage_id, output_unique_key)
 
+    def invoke_many(self, calls: List[Tuple[str, Tuple, Dict[str, Any]]]):
+        """
+        Batched entry point for the driver. `calls` holds, in issue order, all
+        the `invoke` and `coalesced_index_value` calls this stage receives in
+        a step, as `(method_name, args, kwargs)` tuples. Running them from a
+        single RPC makes the number of control messages per step independent
+        of the number of microbatches.
+        """
+        logging.debug(
+            f"[{self.stage_id}] Received invoke_many call with {len(calls)} calls"
+        )
+        for method, args, kwargs in calls:
+            if method not in ("invoke", "coalesced_index_value"):
+                raise ValueError(
+                    f"[{self.stage_id}] invoke_many does not support {method}"
+                )
+            getattr(self, method)(*args, **kwargs)
+
     def coalesced_index_value(
         self, indices: List[Tuple[str, int, ValueReference, int]]
     ):
@@ -996,6 +1444,9 @@ class PipeStageExecutor(EventRecorder):
             f"{len(batch_refs)} values initiated by stage {caller_stage} for {runlist_key}"
         )
 
+        # Pack the batch into one message if it has more than one value
+        coalesce = self.coalesce_p2p and len(batch_refs) > 1
+        values = []
         for _, value_ref_arg in batch_refs.items():
             with self.value_store_cv:
                 # Waiting for the indexed future for this arg to be created
@@ -1010,21 +1461,77 @@ class PipeStageExecutor(EventRecorder):
                 if refcounted_future.release():
                     self.value_store.pop(value_ref_arg.unique_key)
 
-            # Instead of return value let's do a send call
-            if torch.distributed.get_backend() == "gloo":
-                # Gloo P2P does not support work.get_future, so we use send instead
-                torch.distributed.send(value, caller_stage, tag=tag)
+            if coalesce:
+                values.append(value)
             else:
-                torch.distributed.isend(value, caller_stage, tag=tag)
+                self._send_value(value, caller_stage, tag)
+
+        if values:
+            # Unpacked by `batch_recv` on the caller
+            self._send_value(pack_tensors(values), caller_stage, tag)
 
         # Notify next send that's potentially waiting
         with self.caller_recv_tag_cv:
             self.caller_recv_tag[caller_stage] += 1
             self.caller_recv_tag_cv.notify_all()
 
+    @staticmethod
+    def _send_value(value, caller_stage, tag):
+        # Instead of return value let's do a send call
+        if torch.distributed.get_backend() == "gloo":
+            # Gloo P2P does not support work.get_future, so we use send instead
+            torch.distributed.send(value, caller_stage, tag=tag)
+        else:
+            torch.distributed.isend(value, caller_stage, tag=tag)
+
+    def _recv_value(self, recv_buff, callee_stage, tag):
+        if torch.distributed.get_backend() == "gloo":
+            # Gloo P2P does not support work.get_future, so we need to:
+            # - manually create the Future,
+            # - use recv instead, and
+            # - manually set_result to the Future
+            fut: torch.futures.Future = self.create_future()
+            torch.distributed.recv(recv_buff, callee_stage, tag=tag)
+            fut.set_result(recv_buff)
+        else:
+            work = torch.distributed.irecv(recv_buff, callee_stage, tag=tag)
+            fut = work.get_future()  # type: ignore[attr-defined]
+        return fut
+
+    def batch_recv_coalesced(
+        self, microbatch, runlist_key, callee_stage, batch_refs, tag
+    ):
+        metas = [
+            (ref.meta["tensor_meta"].shape, ref.meta["tensor_meta"].dtype)
+            for ref in batch_refs.values()
+        ]
+        packed_buff = self.recv_buffer_pool.acquire(
+            (_packed_offsets(metas)[1],), torch.uint8
+        )
+        with self.recv_buffers_lock:
+            self.recv_buffers.setdefault(runlist_key, []).append(packed_buff)
+        views = unpack_tensors(packed_buff, metas)
+
+        fut = self._recv_value(packed_buff, callee_stage, tag)
+
+        def bottom_half(fut):
+            logging.debug(
+                f"[{self.stage_id}][{microbatch}] Completing coalesced transfer of "
+                f"{len(views)} values for runlist item {runlist_key}"
+            )
+            for arg_idx, value in zip(batch_refs.keys(), views):
+                self.rank_worker.update_run_list(runlist_key, arg_idx, value)
+
+        return [fut.then(bottom_half)]
+
     def batch_recv(
         self, microbatch, runlist_key, callee_stage, batch_refs, tag
     ):
+        if self.coalesce_p2p and len(batch_refs) > 1:
+            return self.batch_recv_coalesced(
+                microbatch, runlist_key, callee_stage, batch_refs, tag
+            )
+
         logging.debug(
             f"[{self.stage_id}][{microbatch}] Receiving batch {tag} of {len(batch_refs)} values "
             f"for runlist item {runlist_key} from stage {callee_stage}"
@@ -1033,21 +1540,11 @@ class PipeStageExecutor(EventRecorder):
 
         for arg_idx, value_ref_arg in batch_refs.items():
             tm = value_ref_arg.meta["tensor_meta"]
-            recv_buff = torch.empty(
-                tm.shape, dtype=tm.dtype, device=self.device
-            )
-
-            if torch.distributed.get_backend() == "gloo":
-                # Gloo P2P does not support work.get_future, so we need to:
-                # - manually create the Future,
-                # - use recv instead, and
-                # - manually set_result to the Future
-                fut: torch.futures.Future = self.create_future()
-                torch.distributed.recv(recv_buff, callee_stage, tag=tag)
-                fut.set_result(recv_buff)
-            else:
-                work = torch.distributed.irecv(recv_buff, callee_stage, tag=tag)
-                fut = work.get_future()  # type: ignore[attr-defined]
+            recv_buff = self.recv_buffer_pool.acquire(tm.shape, tm.dtype)
+            with self.recv_buffers_lock:
+                self.recv_buffers.setdefault(runlist_key, []).append(recv_buff)
+
+            fut = self._recv_value(recv_buff, callee_stage, tag)
 
             def bottom_half(fut):
                 logging.debug(
@@ -1349,6 +1846,12 @@ class PipelineDriverBase(torch.nn.Module):
         checkpoint=False,
         use_c10d=False,
         loss_reducer: LossReducer = sum_reducer,
+        schedule_policy: Optional[PhasePriorityPolicy] = None,
+        static_schedule: bool = True,
+        fused_dispatch: bool = False,
+        coalesce_p2p: bool = False,
+        split_backward: bool = False,
+        activation_offload_budget: Optional[int] = None,
     ):
         super().__init__()
         self.pipe = pipe
@@ -1376,6 +1879,28 @@ class PipelineDriverBase(torch.nn.Module):
         self.optimizer_inited = False
         self.checkpoint = checkpoint
         self.use_c10d = use_c10d
+        # Whether c10d transfers of all values between two stages for a work
+        # item are packed into a single message
+        self.coalesce_p2p = coalesce_p2p
+        self.schedule_policy = schedule_policy
+        # Whether to dispatch work from a precompiled `_StaticSchedule` rather
+        # than from per-microbatch `RemoteInterpreter`s
+        self.static_schedule = static_schedule
+        # (num_chunks, grad_enabled) -> compiled schedule
+        self._static_schedules: Dict[Tuple[int, bool], _StaticSchedule] = {}
+        # Whether to send all the work of a stage in a step with one RPC
+        # (`PipeStageExecutor.invoke_many`). Requires the static schedule, which
+        # knows the whole step upfront
+        if fused_dispatch and not static_schedule:
+            raise ValueError("fused_dispatch requires static_schedule=True")
+        self.fused_dispatch = fused_dispatch
+        # Whether backward WorkItems only compute input gradients, deferring
+        # weight gradients to idle time of the rank
+        self.split_backward = split_backward
+        # Bytes of activations stashed for backward each stage keeps on its
+        # device; the rest is offloaded to host memory. None disables
+        # offloading
+        self.activation_offload_budget = activation_offload_budget
 
     def _init_remote_executors(self):
         self.rank_worker_rrefs: Dict[int, torch.distributed.rpc.RRef] = {}
@@ -1459,6 +1984,10 @@ class PipelineDriverBase(torch.nn.Module):
                 "pp_rank": pp_rank,
                 "_record_mem_dumps": self._record_mem_dumps,
                 "checkpoint": self.checkpoint,
+                "schedule_policy": self.schedule_policy,
+                "coalesce_p2p": self.coalesce_p2p,
+                "split_backward": self.split_backward,
+                "activation_offload_budget": self.activation_offload_budget,
             }
             self.rank_worker_rrefs[rank] = rpc.remote(
                 rank, RankWorker, args=(), kwargs=kwargs
@@ -1617,6 +2146,9 @@ class PipelineDriverBase(torch.nn.Module):
             interp.run_until(lambda n: False)
             output_vals.append(interp.env[last_node])
 
+        return self._fetch_output_values(output_vals)
+
+    def _fetch_output_values(self, output_vals):
         # First kick of async transfers to retrieve ValueReference values
         def initiate_async_transfer(a):
             if isinstance(a, ValueReference):
@@ -1643,6 +2175,8 @@ class PipelineDriverBase(torch.nn.Module):
             events_context.update(worker_rref.rpc_sync().retrieve_events())
         for interp in self.microbatch_interpreters:
             events_context.update(interp.retrieve_events())
+        for static_schedule in self._static_schedules.values():
+            events_context.update(static_schedule.retrieve_events())
         for _, executor_rref in self.remote_stage_executor_rrefs.values():
             events_context.update(executor_rref.rpc_sync().retrieve_events())
         events_context.events.sort(key=lambda e: e.start_ts)
@@ -1655,6 +2189,58 @@ class PipelineDriverBase(torch.nn.Module):
         return clean
 
 
+def _bind_placeholder_args(graph: pippy.fx.Graph, args, kwargs) -> Tuple:
+    """
+    Bind `args` and `kwargs` to the placeholders of `graph`, filling in
+    defaults. Returns one value per placeholder, in graph order.
+    """
+    # TODO: replace this with GraphModule.signature() when it lands
+    parameters = []
+    for node in graph.nodes:
+        if node.op != "placeholder":
+            continue
+        default = next(iter(node.args)) if node.args else Parameter.empty
+        parameters.append(
+            Parameter(
+                node.name, Parameter.POSITIONAL_OR_KEYWORD, default=default
+            )
+        )
+
+    # We are building a safety net here in case user passes in extra arguments than those defined as variable
+    # arguments (i.e. non-concrete args) at the tracing phase
+    # TODO: Remove this safety net
+    traced_args = [p.name for p in parameters]
+    filtered_kwargs = {k: v for k, v in kwargs.items() if k in traced_args}
+    if len(filtered_kwargs) != len(kwargs):
+        extra_args = kwargs.keys() - filtered_kwargs.keys()
+        warnings.warn(
+            f"Received extra arguments: {extra_args}. "
+            f"They might have already been given a concrete value during pipeline compilation via `concrete_args`. "
+            f"We will ignore the current inputs and use the values given during compilation."
+        )
+
+    sig = Signature(parameters)
+    bound_args = sig.bind(*args, **filtered_kwargs)
+    bound_args.apply_defaults()
+    return bound_args.args
+
+
+def _propagate_shape(module: pippy.fx.GraphModule, args, kwargs):
+    logging.info("Propagating shape across split GraphModule")
+    sp = shape_prop.ShapeProp(module)
+    # Not sure why FX's propagate API takes only args. Hence we unpack kwargs.values() without keys here
+    sp.propagate(*args, *kwargs.values())
+    for node in module.graph.nodes:
+        logging.debug(f"Node: {node.name}, outputs: ")
+        if "tensor_meta" in node.meta:
+            if isinstance(node.meta["tensor_meta"], shape_prop.TensorMetadata):
+                logging.debug(f"- {node.meta['tensor_meta']}")
+            else:
+                # Multiple output tensors
+                for t_meta in node.meta["tensor_meta"]:
+                    logging.debug(f"- {t_meta}")
+
+
 class RemoteInterpreter(pippy.fx.Interpreter, EventRecorder):
     def __init__(
         self,
@@ -1679,36 +2265,7 @@ class RemoteInterpreter(pippy.fx.Interpreter, EventRecorder):
         )
 
         # Process args/kwargs
-
-        # TODO: replace this with GraphModule.signature() when it lands
-        parameters = []
-        for node in self.module.graph.nodes:
-            if node.op != "placeholder":
-                continue
-            default = next(iter(node.args)) if node.args else Parameter.empty
-            parameters.append(
-                Parameter(
-                    node.name, Parameter.POSITIONAL_OR_KEYWORD, default=default
-                )
-            )
-
-        # We are building a safety net here in case user passes in extra arguments than those defined as variable
-        # arguments (i.e. non-concrete args) at the tracing phase
-        # TODO: Remove this safety net
-        traced_args = [p.name for p in parameters]
-        filtered_kwargs = {k: v for k, v in kwargs.items() if k in traced_args}
-        if len(filtered_kwargs) != len(kwargs):
-            extra_args = kwargs.keys() - filtered_kwargs.keys()
-            warnings.warn(
-                f"Received extra arguments: {extra_args}. "
-                f"They might have already been given a concrete value during pipeline compilation via `concrete_args`. "
-                f"We will ignore the current inputs and use the values given during compilation."
-            )
-
-        sig = Signature(parameters)
-        bound_args = sig.bind(*args, **filtered_kwargs)
-        bound_args.apply_defaults()
-        self.args = bound_args.args
+        self.args = _bind_placeholder_args(self.module.graph, args, kwargs)
         self.args_iter = iter(self.args)
         self.batch_id = batch_id
         self.num_microbatches = num_microbatches
@@ -1992,21 +2549,7 @@ class RemoteInterpreter(pippy.fx.Interpreter, EventRecorder):
         return node
 
     def propagate_shape(self, args, kwargs):
-        logging.info("Propagating shape across split GraphModule")
-        sp = shape_prop.ShapeProp(self.module)
-        # Not sure why FX's propagate API takes only args. Hence we unpack kwargs.values() without keys here
-        sp.propagate(*args, *kwargs.values())
-        for node in self.node_list:
-            logging.debug(f"Node: {node.name}, outputs: ")
-            if "tensor_meta" in node.meta:
-                if isinstance(
-                    node.meta["tensor_meta"], shape_prop.TensorMetadata
-                ):
-                    logging.debug(f"- {node.meta['tensor_meta']}")
-                else:
-                    # Multiple output tensors
-                    for t_meta in node.meta["tensor_meta"]:
-                        logging.debug(f"- {t_meta}")
+        _propagate_shape(self.module, args, kwargs)
 
 
 class _run_until_criteria:
@@ -2034,6 +2577,430 @@ class _run_until_criteria:
             return False
 
 
+class _InstructionKind(Enum):
+    PLACEHOLDER = 0
+    INVOKE = 1
+    GETITEM = 2
+    NOOP = 3
+    OUTPUT = 4
+
+
+class _EnvRef:
+    """
+    Reference to the value produced by the `idx`-th node, used in place of
+    `fx.Node` in the args/kwargs of a compiled instruction
+    """
+
+    __slots__ = ("idx",)
+
+    def __init__(self, idx: int):
+        self.idx = idx
+
+
+class _Instruction:
+    """
+    A node of `split_gm` lowered into the action the driver takes for it. All
+    the information that does not depend on the microbatch (target stage,
+    refcount, debug string, argument wiring) is computed once here.
+    """
+
+    def __init__(
+        self,
+        node: pippy.fx.Node,
+        kind: _InstructionKind,
+        args=(),
+        kwargs=None,
+        stage_id: int = -1,
+        executor=None,
+        phase: Optional[Phase] = None,
+        refcount: int = 0,
+        placeholder_idx: int = -1,
+    ):
+        self.node = node
+        self.name = node.name
+        self.kind = kind
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.stage_id = stage_id
+        self.executor = executor
+        self.phase = phase
+        self.refcount = refcount
+        self.placeholder_idx = placeholder_idx
+        self.debug_str = node.format_node()
+
+
+class _StaticSchedule(EventRecorder):
+    """
+    Precompiled form of the fill-drain dispatch performed by
+    `PipelineDriverFillDrain` with `RemoteInterpreter`s. For a given `split_gm`,
+    number of microbatches and grad mode, the sequence of `invoke` and
+    `coalesced_index_value` calls issued by the driver is always the same;
+    only the microbatch inputs and the batch id change from step to step.
+    We hence walk the graph once, lower each node into an `_Instruction` and
+    record the dispatch order as a flat program of
+    `(chunk, first_node_idx, last_node_idx, flush_getitems)` segments, which
+    `run` replays every step.
+    """
+
+    def __init__(
+        self,
+        split_gm: pippy.fx.GraphModule,
+        remote_stage_executor_rrefs,
+        stage_to_executor,
+        num_chunks: int,
+        grad_enabled: bool,
+    ):
+        self.split_gm = split_gm
+        self.stage_to_executor = stage_to_executor
+        self.num_chunks = num_chunks
+        self.node_list = list(split_gm.graph.nodes)
+        self.instructions = self._lower(
+            self.node_list, remote_stage_executor_rrefs, grad_enabled
+        )
+        self.program = self._compile_program(self.node_list, num_chunks)
+        self.output_idx = len(self.node_list) - 1
+        assert (
+            self.instructions[self.output_idx].kind == _InstructionKind.OUTPUT
+        )
+        logging.info(
+            f"[root] Compiled static schedule for {num_chunks} chunks: "
+            f"{len(self.instructions)} instructions, {len(self.program)} segments"
+        )
+
+    @staticmethod
+    def _lower(
+        node_list: List[pippy.fx.Node],
+        remote_stage_executor_rrefs,
+        grad_enabled: bool,
+    ) -> List["_Instruction"]:
+        node_to_idx = {node: idx for idx, node in enumerate(node_list)}
+        instructions: List[_Instruction] = []
+        placeholder_idx = 0
+
+        for node in node_list:
+            # If the driver runs under `torch.no_grad()` then `stage_backward*`
+            # nodes are not executed and must not be counted as users
+            if grad_enabled:
+                refcount = len(node.users)
+            else:
+                refcount = len(
+                    [
+                        user
+                        for user in node.users
+                        if not user.name.startswith("stage_backward")
+                    ]
+                )
+            args = pippy.fx.node.map_arg(
+                node.args, lambda n: _EnvRef(node_to_idx[n])
+            )
+            kwargs = pippy.fx.node.map_arg(
+                node.kwargs, lambda n: _EnvRef(node_to_idx[n])
+            )
+
+            def invoke(stage_name, phase):
+                stage_id, executor = remote_stage_executor_rrefs[stage_name]
+                return _Instruction(
+                    node,
+                    _InstructionKind.INVOKE,
+                    args,
+                    kwargs,
+                    stage_id=stage_id,
+                    executor=executor,
+                    phase=phase,
+                    refcount=refcount,
+                )
+
+            def noop(stage_name):
+                stage_id, _ = remote_stage_executor_rrefs[stage_name]
+                return _Instruction(
+                    node, _InstructionKind.NOOP, stage_id=stage_id
+                )
+
+            if node.op == "placeholder":
+                instr = _Instruction(
+                    node,
+                    _InstructionKind.PLACEHOLDER,
+                    placeholder_idx=placeholder_idx,
+                )
+                placeholder_idx += 1
+            elif node.op == "output":
+                instr = _Instruction(node, _InstructionKind.OUTPUT, args)
+            elif (
+                node.op == "call_module"
+                and node.target in remote_stage_executor_rrefs
+            ):
+                instr = invoke(node.target, Phase.FORWARD)
+            elif (node.op, node.target) == ("call_function", operator.getitem):
+                src = instructions[node_to_idx[node.args[0]]]
+                noop_src = src.kind == _InstructionKind.NOOP or (
+                    src.kind == _InstructionKind.GETITEM and src.refcount == 0
+                )
+                instr = _Instruction(
+                    node,
+                    _InstructionKind.GETITEM,
+                    args,
+                    # A getitem with no user, or of a value that is not
+                    # computed, is not forwarded to the stage
+                    refcount=0
+                    if refcount == 0 or (not grad_enabled and noop_src)
+                    else refcount,
+                )
+            elif (node.op, node.target) == ("call_function", stage_backward):
+                assert "fw_stage" in node.meta
+                instr = (
+                    invoke(node.meta["fw_stage"], Phase.BACKWARD)
+                    if grad_enabled
+                    else noop(node.meta["fw_stage"])
+                )
+            elif (node.op, node.target) == ("call_function", sync_barrier):
+                first_stage = next(iter(remote_stage_executor_rrefs))
+                instr = invoke(first_stage, Phase.SYNC_BARRIER)
+            elif (node.op, node.target) == (
+                "call_function",
+                _null_coalesce_accumulate,
+            ):
+                assert "fw_stage" in node.meta
+                instr = (
+                    invoke(node.meta["fw_stage"], Phase.ACCUMULATE_GRAD)
+                    if grad_enabled
+                    else noop(node.meta["fw_stage"])
+                )
+            else:
+                raise AssertionError(
+                    f"Cannot compile node {node.format_node()} into a static schedule"
+                )
+            instructions.append(instr)
+
+        return instructions
+
+    @staticmethod
+    def _compile_program(
+        node_list: List[pippy.fx.Node], num_chunks: int
+    ) -> List[Tuple[int, int, int, bool]]:
+        # Mirrors the ramp-up / steady-state clock cycle of
+        # `PipelineDriverFillDrain` using program counters only
+        n_nodes = len(node_list)
+        pcs = [0] * num_chunks
+        program: List[Tuple[int, int, int, bool]] = []
+
+        def run_until(chunk, predicate):
+            start = pc = pcs[chunk]
+            hit = False
+            while pc < n_nodes:
+                if predicate(node_list[pc]):
+                    hit = True
+                    break
+                pc += 1
+            pcs[chunk] = pc
+            if pc > start:
+                program.append((chunk, start, pc, hit))
+
+        # Advance past placeholders
+        for chunk in range(num_chunks):
+            run_until(chunk, lambda n: n.op != "placeholder")
+
+        # Ramp-up
+        for ramp_up_idx in range(num_chunks):
+            for chunk in range(ramp_up_idx + 1):
+                run_until(chunk, _run_until_criteria().hitting_next_stage)
+
+        # Steady-state
+        any_valid = True
+        while any_valid:
+            any_valid = False
+            for chunk in range(num_chunks):
+                start_idx = min(pcs[chunk], n_nodes - 1)
+                run_until(chunk, _run_until_criteria().hitting_next_stage)
+                any_valid |= min(pcs[chunk], n_nodes - 1) != start_idx
+
+        assert all(node_list[pc].op == "output" for pc in pcs)
+
+        # Run the output nodes
+        for chunk in range(num_chunks):
+            run_until(chunk, lambda n: False)
+
+        return program
+
+    def run(
+        self, args_split, kwargs_split, batch_id: int, fused: bool = False
+    ) -> List[Any]:
+        """
+        Issue all the work of one step. Returns the output value of each
+        chunk, made of `ValueReference`s.
+
+        If `fused` is True, the calls destined to each stage are buffered and
+        sent at the end of the step with a single `invoke_many` RPC per stage.
+        """
+        # Stage id -> calls buffered for `PipeStageExecutor.invoke_many`
+        self._fused_calls: Optional[Dict[int, List[Tuple[str, Tuple, Dict]]]]
+        self._fused_calls = {} if fused else None
+
+        num_chunks = len(args_split)
+        assert num_chunks == self.num_chunks
+        n_nodes = len(self.instructions)
+        envs: List[List[Any]] = [[None] * n_nodes for _ in range(num_chunks)]
+        placeholder_args = [
+            _bind_placeholder_args(
+                self.split_gm.graph, args_split[chunk], kwargs_split[chunk]
+            )
+            for chunk in range(num_chunks)
+        ]
+        # Per chunk: dict from stage id to a list holding the coalesced getitem
+        # indices
+        stage_output_indices: List[
+            Dict[int, List[Tuple[str, int, ValueReference, int]]]
+        ] = [{} for _ in range(num_chunks)]
+
+        for chunk, start, end, flush in self.program:
+            env = envs[chunk]
+
+            def lookup(a):
+                return env[a.idx] if isinstance(a, _EnvRef) else a
+
+            for idx in range(start, end):
+                instr = self.instructions[idx]
+                kind = instr.kind
+                if kind == _InstructionKind.PLACEHOLDER:
+                    env[idx] = placeholder_args[chunk][instr.placeholder_idx]
+                elif kind == _InstructionKind.INVOKE:
+                    env[idx] = self._invoke(
+                        instr,
+                        chunk,
+                        pippy.fx.node.map_aggregate(instr.args, lookup),
+                        pippy.fx.node.map_aggregate(instr.kwargs, lookup),
+                        batch_id,
+                    )
+                elif kind == _InstructionKind.GETITEM:
+                    val_ref = env[instr.args[0].idx]
+                    assert isinstance(val_ref, ValueReference)
+                    if instr.refcount == 0:
+                        env[idx] = ValueReference(val_ref.stage_id, "noop")
+                    else:
+                        invocation_key = f"{chunk}_{instr.name}"
+                        stage_output_indices[chunk].setdefault(
+                            val_ref.stage_id, []
+                        ).append(
+                            (
+                                invocation_key,
+                                instr.refcount,
+                                val_ref,
+                                instr.args[1],
+                            )
+                        )
+                        env[idx] = ValueReference(
+                            val_ref.stage_id, invocation_key
+                        )
+                elif kind == _InstructionKind.NOOP:
+                    env[idx] = ValueReference(instr.stage_id, "noop")
+                else:
+                    env[idx] = pippy.fx.node.map_aggregate(
+                        instr.args[0], lookup
+                    )
+
+            if flush:
+                self._issue_coalesced_getitem_calls(
+                    chunk, stage_output_indices[chunk], batch_id
+                )
+
+        if fused:
+            self._flush_fused_calls(batch_id)
+
+        return [env[self.output_idx] for env in envs]
+
+    def _dispatch(self, stage_id, method, *args, **kwargs):
+        if self._fused_calls is not None:
+            self._fused_calls.setdefault(stage_id, []).append(
+                (method, args, kwargs)
+            )
+        else:
+            executor = self.stage_to_executor[stage_id]
+            getattr(executor.rpc_async(), method)(*args, **kwargs)
+
+    def _flush_fused_calls(self, batch_id):
+        assert self._fused_calls is not None
+        for stage_id, calls in self._fused_calls.items():
+            name = f"IM{stage_id}"
+            start_ts = time.time()
+            self.stage_to_executor[stage_id].rpc_async().invoke_many(calls)
+            finish_ts = time.time()
+            self.record_event(
+                rank=0,
+                start_ts=start_ts,
+                finish_ts=finish_ts,
+                id=f"{name},{batch_id}",
+                name=name,
+                type="invoke",
+                mbid=None,
+            )
+        self._fused_calls = None
+
+    def _invoke(self, instr, chunk, args, kwargs, batch_id):
+        invocation_key = f"{chunk}_{instr.name}"
+        start_ts = time.time()
+        self._dispatch(
+            instr.stage_id,
+            "invoke",
+            invocation_key,
+            instr.phase,
+            args,
+            kwargs,
+            chunk,
+            debug_str=instr.debug_str,
+            output_refcount=instr.refcount,
+            batch_id=batch_id,
+            num_microbatches=self.num_chunks,
+        )
+        finish_ts = time.time()
+        if instr.phase in (Phase.FORWARD, Phase.BACKWARD):
+            target_name = event_name(instr.phase, instr.stage_id, chunk)
+            target_id = event_id(instr.phase, instr.stage_id, chunk, batch_id)
+            self.record_event(
+                rank=0,
+                start_ts=start_ts,
+                finish_ts=finish_ts,
+                id=f"I{target_id}",
+                name=f"I{target_name}",
+                type="invoke",
+                mbid=chunk,
+            )
+            self.record_event_dependency(
+                from_id=f"I{target_name}",
+                to_id=f"R{target_name}"
+                if instr.phase == Phase.FORWARD
+                else target_name,
+                type="invoke",
+            )
+
+        val_ref = ValueReference(instr.stage_id, invocation_key)
+        # Insert tensor meta to ValueReference returned by stage call
+        if instr.phase == Phase.FORWARD and isinstance(
+            instr.node.meta.get("tensor_meta", None),
+            shape_prop.TensorMetadata,
+        ):
+            val_ref.meta["tensor_meta"] = instr.node.meta["tensor_meta"]
+        return val_ref
+
+    def _issue_coalesced_getitem_calls(
+        self, chunk, stage_output_indices, batch_id
+    ):
+        for stage_id, indices in stage_output_indices.items():
+            name = f"G{stage_id},{chunk}"
+            start_ts = time.time()
+            self._dispatch(stage_id, "coalesced_index_value", indices)
+            finish_ts = time.time()
+            self.record_event(
+                rank=0,
+                start_ts=start_ts,
+                finish_ts=finish_ts,
+                id=f"{name},{batch_id}",
+                name=name,
+                type="invoke",
+                mbid=chunk,
+            )
+
+        stage_output_indices.clear()
+
+
 class PipelineDriverFillDrain(PipelineDriverBase):
     def __init__(
         self,
@@ -2052,6 +3019,12 @@ class PipelineDriverFillDrain(PipelineDriverBase):
         checkpoint=False,
         use_c10d=False,
         loss_reducer: LossReducer = sum_reducer,
+        schedule_policy: Optional[PhasePriorityPolicy] = None,
+        static_schedule: bool = True,
+        fused_dispatch: bool = False,
+        coalesce_p2p: bool = False,
+        split_backward: bool = False,
+        activation_offload_budget: Optional[int] = None,
     ):
         super().__init__(
             pipe,
@@ -2068,6 +3041,12 @@ class PipelineDriverFillDrain(PipelineDriverBase):
             checkpoint=checkpoint,
             use_c10d=use_c10d,
             loss_reducer=loss_reducer,
+            schedule_policy=schedule_policy,
+            static_schedule=static_schedule,
+            fused_dispatch=fused_dispatch,
+            coalesce_p2p=coalesce_p2p,
+            activation_offload_budget=activation_offload_budget,
+            split_backward=split_backward,
         )
         self.single_loss = single_loss
 
@@ -2075,43 +3054,34 @@ class PipelineDriverFillDrain(PipelineDriverBase):
 
         self._init_remote_executors()
 
-    def forward(self, *args, **kwargs):
-        if self.single_loss:
-            raise NotImplementedError("Single minibatch loss not implemented")
-
-        # Roadmap:
-        # 1) Micro-batch splitting - divide input arguments out into concrete chunk values
-        # 2) Interpreter tiling - one interpreter per micro-batch
-        # 3) Scheduling - Use control logic to advance interpreters to issue round-robin
-        #       forward work items, then round-robin losses, then round-robin backwards
-
-        args_split, kwargs_split = split_args_kwargs_into_chunks(
-            args,
-            kwargs,
-            self.chunks,
-            self.args_chunk_spec,
-            self.kwargs_chunk_spec,
-            self._debug_mask_minibatches,
-        )
+    def _run_static_schedule(self, args_split, kwargs_split, batch_id):
+        num_chunks = len(args_split)
+        grad_enabled = torch.is_grad_enabled()
+        key = (num_chunks, grad_enabled)
+        if key not in self._static_schedules:
+            self._static_schedules[key] = _StaticSchedule(
+                self.pipe.split_gm,
+                self.remote_stage_executor_rrefs,
+                self.stage_to_executor,
+                num_chunks,
+                grad_enabled,
+            )
 
-        real_num_chunks = self.chunks
-        if len(args_split) < self.chunks:
-            real_num_chunks = len(args_split)
-            warnings.warn(
-                f"Reducing micro-batch numbers from {self.chunks} to "
-                f"{real_num_chunks}."
+        # If user wants to use c10d for P2P, we would perform the shape propagation here. The shape prop is
+        # performed per batch, thus supporting dynamic shape in batch dimension. The compiled schedule reads tensor
+        # meta from `split_gm` at dispatch time, so it picks up the new shapes.
+        if self.use_c10d:
+            _propagate_shape(
+                self.pipe.split_gm, args_split[0], kwargs_split[0]
             )
 
-        logging.info(
-            f"[root] Running pipeline with {real_num_chunks} micro-batches"
+        output_vals = self._static_schedules[key].run(
+            args_split, kwargs_split, batch_id, fused=self.fused_dispatch
         )
+        return self._fetch_output_values(output_vals)
 
-        self.microbatch_interpreters = []
-
-        batch_id = self.batch_id
-        self.batch_id += 1
-
-        for chunk in range(real_num_chunks):
+    def _run_interpreters(self, args_split, kwargs_split, batch_id):
+        for chunk in range(len(args_split)):
             logging.debug(
                 f"[root] Instantiating microbatch interpreter for chunk {chunk}"
             )
@@ -2123,7 +3093,7 @@ class PipelineDriverFillDrain(PipelineDriverBase):
                 args=args_split[chunk],
                 kwargs=kwargs_split[chunk],
                 batch_id=batch_id,
-                num_microbatches=real_num_chunks,
+                num_microbatches=len(args_split),
             )
             # If user wants to use c10d for P2P, we would perform the shape propagation here. The shape prop is
             # performed per batch, thus supporting dynamic shape in batch dimension. Dynamic shape in microbatch
@@ -2174,10 +3144,56 @@ class PipelineDriverFillDrain(PipelineDriverBase):
         ]
         assert all(node.op == "output" for node in last_nodes)
 
-        local_results_and_last_grads = self._retrieve_output_values(
+        return self._retrieve_output_values(
             self.microbatch_interpreters, last_nodes
         )
 
+    def forward(self, *args, **kwargs):
+        if self.single_loss:
+            raise NotImplementedError("Single minibatch loss not implemented")
+
+        # Roadmap:
+        # 1) Micro-batch splitting - divide input arguments out into concrete chunk values
+        # 2) Interpreter tiling - one interpreter per micro-batch, or replay of a
+        #       precompiled static schedule covering all micro-batches
+        # 3) Scheduling - Use control logic to advance interpreters to issue round-robin
+        #       forward work items, then round-robin losses, then round-robin backwards
+
+        args_split, kwargs_split = split_args_kwargs_into_chunks(
+            args,
+            kwargs,
+            self.chunks,
+            self.args_chunk_spec,
+            self.kwargs_chunk_spec,
+            self._debug_mask_minibatches,
+        )
+
+        real_num_chunks = self.chunks
+        if len(args_split) < self.chunks:
+            real_num_chunks = len(args_split)
+            warnings.warn(
+                f"Reducing micro-batch numbers from {self.chunks} to "
+                f"{real_num_chunks}."
+            )
+
+        logging.info(
+            f"[root] Running pipeline with {real_num_chunks} micro-batches"
+        )
+
+        self.microbatch_interpreters = []
+
+        batch_id = self.batch_id
+        self.batch_id += 1
+
+        if self.static_schedule:
+            local_results_and_last_grads = self._run_static_schedule(
+                args_split, kwargs_split, batch_id
+            )
+        else:
+            local_results_and_last_grads = self._run_interpreters(
+                args_split, kwargs_split, batch_id
+            )
+
         if self.pipe.has_loss_and_backwards:
             # Shared parameter sync
             # At this point, all of the gradient jobs should have been run
@@ -2220,6 +3236,12 @@ class PipelineDriver1F1B(PipelineDriverFillDrain):
         checkpoint=False,
         use_c10d=False,
         loss_reducer: LossReducer = sum_reducer,
+        schedule_policy: Optional[PhasePriorityPolicy] = None,
+        static_schedule: bool = True,
+        fused_dispatch: bool = False,
+        coalesce_p2p: bool = False,
+        split_backward: bool = False,
+        activation_offload_budget: Optional[int] = None,
     ):
         # In 1F1B with backward stages, the maximum number of outstanding
         # micro-batches equals the number of pipeline stages
@@ -2243,6 +3265,12 @@ class PipelineDriver1F1B(PipelineDriverFillDrain):
             checkpoint=checkpoint,
             use_c10d=use_c10d,
             loss_reducer=loss_reducer,
+            schedule_policy=schedule_policy,
+            static_schedule=static_schedule,
+            fused_dispatch=fused_dispatch,
+            coalesce_p2p=coalesce_p2p,
+            activation_offload_budget=activation_offload_budget,
+            split_backward=split_backward,
         )
 
 
@@ -2262,6 +3290,11 @@ class PipelineDriverInterleaved1F1B(PipelineDriver1F1B):
         checkpoint=False,
         use_c10d=False,
         loss_reducer: LossReducer = sum_reducer,
+        schedule_policy: Optional[PhasePriorityPolicy] = None,
+        static_schedule: bool = True,
+        fused_dispatch: bool = False,
+        coalesce_p2p: bool = False,
+        activation_offload_budget: Optional[int] = None,
     ):
         super().__init__(
             pipe,
@@ -2278,4 +3311,63 @@ class PipelineDriverInterleaved1F1B(PipelineDriver1F1B):
             checkpoint=checkpoint,
             use_c10d=use_c10d,
             loss_reducer=loss_reducer,
+            schedule_policy=schedule_policy,
+            static_schedule=static_schedule,
+            fused_dispatch=fused_dispatch,
+            coalesce_p2p=coalesce_p2p,
+            activation_offload_budget=activation_offload_budget,
+        )
+
+
+class PipelineDriverZeroBubble(PipelineDriver1F1B):
+    """
+    1F1B with split backward: a stage sends the gradients of its inputs
+    upstream before computing the gradients of its weights, which are
+    deferred to the time the rank would otherwise idle. See "Zero Bubble
+    Pipeline Parallelism" (Qi et al.).
+    """
+
+    def __init__(
+        self,
+        pipe: Pipe,
+        chunks: int,
+        world_size: int,
+        all_ranks: List[int] = None,
+        args_chunk_spec=None,
+        kwargs_chunk_spec=None,
+        output_chunk_spec=None,
+        single_loss: bool = False,
+        _debug_mask_minibatches: bool = False,
+        interleave_stages=False,
+        _record_mem_dumps=False,
+        checkpoint=False,
+        use_c10d=False,
+        loss_reducer: LossReducer = sum_reducer,
+        schedule_policy: Optional[PhasePriorityPolicy] = None,
+        static_schedule: bool = True,
+        fused_dispatch: bool = False,
+        coalesce_p2p: bool = False,
+        activation_offload_budget: Optional[int] = None,
+    ):
+        super().__init__(
+            pipe,
+            chunks,
+            world_size,
+            all_ranks,
+            args_chunk_spec,
+            kwargs_chunk_spec,
+            output_chunk_spec,
+            single_loss,
+            _debug_mask_minibatches,
+            interleave_stages=interleave_stages,
+            _record_mem_dumps=_record_mem_dumps,
+            checkpoint=checkpoint,
+            use_c10d=use_c10d,
+            loss_reducer=loss_reducer,
+            schedule_policy=schedule_policy,
+            static_schedule=static_schedule,
+            fused_dispatch=fused_dispatch,
+            coalesce_p2p=coalesce_p2p,
+            activation_offload_budget=activation_offload_budget,
+            split_backward=True,
         )
@@ -1,7 +1,8 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates
 import logging
 import operator
-from typing import Any, Dict, List, Optional, Tuple
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import torch
 import torch.distributed as dist
@@ -9,22 +10,20 @@ from torch.nn.parallel import DistributedDataParallel
 
 import pippy
 import pippy.fx
-from pippy.backward import stage_backward, sync_barrier
+from pippy.backward import stage_backward, stage_backward_input, sync_barrier
 from pippy.debug import map_debug_info
 
 from pippy.fx.passes import shape_prop
 from pippy.IR import Pipe
-from pippy.microbatch import merge_chunks, split_args_kwargs_into_chunks
-from pippy.utils import flatten_args
-
-
-def _make_tensor_from_meta(
-    tensor_meta: shape_prop.TensorMetadata,
-    device: torch.device,
-) -> torch.Tensor:
-    return torch.empty(
-        tensor_meta.shape, dtype=tensor_meta.dtype, device=device
-    )
+from pippy.microbatch import ChunkMerger, split_args_kwargs_into_chunks
+from pippy.utils import (
+    _packed_offsets,
+    ActivationOffloader,
+    flatten_args,
+    pack_tensors,
+    RecvBufferPool,
+    unpack_tensors,
+)
 
 
 class RecvInfo:
@@ -32,20 +31,88 @@ class RecvInfo:
         self,
         input_name: str,
         source: int,
-        buffer: torch.Tensor,
+        tensor_meta: shape_prop.TensorMetadata,
+        requires_grad: bool = False,
+        output_idx: int = 0,
+        tag: int = 0,
     ):
         self.input_name = input_name
         self.source = source
-        self.buffer = buffer
+        # P2P tag of the transfer, see `PipelineStage._p2p_tag`
+        self.tag = tag
+        self.tensor_meta = tensor_meta
+        self.requires_grad = requires_grad
+        # Index of the value among the outputs of the source stage
+        self.output_idx = output_idx
+        # Buffer from the recv buffer pool, held from the time the tensor is
+        # received until it is no longer needed by the stage
+        self.buffer: Optional[torch.Tensor] = None
+        # If received coalesced, `buffer` is a view of this pooled buffer
+        self.packed_buffer: Optional[torch.Tensor] = None
 
     def __repr__(self):
-        return f"RecvInfo(input={self.input_name}, source={self.source}, buffer={self.buffer.size()})"
+        return f"RecvInfo(input={self.input_name}, source={self.source}, shape={self.tensor_meta.shape})"
 
 
 class StageArgPlaceholder:
     pass
 
 
+# Number of distinct recv buffer shapes kept by the recv buffer pool in
+# dynamic shape mode
+_DYNAMIC_SHAPES_POOL_KEYS = 16
+
+
+class _ShapeFirstRecv:
+    """
+    Recv request of tensors whose shapes are only known at run time (dynamic
+    shape mode). The sender sends the shapes ahead of the tensors, with the
+    same tag; once the shapes have arrived, `post_recv(shapes)` allocates
+    buffers of those shapes and posts the recv of the tensors.
+
+    Nothing is posted until the request is polled or waited on, so that
+    messages from a peer keep being received in the order they were sent,
+    also on backends ignoring tags.
+    """
+
+    def __init__(
+        self,
+        header: torch.Tensor,
+        peer: int,
+        tag: int,
+        group: Optional[dist.ProcessGroup],
+        post_recv: Callable[[List[int]], dist.Work],
+    ):
+        self.header = header
+        self.peer = peer
+        self.tag = tag
+        self.group = group
+        self.post_recv = post_recv
+        self.header_work: Optional[dist.Work] = None
+        self.work: Optional[dist.Work] = None
+
+    def _post_header(self):
+        if self.header_work is None:
+            self.header_work = dist.irecv(
+                self.header, self.peer, group=self.group, tag=self.tag
+            )
+
+    def is_completed(self) -> bool:
+        self._post_header()
+        if self.work is None:
+            if not self.header_work.is_completed():
+                return False
+            self.work = self.post_recv(self.header.tolist())
+        return self.work.is_completed()
+
+    def wait(self):
+        self._post_header()
+        if self.work is None:
+            self.header_work.wait()
+            self.work = self.post_recv(self.header.tolist())
+        self.work.wait()
+
+
 class PipelineStage(torch.nn.Module):
     def __init__(
         self,
@@ -58,6 +125,10 @@ class PipelineStage(torch.nn.Module):
         args_chunk_spec=None,
         kwargs_chunk_spec=None,
         output_chunk_spec=None,
+        coalesce_p2p: bool = False,
+        overlap_p2p: bool = False,
+        activation_offload_budget: Optional[int] = None,
+        dynamic_shapes: bool = False,
     ):
         super().__init__()
         self.pipe = pipe
@@ -69,6 +140,21 @@ class PipelineStage(torch.nn.Module):
         self.args_chunk_spec = args_chunk_spec
         self.kwargs_chunk_spec = kwargs_chunk_spec
         self.output_chunk_spec = output_chunk_spec
+        # Send all tensors going to the same peer for a chunk as one message
+        self.coalesce_p2p = coalesce_p2p
+        # Post the recvs of the next chunk before computing the current one
+        self.overlap_p2p = overlap_p2p
+        # Send the shapes of activations and grads ahead of them, instead of
+        # relying on the static shapes of the traced program
+        self.dynamic_shapes = dynamic_shapes
+        # Activations saved for backward beyond this many bytes are offloaded
+        # to host memory, None keeps them all on the device
+        self.activation_offloader = (
+            ActivationOffloader(device, activation_offload_budget)
+            if activation_offload_budget is not None
+            and pipe.has_loss_and_backwards
+            else None
+        )
 
         # `group_rank` is rank in process group `group`.
         self.group_rank = dist.get_rank(group)
@@ -83,8 +169,24 @@ class PipelineStage(torch.nn.Module):
         self.all_act_send_reqs: List[dist.Work] = []
         # Grad send requests of all chunk
         self.all_grad_send_reqs: List[dist.Work] = []
-        # Caching chunk outputs for final output merge or reduction
-        self.output_chunks: List[Any] = []
+        # Merges (or reduces) chunk outputs as they are produced, last stage
+        # only
+        self.output_merger: Optional[ChunkMerger] = None
+        # Prefetched recv requests of activations / grads, by chunk
+        self.pending_act_recvs: Dict[int, List[dist.Work]] = {}
+        self.pending_grad_recvs: Dict[int, List[dist.Work]] = {}
+        # Weight grad passes deferred by split backward, by chunk, in the
+        # order the input grad passes ran
+        self.deferred_weight_grads: Dict[int, Callable[[], None]] = {}
+        # Time (s) spent in compute and blocked on comm during the last step
+        self.step_timing: Dict[str, float] = dict.fromkeys(
+            ["compute", "recv_wait", "send_wait"], 0.0
+        )
+        # Buffers for received activations and gradients
+        self.recv_buffer_pool = RecvBufferPool(
+            self.device,
+            max_keys=_DYNAMIC_SHAPES_POOL_KEYS if dynamic_shapes else None,
+        )
 
         # Find my submodule
         self.split_gm = self.pipe.split_gm
@@ -150,21 +252,21 @@ class PipelineStage(torch.nn.Module):
         Create send/recv infrastructures for activations (during forward) and
         gradients (during backward)
         """
-        # chunk : Tuple of arg buffers
+        # chunk : Tuple of arg recv info
         self.args_recv_info: Dict[int, Tuple] = {}
-        # chunk : Dict of kwarg buffers
+        # chunk : Dict of kwarg recv info
         self.kwargs_recv_info: Dict[int, Dict] = {}
         for chunk in range(self.chunks):
             (
                 self.args_recv_info[chunk],
                 self.kwargs_recv_info[chunk],
-            ) = self._create_act_recv_buffers()
+            ) = self._create_act_recv_info()
 
         # Send info during forward for each activation
         self.act_send_info = self._create_act_send_info()
 
         if self.pipe.has_loss_and_backwards:
-            # chunk : List of output grad buffers
+            # chunk : List of output grad recv info
             # `grad_recv_info` is a mirror of `act_send_info`
             self.grad_recv_info: Dict = {}
             for chunk in range(self.chunks):
@@ -190,7 +292,16 @@ class PipelineStage(torch.nn.Module):
 
         return self.submod_to_stage_index[submod_name]
 
-    def _create_act_recv_buffers(
+    def _p2p_tag(self, src_stage: int, dst_stage: int, is_grad=False) -> int:
+        """
+        Tag of the transfers of activations (or grads) from `src_stage` to
+        `dst_stage`. Each stage-to-stage stream has its own tag, so that
+        transfers between two ranks hosting several stages (interleaving)
+        cannot be mismatched on backends honoring tags.
+        """
+        return (src_stage * self.nstages + dst_stage) * 2 + int(is_grad)
+
+    def _create_act_recv_info(
         self,
     ):
         def create_recv_tensor(
@@ -198,7 +309,7 @@ class PipelineStage(torch.nn.Module):
             output_idx: Optional[int] = None,
         ):
             """
-            Create a tensor for receiving the `output_idx`-th value from
+            Create the info for receiving the `output_idx`-th value from
             `input_node`
             """
             if input_node.op == "placeholder":
@@ -228,19 +339,19 @@ class PipelineStage(torch.nn.Module):
 
             logging.info(
                 f"[{self.group_rank}][{self.name}] "
-                f"Creating recv buffer for input '{input_node.name}' "
+                f"Creating recv info for input '{input_node.name}' "
                 f"value index {output_idx}: {tensor_meta.shape}"
             )
 
             src_rank = self.get_stage_index_of_submod(input_node.name)
-            buffer = _make_tensor_from_meta(tensor_meta, self.device)
-            # Enable gradient in training mode
-            if self.pipe.has_loss_and_backwards:
-                buffer.requires_grad_(True)
             return RecvInfo(
                 input_node.name,
                 src_rank,
-                buffer,
+                tensor_meta,
+                # Enable gradient in training mode
+                requires_grad=self.pipe.has_loss_and_backwards,
+                output_idx=output_idx or 0,
+                tag=self._p2p_tag(src_rank, self.stage_index),
             )
 
         # `args` is a Tuple, hence we will have:
@@ -335,7 +446,9 @@ class PipelineStage(torch.nn.Module):
             grad_recv_info[out_idx] = RecvInfo(
                 f"{grad_src}",
                 grad_src,
-                _make_tensor_from_meta(tensor_meta, self.device),
+                tensor_meta,
+                output_idx=out_idx,
+                tag=self._p2p_tag(grad_src, self.stage_index, is_grad=True),
             )
 
         logging.info(
@@ -370,22 +483,89 @@ class PipelineStage(torch.nn.Module):
         return grad_send_info
 
     def _recv_tensor(self, info, recv_reqs):
+        if self.dynamic_shapes and self._recv_shape_first(
+            [info],
+            lambda shapes: self._recv_tensor_of_shape(info, shapes[0]),
+            recv_reqs,
+        ):
+            # `info.buffer` is only set once the request is waited on
+            return None
+        recv_reqs.append(
+            self._recv_tensor_of_shape(info, info.tensor_meta.shape)
+        )
+        return info.buffer
+
+    def _recv_tensor_of_shape(self, info, shape) -> dist.Work:
         logging.debug(
             f"[{self.group_rank}][{self.name}] "
             f"Receiving tensor '{info.input_name}' from Rank {info.source}: "
-            f"{info.buffer.size()}"
+            f"{shape}"
         )
+        assert info.buffer is None, f"{info} is still in use"
+        info.buffer = self.recv_buffer_pool.acquire(
+            shape, info.tensor_meta.dtype
+        )
+        if info.requires_grad:
+            info.buffer.requires_grad_(True)
         # Use async to parallelize recv of tensors
-        peer_rank = self.stage_index_to_group_rank[info.source]
-        work = dist.irecv(
+        return dist.irecv(
             info.buffer,
-            peer_rank
-            if self.group is None
-            else dist.get_global_rank(self.group, peer_rank),
+            self._peer_global_rank(info.source),
             group=self.group,
+            tag=info.tag,
         )
-        recv_reqs.append(work)
-        return info.buffer
+
+    def _recv_shape_first(
+        self,
+        infos: List[RecvInfo],
+        post_recv: Callable[[List[List[int]]], dist.Work],
+        recv_reqs: List,
+    ) -> bool:
+        """
+        In dynamic shape mode, add to `recv_reqs` a request receiving the
+        shapes of the tensors of `infos` (all from the same source) and then
+        posting their recv with `post_recv(shapes)`. Returns False if all the
+        tensors are scalars, whose shapes need not be sent.
+        """
+        ndims = [len(info.tensor_meta.shape) for info in infos]
+        if sum(ndims) == 0:
+            return False
+
+        def post_recv_with_shapes(dims: List[int]) -> dist.Work:
+            shapes = []
+            for ndim in ndims:
+                shapes.append(dims[:ndim])
+                dims = dims[ndim:]
+            return post_recv(shapes)
+
+        recv_reqs.append(
+            _ShapeFirstRecv(
+                torch.empty(sum(ndims), dtype=torch.long, device=self.device),
+                self._peer_global_rank(infos[0].source),
+                infos[0].tag,
+                self.group,
+                post_recv_with_shapes,
+            )
+        )
+        return True
+
+    def _send_shapes(self, tensors: List[torch.Tensor], dst: int, tag: int):
+        """
+        In dynamic shape mode, send the shapes of `tensors` to stage `dst`
+        ahead of the tensors, see `_recv_shape_first`
+        """
+        dims = [d for t in tensors for d in t.shape]
+        if not self.dynamic_shapes or not dims:
+            return []
+        header = torch.tensor(dims, dtype=torch.long, device=self.device)
+        return [
+            dist.isend(
+                header,
+                self._peer_global_rank(dst),
+                group=self.group,
+                tag=tag,
+            )
+        ]
 
     def recv_tensor_fn(
         self,
@@ -393,6 +573,175 @@ class PipelineStage(torch.nn.Module):
     ):
         return lambda info: self._recv_tensor(info, reqs)
 
+    def _post_recvs(self, recv_info) -> List[dist.Work]:
+        """
+        Post the recvs of all the `RecvInfo`s in `recv_info`, filling their
+        `buffer`. Returns the requests to wait on before using the buffers.
+        """
+        recv_reqs: List[dist.Work] = []
+        if self.coalesce_p2p:
+            self._recv_coalesced(recv_info, recv_reqs)
+        else:
+            recv = self.recv_tensor_fn(recv_reqs)
+            pippy.fx.node.map_aggregate(
+                recv_info,
+                lambda info: recv(info) if isinstance(info, RecvInfo) else info,
+            )
+        return recv_reqs
+
+    def _post_act_recvs(self, chunk: int) -> List[dist.Work]:
+        return self._post_recvs(
+            (self.args_recv_info[chunk], self.kwargs_recv_info[chunk])
+        )
+
+    def _post_grad_recvs(self, bwd_chunk: int) -> List[dist.Work]:
+        return self._post_recvs(self.grad_recv_info[bwd_chunk])
+
+    def _take_recvs(self, pending, chunk: int, post_fn) -> List[dist.Work]:
+        """
+        Get the recv requests of `chunk`, posting them unless already
+        prefetched in `pending`. In overlap mode, also post the recvs of the
+        next chunk so that they progress during the compute of this one.
+        """
+        recv_reqs = pending.pop(chunk, None)
+        if recv_reqs is None:
+            recv_reqs = post_fn(chunk)
+        if self.overlap_p2p and chunk + 1 < self.chunks:
+            pending[chunk + 1] = post_fn(chunk + 1)
+        return recv_reqs
+
+    def _wait_recvs(self, recv_reqs: List[dist.Work]):
+        start = time.perf_counter()
+        for work in recv_reqs:
+            work.wait()
+        self.step_timing["recv_wait"] += time.perf_counter() - start
+
+    def wait_sends(self):
+        """
+        Wait for all the sends of this step to finish. Sent tensors are not
+        reused by the stage, so the waits are deferred to the end of the step.
+        """
+        start = time.perf_counter()
+        for work in self.all_act_send_reqs:
+            work.wait()
+        for work in self.all_grad_send_reqs:
+            work.wait()
+        self.step_timing["send_wait"] += time.perf_counter() - start
+
+    def _peer_global_rank(self, stage_index: int) -> int:
+        peer_rank = self.stage_index_to_group_rank[stage_index]
+        return (
+            peer_rank
+            if self.group is None
+            else dist.get_global_rank(self.group, peer_rank)
+        )
+
+    def _recv_coalesced(self, recv_info, recv_reqs):
+        """
+        Post one recv per source stage for all the `RecvInfo`s in `recv_info`,
+        and point each `RecvInfo.buffer` to its view in the packed buffer.
+        Values are packed by the sender in the order of its output indices;
+        a single value is sent as is.
+        """
+        infos_by_source: Dict[int, List[RecvInfo]] = {}
+
+        def group_by_source(info):
+            if isinstance(info, RecvInfo):
+                infos_by_source.setdefault(info.source, []).append(info)
+            return info
+
+        pippy.fx.node.map_aggregate(recv_info, group_by_source)
+
+        for source, infos in infos_by_source.items():
+            if len(infos) == 1:
+                # Nothing to coalesce, receive in place
+                self._recv_tensor(infos[0], recv_reqs)
+                continue
+            infos.sort(key=lambda info: info.output_idx)
+            post_recv = self._recv_packed_fn(source, infos)
+            if not self.dynamic_shapes or not self._recv_shape_first(
+                infos, post_recv, recv_reqs
+            ):
+                recv_reqs.append(
+                    post_recv([info.tensor_meta.shape for info in infos])
+                )
+
+    def _recv_packed_fn(self, source: int, infos: List[RecvInfo]):
+        def post_recv(shapes) -> dist.Work:
+            metas = [
+                (shape, info.tensor_meta.dtype)
+                for shape, info in zip(shapes, infos)
+            ]
+            packed_buffer = self.recv_buffer_pool.acquire(
+                (_packed_offsets(metas)[1],), torch.uint8
+            )
+            logging.debug(
+                f"[{self.group_rank}][{self.name}] "
+                f"Receiving {len(infos)} tensors coalesced from Rank {source}: "
+                f"{packed_buffer.numel()} bytes"
+            )
+            work = dist.irecv(
+                packed_buffer,
+                self._peer_global_rank(source),
+                group=self.group,
+                tag=infos[0].tag,
+            )
+            for info, view in zip(infos, unpack_tensors(packed_buffer, metas)):
+                assert info.buffer is None, f"{info} is still in use"
+                if info.requires_grad:
+                    view.requires_grad_(True)
+                info.buffer = view
+                info.packed_buffer = packed_buffer
+            return work
+
+        return post_recv
+
+    def _send_coalesced(
+        self, tensors_by_dst: Dict[int, List[torch.Tensor]], is_grad=False
+    ):
+        send_reqs: List[dist.Work] = []
+        for dst, tensors in tensors_by_dst.items():
+            tag = self._p2p_tag(self.stage_index, dst, is_grad)
+            send_reqs.extend(self._send_shapes(tensors, dst, tag))
+            if len(tensors) == 1:
+                # Nothing to coalesce, send as is
+                packed = tensors[0]
+            else:
+                packed = pack_tensors(tensors)
+                logging.debug(
+                    f"[{self.group_rank}][{self.name}] "
+                    f"Sending {len(tensors)} tensors coalesced to Rank {dst}: "
+                    f"{packed.numel()} bytes"
+                )
+            work = dist.isend(
+                packed,
+                self._peer_global_rank(dst),
+                group=self.group,
+                tag=tag,
+            )
+            send_reqs.append(work)
+        return send_reqs
+
+    def _release_recv_buffers(self, recv_info, live_values):
+        """
+        Return the buffers held by `recv_info` to the recv buffer pool.
+        Buffers aliased by `live_values` are not reused.
+        """
+        buffers = []
+
+        def take_buffer(info):
+            if isinstance(info, RecvInfo) and info.buffer is not None:
+                if info.packed_buffer is None:
+                    buffers.append(info.buffer)
+                elif not any(b is info.packed_buffer for b in buffers):
+                    buffers.append(info.packed_buffer)
+                info.buffer = None
+                info.packed_buffer = None
+            return info
+
+        pippy.fx.node.map_aggregate(recv_info, take_buffer)
+        self.recv_buffer_pool.release_unaliased(buffers, live_values)
+
     def split_inputs(self, args, kwargs):
         self.args_split = None
         self.kwargs_split = None
@@ -410,9 +759,12 @@ class PipelineStage(torch.nn.Module):
         chunk: int,
     ):
         # Receive requests of a chunk
-        recv_reqs: List[dist.Work] = []
-
-        act_recv = self.recv_tensor_fn(recv_reqs)
+        recv_reqs = self._take_recvs(
+            self.pending_act_recvs, chunk, self._post_act_recvs
+        )
+        # Wait for all recvs to finish, the buffers of dynamic shape recvs
+        # are only known by then
+        self._wait_recvs(recv_reqs)
 
         if self.args_split:
             chunk_args = self.args_split[chunk]
@@ -420,7 +772,7 @@ class PipelineStage(torch.nn.Module):
 
         def recv_args(info):
             if isinstance(info, RecvInfo):
-                return act_recv(info)
+                return info.buffer
             else:
                 return chunk_args_list.pop(0)  # type: ignore[has-type]
 
@@ -434,7 +786,7 @@ class PipelineStage(torch.nn.Module):
 
         def recv_kwargs(info):
             if isinstance(info, RecvInfo):
-                return act_recv(info)
+                return info.buffer
             else:
                 k = next(iter(chunk_kwargs))  # type: ignore[has-type]
                 return chunk_kwargs.pop(k)  # type: ignore[has-type]
@@ -444,16 +796,22 @@ class PipelineStage(torch.nn.Module):
             recv_kwargs,
         )
 
-        # Wait for all recvs to finish
-        for work in recv_reqs:
-            work.wait()
-
         return composite_args, composite_kwargs
 
     def _send_activations(
         self,
         output_tuple,
     ) -> List[dist.Work]:
+        if self.coalesce_p2p:
+            # Output indices are visited in order, which is the order the
+            # receiver unpacks them in
+            tensors_by_dst: Dict[int, List[torch.Tensor]] = {}
+            for idx, out in enumerate(output_tuple):
+                for dst in self.act_send_info[idx]:
+                    if dst is not None:
+                        tensors_by_dst.setdefault(dst, []).append(out)
+            return self._send_coalesced(tensors_by_dst)
+
         # Send requests of a chunk
         send_reqs: List[dist.Work] = []
 
@@ -466,6 +824,8 @@ class PipelineStage(torch.nn.Module):
                     f"[{self.group_rank}][{self.name}] "
                     f"Sending tensor to Rank {dst}: {out.size()}"
                 )
+                tag = self._p2p_tag(self.stage_index, dst)
+                send_reqs.extend(self._send_shapes([out], dst, tag))
                 peer_rank = self.stage_index_to_group_rank[dst]
                 work = dist.isend(
                     out,
@@ -473,6 +833,7 @@ class PipelineStage(torch.nn.Module):
                     if self.group is None
                     else dist.get_global_rank(self.group, peer_rank),  # TODO
                     group=self.group,
+                    tag=tag,
                 )
                 send_reqs.append(work)
 
@@ -483,18 +844,17 @@ class PipelineStage(torch.nn.Module):
         bwd_chunk,
     ):
         # Receive requests of a chunk
-        grad_recv_reqs: List[dist.Work] = []
-
-        recv_grad = self.recv_tensor_fn(grad_recv_reqs)
+        grad_recv_reqs = self._take_recvs(
+            self.pending_grad_recvs, bwd_chunk, self._post_grad_recvs
+        )
+        # Wait for all recvs to finish
+        self._wait_recvs(grad_recv_reqs)
 
         # Receive gradients
         grads = pippy.fx.node.map_aggregate(
             self.grad_recv_info[bwd_chunk],
-            recv_grad,
+            lambda info: info.buffer,
         )
-        # Wait for all recvs to finish
-        for work in grad_recv_reqs:
-            work.wait()
 
         logging.debug(
             f"[{self.group_rank}][{self.name}] "
@@ -506,6 +866,30 @@ class PipelineStage(torch.nn.Module):
         self,
         grads_input,
     ) -> List[dist.Work]:
+        if self.coalesce_p2p:
+            # Pack grads in the order of the output indices of the stage they
+            # go to, which is the order that stage unpacks them in
+            input_recv_info = flatten_args(
+                (self.args_recv_info[0], self.kwargs_recv_info[0])
+            )
+            grads_by_dst: Dict[int, List[Tuple[int, torch.Tensor]]] = {}
+            for grad, dst, info in zip(
+                grads_input, self.grad_send_info, input_recv_info
+            ):
+                if isinstance(grad, torch.Tensor) and dst is not None:
+                    grads_by_dst.setdefault(dst, []).append(
+                        (info.output_idx, grad)
+                    )
+                else:
+                    assert grad is None and dst is None
+            return self._send_coalesced(
+                {
+                    dst: [grad for _, grad in sorted(grads, key=lambda g: g[0])]
+                    for dst, grads in grads_by_dst.items()
+                },
+                is_grad=True,
+            )
+
         # Send requests of a chunk
         grad_send_reqs: List[dist.Work] = []
 
@@ -515,6 +899,12 @@ class PipelineStage(torch.nn.Module):
                     f"[{self.group_rank}][{self.name}] "
                     f"Sending gradient to Rank {grad_recv_stage}: {grad.size()}"
                 )
+                tag = self._p2p_tag(
+                    self.stage_index, grad_recv_stage, is_grad=True
+                )
+                grad_send_reqs.extend(
+                    self._send_shapes([grad], grad_recv_stage, tag)
+                )
                 peer_rank = self.stage_index_to_group_rank[grad_recv_stage]
                 work = dist.isend(
                     grad,
@@ -522,6 +912,7 @@ class PipelineStage(torch.nn.Module):
                     if self.group is None
                     else dist.get_global_rank(self.group, peer_rank),  # TODO
                     group=self.group,
+                    tag=tag,
                 )
                 grad_send_reqs.append(work)
             else:
@@ -539,24 +930,33 @@ class PipelineStage(torch.nn.Module):
             out_val = self.submod(*args, **kwargs)
         return out_val
 
-    def backward_maybe_with_nosync(self, bwd_kwargs: Dict, is_last_chunk: bool):
+    def _run_maybe_with_nosync(
+        self, backward_fn: Callable, stage_output, is_last_chunk: bool
+    ):
         if isinstance(self.submod, DistributedDataParallel):
             if is_last_chunk:
                 # HACK: reaching into DDP implementation details here. Is there a better way?
                 self.submod.reducer.prepare_for_backward(  # type: ignore[union-attr, operator]
                     list(
                         torch.nn.parallel.distributed._find_tensors(  # type: ignore[attr-defined]
-                            bwd_kwargs["stage_output"]
+                            stage_output
                         )
                     )
                 )
-                grads_input, _ = stage_backward(**bwd_kwargs)
+                return backward_fn()
             else:
                 with self.submod.no_sync():  # type: ignore[operator]
-                    grads_input, _ = stage_backward(**bwd_kwargs)
+                    return backward_fn()
         else:
             # Non-DDP submodule, regular backward
-            grads_input, _ = stage_backward(**bwd_kwargs)
+            return backward_fn()
+
+    def backward_maybe_with_nosync(self, bwd_kwargs: Dict, is_last_chunk: bool):
+        grads_input, _ = self._run_maybe_with_nosync(
+            lambda: stage_backward(**bwd_kwargs),
+            bwd_kwargs["stage_output"],
+            is_last_chunk,
+        )
         return grads_input
 
     def forward_one_chunk(
@@ -566,10 +966,19 @@ class PipelineStage(torch.nn.Module):
         composite_args, composite_kwargs = self._recv_and_fill_inputs(chunk)
 
         # Compute forward
+        start = time.perf_counter()
         try:
-            output = self.forward_maybe_with_nosync(
-                *composite_args, **composite_kwargs
-            )
+            if self.activation_offloader is not None:
+                with self.activation_offloader.offload(
+                    chunk, exclude=self.submod.parameters()
+                ):
+                    output = self.forward_maybe_with_nosync(
+                        *composite_args, **composite_kwargs
+                    )
+            else:
+                output = self.forward_maybe_with_nosync(
+                    *composite_args, **composite_kwargs
+                )
 
         except Exception as e:
             exc_msg = f"""
@@ -578,12 +987,14 @@ class PipelineStage(torch.nn.Module):
             kwargs: {map_debug_info(composite_kwargs)}
             """
             raise RuntimeError(exc_msg) from e
+        self.step_timing["compute"] += time.perf_counter() - start
 
         # Unify output form to tuple for easy correspondance with
         # `act_send_info`
         output_tuple = output if type(output) is tuple else (output,)
-        # Prepare for final output merge or reduction
-        self.output_chunks.append(output)
+        # Merge into the final output
+        if self.output_merger is not None:
+            self.output_merger.add(output)
 
         # Send activations
         send_reqs = self._send_activations(output_tuple)
@@ -598,13 +1009,30 @@ class PipelineStage(torch.nn.Module):
             flatten_input_tensors,  # input_values
         )
 
+        if not self.pipe.has_loss_and_backwards:
+            # No backward will consume the inputs
+            self._release_recv_buffers(
+                (self.args_recv_info[chunk], self.kwargs_recv_info[chunk]),
+                output_tuple,
+            )
+
     def backward_one_chunk(
         self,
         bwd_chunk: int,
+        defer_weight_grads: bool = False,
     ):
+        """
+        Run the backward of `bwd_chunk` and send the input gradients. With
+        `defer_weight_grads`, only the input gradients are computed; the
+        weight gradients are computed by a later `weight_grad_one_chunk`.
+        """
         if not self.pipe.has_loss_and_backwards:
             return None
 
+        if self.activation_offloader is not None:
+            # Bring offloaded activations back while waiting for the grads
+            self.activation_offloader.prefetch(bwd_chunk)
+
         grads = self._recv_grads(bwd_chunk)
 
         # Pack args for `stage_backward``
@@ -613,6 +1041,7 @@ class PipelineStage(torch.nn.Module):
             bwd_kwargs["stage_output"],
             bwd_kwargs["input_values"],
         ) = self.fwd_cache.pop(bwd_chunk)
+        stage_output = bwd_kwargs["stage_output"]
         # Fill actual gradients received for outputs
         # If nothing received, as in the case of last stage, then we
         # would use the default `output_grads` prepared in the IR phase,
@@ -622,14 +1051,76 @@ class PipelineStage(torch.nn.Module):
             bwd_kwargs["output_grads"] = grads
 
         # `stage_backward` node does not have `args`, only `kwargs`
-        grads_input = self.backward_maybe_with_nosync(
-            bwd_kwargs,
-            bwd_chunk == self.chunks - 1,
-        )
+        start = time.perf_counter()
+        if defer_weight_grads:
+            # Parameters are not touched, the DDP reducer is prepared by the
+            # weight grad pass of the last chunk
+            grads_input, weight_grad_fn = self._run_maybe_with_nosync(
+                lambda: stage_backward_input(**bwd_kwargs),
+                stage_output,
+                False,
+            )
+        else:
+            grads_input = self.backward_maybe_with_nosync(
+                bwd_kwargs,
+                bwd_chunk == self.chunks - 1,
+            )
+        self.step_timing["compute"] += time.perf_counter() - start
 
         grad_send_reqs = self._send_grads(grads_input)
         self.all_grad_send_reqs += grad_send_reqs
 
+        if self.activation_offloader is not None:
+            # The next backward usually runs on the next chunk, its
+            # activations come back during the compute in between
+            self.activation_offloader.prefetch(bwd_chunk + 1)
+
+        if defer_weight_grads:
+            # The weight grad pass still reads the inputs and output grads
+            def run_weight_grads():
+                self._run_maybe_with_nosync(
+                    lambda: weight_grad_fn(self.submod.parameters()),
+                    stage_output,
+                    bwd_chunk == self.chunks - 1,
+                )
+                self._release_bwd_recv_buffers(
+                    bwd_chunk, (stage_output, grads_input)
+                )
+                self._release_activations(bwd_chunk)
+
+            self.deferred_weight_grads[bwd_chunk] = run_weight_grads
+        else:
+            self._release_bwd_recv_buffers(
+                bwd_chunk, (stage_output, grads_input)
+            )
+            self._release_activations(bwd_chunk)
+
+    def weight_grad_one_chunk(self):
+        """
+        Run the oldest weight grad pass deferred by `backward_one_chunk`
+        """
+        chunk = next(iter(self.deferred_weight_grads))
+        start = time.perf_counter()
+        self.deferred_weight_grads.pop(chunk)()
+        self.step_timing["compute"] += time.perf_counter() - start
+
+    def _release_activations(self, bwd_chunk: int):
+        if self.activation_offloader is not None:
+            self.activation_offloader.release(bwd_chunk)
+
+    def _release_bwd_recv_buffers(self, bwd_chunk: int, live_values):
+        # Inputs and output grads of this chunk are no longer needed. Outputs
+        # are kept alive for the final merge and grads are being sent, so
+        # buffers aliased by them are not reused
+        self._release_recv_buffers(
+            (
+                self.args_recv_info[bwd_chunk],
+                self.kwargs_recv_info[bwd_chunk],
+                self.grad_recv_info[bwd_chunk],
+            ),
+            live_values,
+        )
+
     def clear_runtime_states(self):
         # map microbatch ID to list of forward tensor args
         self.fwd_cache.clear()
@@ -637,14 +1128,30 @@ class PipelineStage(torch.nn.Module):
         self.all_act_send_reqs.clear()
         # Grad send requests of all chunk
         self.all_grad_send_reqs.clear()
-        # Caching chunk outputs for final output merge or reduction
-        self.output_chunks.clear()
+        # Merger of chunk outputs of this step
+        self.output_merger = (
+            ChunkMerger(self.output_chunk_spec, self.chunks)
+            if self.is_last()
+            else None
+        )
+        # All prefetched recvs are consumed within a step
+        assert not self.pending_act_recvs and not self.pending_grad_recvs
+        assert not self.deferred_weight_grads
+        self.step_timing = dict.fromkeys(self.step_timing, 0.0)
+
+    def log_step_timing(self):
+        # With CUDA, compute is timed on the host, i.e. only includes kernel
+        # launches unless they block
+        logging.info(
+            f"[{self.group_rank}][{self.name}] Step timing: "
+            f"compute {self.step_timing['compute']:.4f}s, "
+            f"exposed recv {self.step_timing['recv_wait']:.4f}s, "
+            f"exposed send {self.step_timing['send_wait']:.4f}s"
+        )
 
     def merge_output_chunks(self):
-        return merge_chunks(
-            self.output_chunks,
-            self.output_chunk_spec,
-        )
+        assert self.output_merger is not None
+        return self.output_merger.result()
 
     def forward(self, *args, **kwargs):
         # Clean per iteration
@@ -657,20 +1164,14 @@ class PipelineStage(torch.nn.Module):
         for chunk in range(self.chunks):
             self.forward_one_chunk(chunk)
 
-        # Wait for all sends to finish
-        # TODO: okay to delay the sync till completion of all chunks?
-        for work in self.all_act_send_reqs:
-            work.wait()
-
         # Backward starts here
 
         for bwd_chunk in range(self.chunks):
             self.backward_one_chunk(bwd_chunk)
 
         # Wait for all sends to finish
-        # TODO: okay to delay the sync till completion of all chunks?
-        for work in self.all_grad_send_reqs:
-            work.wait()
+        self.wait_sends()
+        self.log_step_timing()
 
         # Last rank return merged results per original format
         if self.is_last():
@@ -691,6 +1192,10 @@ class PipelineStage1F1B(PipelineStage):
         args_chunk_spec=None,
         kwargs_chunk_spec=None,
         output_chunk_spec=None,
+        coalesce_p2p: bool = False,
+        overlap_p2p: bool = False,
+        activation_offload_budget: Optional[int] = None,
+        dynamic_shapes: bool = False,
     ):
         super().__init__(
             pipe,
@@ -702,6 +1207,10 @@ class PipelineStage1F1B(PipelineStage):
             args_chunk_spec=args_chunk_spec,
             kwargs_chunk_spec=kwargs_chunk_spec,
             output_chunk_spec=output_chunk_spec,
+            coalesce_p2p=coalesce_p2p,
+            overlap_p2p=overlap_p2p,
+            activation_offload_budget=activation_offload_budget,
+            dynamic_shapes=dynamic_shapes,
         )
 
     def forward(self, *args, **kwargs):
@@ -731,15 +1240,331 @@ class PipelineStage1F1B(PipelineStage):
             self.backward_one_chunk(bwd_chunk)
 
         # Wait for all sends to finish
-        # TODO: okay to delay the sync till completion of all chunks?
-        for work in self.all_act_send_reqs:
-            work.wait()
+        self.wait_sends()
+        self.log_step_timing()
 
-        for work in self.all_grad_send_reqs:
-            work.wait()
+        # Last rank return merged results per original format
+        if self.is_last():
+            return self.merge_output_chunks()
+        else:
+            return None
+
+
+class PipelineStageZeroBubble(PipelineStage):
+    """
+    1F1B schedule with split backward, after the ZB-H1 schedule of "Zero
+    Bubble Pipeline Parallelism" (Qi et al.). The backward of a chunk first
+    computes the input gradients only, so that they are sent to the upstream
+    stage as early as possible, and the weight gradients are computed later
+    to fill the time otherwise spent waiting for gradients.
+
+    A stage keeps at most as many weight grad passes deferred as it has
+    warm-up chunks in the steady phase, and during the cool-down phase runs
+    deferred passes while the gradients of its next chunk are in flight.
+    """
+
+    def __init__(
+        self,
+        pipe: Pipe,
+        rank: int,
+        nstages: int,
+        chunks: int,
+        device: torch.device,
+        group: dist.ProcessGroup = None,
+        args_chunk_spec=None,
+        kwargs_chunk_spec=None,
+        output_chunk_spec=None,
+        coalesce_p2p: bool = False,
+        overlap_p2p: bool = False,
+        activation_offload_budget: Optional[int] = None,
+        dynamic_shapes: bool = False,
+    ):
+        super().__init__(
+            pipe,
+            rank,
+            nstages,
+            chunks,
+            device,
+            group=group,
+            args_chunk_spec=args_chunk_spec,
+            kwargs_chunk_spec=kwargs_chunk_spec,
+            output_chunk_spec=output_chunk_spec,
+            coalesce_p2p=coalesce_p2p,
+            overlap_p2p=overlap_p2p,
+            activation_offload_budget=activation_offload_budget,
+            dynamic_shapes=dynamic_shapes,
+        )
+
+    def _fill_bubble(self, bwd_chunk: int):
+        """
+        Run deferred weight grad passes until the gradients of `bwd_chunk`
+        have arrived
+        """
+        if bwd_chunk not in self.pending_grad_recvs:
+            self.pending_grad_recvs[bwd_chunk] = self._post_grad_recvs(
+                bwd_chunk
+            )
+        recv_reqs = self.pending_grad_recvs[bwd_chunk]
+        while self.deferred_weight_grads and not all(
+            work.is_completed() for work in recv_reqs
+        ):
+            self.weight_grad_one_chunk()
+
+    def forward(self, *args, **kwargs):
+        # Clean per iteration
+        self.clear_runtime_states()
+
+        # Split inputs into chunks
+        self.split_inputs(args, kwargs)
+
+        if not self.pipe.has_loss_and_backwards:
+            for chunk in range(self.chunks):
+                self.forward_one_chunk(chunk)
+        else:
+            # Earlier stages wait longer for their first gradients, they run
+            # more chunks ahead and defer more weight grad passes
+            warmup_chunks = min(
+                self.nstages - self.stage_index - 1, self.chunks
+            )
+            max_deferred = warmup_chunks
+
+            # Warm-up phase
+            for chunk in range(warmup_chunks):
+                self.forward_one_chunk(chunk)
+
+            # 1F1B phase
+            for bwd_chunk in range(self.chunks - warmup_chunks):
+                self.forward_one_chunk(bwd_chunk + warmup_chunks)
+                self.backward_one_chunk(bwd_chunk, defer_weight_grads=True)
+                while len(self.deferred_weight_grads) > max_deferred:
+                    self.weight_grad_one_chunk()
+
+            # Cool-down phase
+            for bwd_chunk in range(self.chunks - warmup_chunks, self.chunks):
+                self._fill_bubble(bwd_chunk)
+                self.backward_one_chunk(bwd_chunk, defer_weight_grads=True)
+
+            # Remaining weight grad passes
+            while self.deferred_weight_grads:
+                self.weight_grad_one_chunk()
+
+        # Wait for all sends to finish
+        self.wait_sends()
+        self.log_step_timing()
 
         # Last rank return merged results per original format
         if self.is_last():
             return self.merge_output_chunks()
         else:
             return None
+
+
+def _interleaved_1f1b_order(
+    num_ranks: int,
+    rank: int,
+    num_virtual: int,
+    chunks: int,
+    has_backward: bool = True,
+) -> List[Tuple[bool, int, int]]:
+    """
+    Order in which `rank` runs its work in the interleaved 1F1B schedule of
+    Megatron-LM, as a list of `(is_forward, virtual_idx, chunk)`, where
+    `virtual_idx` indexes the stages of the rank (stage `rank + virtual_idx *
+    num_ranks`). Chunks are processed in groups of `num_ranks` per virtual
+    stage, so `chunks` must be a multiple of `num_ranks`.
+    """
+    total = num_virtual * chunks
+    group_size = num_ranks * num_virtual
+
+    def virtual_idx(k: int, is_forward: bool) -> int:
+        v = (k % group_size) // num_ranks
+        return v if is_forward else num_virtual - 1 - v
+
+    def chunk_idx(k: int) -> int:
+        group, idx_in_group = divmod(k, group_size)
+        return group * num_ranks + idx_in_group % num_ranks
+
+    def fwd(k: int):
+        return True, virtual_idx(k, True), chunk_idx(k)
+
+    def bwd(k: int):
+        return False, virtual_idx(k, False), chunk_idx(k)
+
+    if not has_backward:
+        return [fwd(k) for k in range(total)]
+
+    if chunks == num_ranks:
+        # Run all forwards first
+        warmup = total
+    else:
+        warmup = min(
+            (num_ranks - rank - 1) * 2 + (num_virtual - 1) * num_ranks, total
+        )
+
+    order = [fwd(k) for k in range(warmup)]
+    # 1F1B phase
+    for k in range(total - warmup):
+        order.append(fwd(warmup + k))
+        order.append(bwd(k))
+    # Cool-down phase
+    for k in range(total - warmup, total):
+        order.append(bwd(k))
+    return order
+
+
+class PipelineStageInterleaved1F1B(torch.nn.Module):
+    """
+    Runtime of the interleaved (virtual stage) 1F1B schedule. Rank `rank` of
+    a pipeline of `num_ranks` ranks hosts the stages `rank`, `rank +
+    num_ranks`, `rank + 2 * num_ranks`, ... of `pipe`, each as a
+    `PipelineStage`, and interleaves their forward and backward chunks as in
+    Megatron-LM. This reduces the pipeline bubble by the number of stages per
+    rank.
+
+    The number of stages of `pipe` and `chunks` must be multiples of
+    `num_ranks`. Values cannot be passed between two stages hosted by the
+    same rank.
+
+    With `overlap_p2p`, the recvs of the next work item of the rank are
+    posted before running the current one. Recvs are thus posted in the same
+    order as without overlap, which is the order the peers send in: NCCL
+    matches point-to-point operations by order rather than by tag.
+    """
+
+    def __init__(
+        self,
+        pipe: Pipe,
+        rank: int,
+        num_ranks: int,
+        chunks: int,
+        device: torch.device,
+        group: dist.ProcessGroup = None,
+        args_chunk_spec=None,
+        kwargs_chunk_spec=None,
+        output_chunk_spec=None,
+        coalesce_p2p: bool = False,
+        overlap_p2p: bool = False,
+        activation_offload_budget: Optional[int] = None,
+        dynamic_shapes: bool = False,
+    ):
+        super().__init__()
+        nstages = pipe.num_stages
+        if num_ranks != dist.get_world_size(group):
+            raise ValueError(
+                f"Interleaved 1F1B runs on all the {dist.get_world_size(group)} "
+                f"ranks of the group, got {num_ranks} ranks"
+            )
+        if nstages % num_ranks != 0:
+            raise ValueError(
+                f"Number of stages ({nstages}) must be a multiple of the number "
+                f"of ranks ({num_ranks}) for interleaved 1F1B"
+            )
+        if chunks % num_ranks != 0:
+            raise ValueError(
+                f"Number of chunks ({chunks}) must be a multiple of the number "
+                f"of ranks ({num_ranks}) for interleaved 1F1B"
+            )
+
+        self.rank = rank
+        self.num_ranks = num_ranks
+        self.chunks = chunks
+        self.overlap_p2p = overlap_p2p
+        self.stages: List[PipelineStage] = [
+            PipelineStage(
+                pipe,
+                stage_index,
+                nstages,
+                chunks,
+                device,
+                group=group,
+                args_chunk_spec=args_chunk_spec,
+                kwargs_chunk_spec=kwargs_chunk_spec,
+                output_chunk_spec=output_chunk_spec,
+                coalesce_p2p=coalesce_p2p,
+                # Posting the next chunk of the same stage early would break
+                # the recv order, recvs are prefetched in `forward` instead
+                overlap_p2p=False,
+                activation_offload_budget=activation_offload_budget,
+                dynamic_shapes=dynamic_shapes,
+            )
+            for stage_index in range(rank, nstages, num_ranks)
+        ]
+
+        for stage in self.stages:
+            peers = [
+                info.source
+                for info in flatten_args(
+                    (stage.args_recv_info[0], stage.kwargs_recv_info[0])
+                )
+                if isinstance(info, RecvInfo)
+            ]
+            for dsts in stage.act_send_info.values():
+                peers += dsts
+            for peer in peers:
+                if stage.stage_index_to_group_rank[peer] == rank:
+                    raise NotImplementedError(
+                        f"Stage {stage.stage_index} and stage {peer} exchange "
+                        f"values but are both hosted by rank {rank}"
+                    )
+
+        self.order = _interleaved_1f1b_order(
+            num_ranks,
+            rank,
+            len(self.stages),
+            chunks,
+            has_backward=pipe.has_loss_and_backwards,
+        )
+
+    @staticmethod
+    def _takes_inputs(stage: PipelineStage) -> bool:
+        return any(
+            isinstance(a, StageArgPlaceholder)
+            for a in flatten_args(
+                (stage.args_recv_info[0], stage.kwargs_recv_info[0])
+            )
+        )
+
+    def _prefetch_recvs(self, work_item: Tuple[bool, int, int]):
+        """
+        Post the recvs of `work_item`, unless already posted
+        """
+        is_forward, virtual_idx, chunk = work_item
+        stage = self.stages[virtual_idx]
+        if is_forward:
+            pending, post_fn = stage.pending_act_recvs, stage._post_act_recvs
+        else:
+            pending, post_fn = stage.pending_grad_recvs, stage._post_grad_recvs
+        if chunk not in pending:
+            pending[chunk] = post_fn(chunk)
+
+    def forward(self, *args, **kwargs):
+        for stage in self.stages:
+            # Clean per iteration
+            stage.clear_runtime_states()
+            # Split inputs into chunks, for the stages consuming them
+            if self._takes_inputs(stage):
+                stage.split_inputs(args, kwargs)
+
+        for i, (is_forward, virtual_idx, chunk) in enumerate(self.order):
+            if self.overlap_p2p:
+                # Follow the schedule, not the chunks of the stage: the next
+                # work item may belong to another stage of the rank
+                self._prefetch_recvs(self.order[i])
+                if i + 1 < len(self.order):
+                    self._prefetch_recvs(self.order[i + 1])
+            if is_forward:
+                self.stages[virtual_idx].forward_one_chunk(chunk)
+            else:
+                self.stages[virtual_idx].backward_one_chunk(chunk)
+
+        # Wait for all sends to finish
+        for stage in self.stages:
+            stage.wait_sends()
+            stage.log_step_timing()
+
+        # Rank hosting the last stage returns merged results per original
+        # format
+        if self.stages[-1].is_last():
+            return self.stages[-1].merge_output_chunks()
+        else:
+            return None
@@ -1,11 +1,13 @@
+import copy
 import json
 import logging
 import os
 import pathlib
 import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
 from itertools import chain
 
-from typing import Dict
+from typing import Any, Dict, Optional
 
 import torch
 import torch.distributed as dist
@@ -13,7 +15,23 @@ import torch.distributed as dist
 from pippy.IR import Pipe
 from pippy.utils import _get_binary_filename
 
+try:
+    from safetensors.torch import save_file  # type: ignore
+
+    HAS_SAFETENSORS = True
+except ImportError:
+    HAS_SAFETENSORS = False
+
 CKPT_INDEX_JSON_FILENAME = "pytorch_model.bin.index.json"
+SAFETENSORS_INDEX_JSON_FILENAME = "model.safetensors.index.json"
+
+# Background thread of `save_checkpoint(..., async_save=True)`, and the save
+# it runs, if any: only one save is outstanding at a time
+_save_executor: Optional[ThreadPoolExecutor] = None
+_pending_save: Optional[Future] = None
+# Host buffers the tensors to save are snapshotted into, by name, reused
+# across async saves
+_staging_buffers: Dict[str, torch.Tensor] = {}
 
 DTYPE_SIZES = {
     torch.float32: 4,
@@ -61,10 +79,82 @@ def _atomic_write(file_contents: str, target_file_path: str, mode="w") -> None:
                 raise RuntimeError(f"Failed to delete {temp_file.name}")
 
 
+def _atomic_save(
+    obj: Any, target_file_path: str, use_safetensors: bool = False
+) -> None:
+    """
+    Atomically saves `obj` into `target_file_path`, with `torch.save`, or with
+    safetensors if `obj` is a dict of tensors.
+
+    Args:
+        obj (Any): object to save
+        target_file_path (str): path to write to
+        use_safetensors (bool, optional): whether to write a safetensors binary. Defaults to False.
+    """
+    temp_file = tempfile.NamedTemporaryFile(
+        delete=False,
+        dir=os.path.dirname(target_file_path),
+    )
+    temp_file.close()
+    try:
+        if use_safetensors:
+            save_file(obj, temp_file.name, metadata={"format": "pt"})
+            with open(temp_file.name, "rb") as f:
+                os.fsync(f.fileno())
+        else:
+            with open(temp_file.name, "wb") as f:
+                torch.save(obj, f)
+                # sync in-memory state with storage device
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_file.name, target_file_path)
+    finally:
+        if os.path.exists(temp_file.name):
+            try:
+                os.unlink(temp_file.name)
+            except Exception:
+                raise RuntimeError(f"Failed to delete {temp_file.name}")
+
+
+def _snapshot_to_host(obj: Any, key: str = "") -> Any:
+    """
+    Copies the tensors of `obj`, possibly nested in dicts, lists and tuples,
+    into host staging buffers, and deep-copies everything else, so that `obj`
+    can be saved while training goes on.
+
+    Args:
+        obj (Any): state dict to snapshot
+        key (str, optional): name of the staging buffer of `obj`, if a tensor
+    """
+    if isinstance(obj, torch.Tensor):
+        buffer = _staging_buffers.get(key)
+        if (
+            buffer is None
+            or buffer.shape != obj.shape
+            or buffer.dtype != obj.dtype
+        ):
+            # Pinned memory speeds up device-to-host copies
+            buffer = torch.empty(
+                obj.shape, dtype=obj.dtype, pin_memory=obj.is_cuda
+            )
+            _staging_buffers[key] = buffer
+        buffer.copy_(obj.detach())
+        return buffer
+    elif isinstance(obj, dict):
+        return {k: _snapshot_to_host(v, f"{key}.{k}") for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return type(obj)(
+            _snapshot_to_host(v, f"{key}.{i}") for i, v in enumerate(obj)
+        )
+    else:
+        return copy.deepcopy(obj)
+
+
 def _save_index(
     pipe: Pipe,
     ckpt_index_filename: str = CKPT_INDEX_JSON_FILENAME,
     checkpoint_dir: str = "checkpoints",
+    use_safetensors: bool = False,
 ) -> None:
     """
     Saves index file describing location of weights in checkpoint.
@@ -73,6 +163,7 @@ def _save_index(
         pipe (Pipe): pipeline graph module with weights to save
         ckpt_index_filename (str, optional): name of index file. Defaults to "pytorch_model.bin.index.json".
         checkpoint_dir (str, optional): directory to save checkpoint to. Defaults to "checkpoints".
+        use_safetensors (bool, optional): whether the weights are saved as safetensors binaries. Defaults to False.
     """
     index_dict = {}
     total_size = 0
@@ -86,7 +177,9 @@ def _save_index(
         for param_name, param in params_buffers:
             old_name = submod.remap_qualname(param_name)  # type: ignore
 
-            binary_filename = _get_binary_filename(idx)
+            binary_filename = _get_binary_filename(
+                idx, use_safetensors=use_safetensors
+            )
 
             #  add ckpt size once
             if old_name not in weight_map:
@@ -108,48 +201,117 @@ def _save_index(
     logging.info(f"Saved index file to {filepath}")
 
 
-def _save_params(submod: torch.nn.Module, checkpoint_dir: str) -> None:
+def _get_params_state_dict(
+    submod: torch.nn.Module,
+) -> Dict[str, torch.Tensor]:
     """
-    writes `module`'s parameters and buffers to disk.
+    returns `module`'s parameters and buffers, by their name in the original model.
 
     Args:
         submod(`Pipe`): a submodule of the model's graph
+    """
+    return {
+        submod.remap_qualname(param_name): param  # type: ignore
+        for param_name, param in submod.state_dict().items()
+    }
+
+
+def _save_params(
+    state_dict: Dict[str, torch.Tensor],
+    checkpoint_dir: str,
+    use_safetensors: bool = False,
+) -> None:
+    """
+    writes a submodule's parameters and buffers to disk.
+
+    Args:
+        state_dict(`Dict[str, torch.Tensor]`): the submodule's parameters and buffers,
+                                               see `_get_params_state_dict`
         checkpoint_dir(`str`): where to keep the checkpoint binaries
+        use_safetensors(`bool`): whether to write a safetensors binary instead
+                                 of a pickle
     """
     filepath = os.path.join(
-        checkpoint_dir, _get_binary_filename(dist.get_rank())
-    )
-    torch.save(
-        {
-            submod.remap_qualname(param_name): param  # type: ignore
-            for param_name, param in submod.state_dict().items()
-        },
-        filepath,
+        checkpoint_dir,
+        _get_binary_filename(dist.get_rank(), use_safetensors=use_safetensors),
     )
+    if use_safetensors:
+        # safetensors does not store shared or non-contiguous tensors
+        state_dict = dict(state_dict)
+        seen_storages = set()
+        for name, tensor in state_dict.items():
+            storage = (tensor.device, tensor.untyped_storage().data_ptr())
+            if storage in seen_storages:
+                tensor = tensor.clone()
+            seen_storages.add(storage)
+            state_dict[name] = tensor.contiguous()
+    _atomic_save(state_dict, filepath, use_safetensors)
 
 
 def _save_optim_state(
-    optimizer: torch.optim.Optimizer, checkpoint_dir: str
+    optim_state_dict: Dict[str, Any], checkpoint_dir: str
 ) -> None:
     """
-    saves `optimizer`'s state_dict to disk.
+    saves an optimizer's state_dict to disk.
 
     Args:
-        optimizer(`torch.optim.Optimizer`): pytorch optimizer
+        optim_state_dict(`Dict[str, Any]`): pytorch optimizer's state dict
         checkpoint_dir(`str`): where to keep the checkpoint binaries
     """
     filepath = os.path.join(
         checkpoint_dir, _get_binary_filename(dist.get_rank(), is_optim=True)
     )
     # save optimizer state directly
-    torch.save(optimizer.state_dict(), filepath)
+    _atomic_save(optim_state_dict, filepath)
+
+
+def _save_checkpoint_files(
+    stage: Pipe,
+    checkpoint_dir: str,
+    state_dict: Dict[str, torch.Tensor],
+    optim_state_dict: Optional[Dict[str, Any]],
+    use_safetensors: bool,
+) -> None:
+    """
+    writes the index file (in rank 0), parameters and optimizer state of a checkpoint.
+    """
+    # write index file in rank 0
+    if dist.get_rank() == 0:
+        if use_safetensors:
+            ckpt_index_filename = SAFETENSORS_INDEX_JSON_FILENAME
+        else:
+            ckpt_index_filename = CKPT_INDEX_JSON_FILENAME
+        _save_index(
+            stage,
+            ckpt_index_filename=ckpt_index_filename,
+            checkpoint_dir=checkpoint_dir,
+            use_safetensors=use_safetensors,
+        )
+
+    _save_params(state_dict, checkpoint_dir, use_safetensors)
+    # save optimizer state, if passed
+    if optim_state_dict is not None:
+        _save_optim_state(optim_state_dict, checkpoint_dir)
+
+
+def wait_for_checkpoint() -> None:
+    """
+    Waits for the outstanding `save_checkpoint(..., async_save=True)`, if any,
+    to complete, and re-raises its exception, if any
+    """
+    global _pending_save
+    if _pending_save is not None:
+        pending_save, _pending_save = _pending_save, None
+        pending_save.result()
 
 
 def save_checkpoint(
     stage: Pipe,
     checkpoint_dir: str = "checkpoints",
     optimizer: torch.optim.Optimizer = None,
-) -> None:
+    use_safetensors: bool = False,
+    async_save: bool = False,
+) -> Optional[Future]:
     """
     Save the entire model's(`stage`) metadata in an index file and the `submod`
     parameters in `checkpoint_dir`
@@ -159,16 +321,52 @@ def save_checkpoint(
         checkpoint_dir(`str`): directory where to save the index file and params binaries
                               defaults to `checkpoints`
         optimizer(`torch.optim.Optimizer`): optimizer whose state dict is to be saved
+        use_safetensors(`bool`): save the parameters as safetensors binaries, indexed
+                                 by `model.safetensors.index.json`, instead of pickles.
+                                 The optimizer state is pickled either way
+        async_save(`bool`): snapshot the parameters and optimizer state into host memory,
+                            and write the checkpoint files on a background thread.
+                            Waits for the previous async save, if any, to complete first
+    Returns:
+        If `async_save`, a future completing once the checkpoint files are written,
+        see also `wait_for_checkpoint`. None otherwise
     """
+    global _save_executor, _pending_save
+
+    if use_safetensors and not HAS_SAFETENSORS:
+        raise ImportError(
+            "Saving a safetensors checkpoint requires the safetensors package"
+        )
+
+    # Only one save is outstanding at a time, which also makes the staging
+    # buffers free for reuse
+    wait_for_checkpoint()
+
     # create checkpoint directory if it doesn't exist
     if not os.path.exists(checkpoint_dir):
         pathlib.Path(checkpoint_dir).mkdir(parents=True, exist_ok=True)
 
-    # write index file in rank 0
-    if dist.get_rank() == 0:
-        _save_index(stage, checkpoint_dir=checkpoint_dir)
+    state_dict = _get_params_state_dict(stage.submod)  # type: ignore
+    optim_state_dict = optimizer.state_dict() if optimizer else None
 
-    _save_params(stage.submod, checkpoint_dir)  # type: ignore
-    # save optimizer state, if passed
-    if optimizer:
-        _save_optim_state(optimizer, checkpoint_dir)  # type: ignore
+    if not async_save:
+        _save_checkpoint_files(
+            stage, checkpoint_dir, state_dict, optim_state_dict, use_safetensors
+        )
+        return None
+
+    state_dict = _snapshot_to_host(state_dict, "params")
+    optim_state_dict = _snapshot_to_host(optim_state_dict, "optim")
+    if _save_executor is None:
+        _save_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="save_checkpoint"
+        )
+    _pending_save = _save_executor.submit(
+        _save_checkpoint_files,
+        stage,
+        checkpoint_dir,
+        state_dict,
+        optim_state_dict,
+        use_safetensors,
+    )
+    return _pending_save
@@ -14,7 +14,11 @@ from pippy.IR import (
     PipeSplitWrapper,
     TrivialLossWrapper,
 )
-from pippy.ModelSplit import split_into_equal_size, split_on_size_threshold
+from pippy.ModelSplit import (
+    split_into_equal_cost,
+    split_into_equal_size,
+    split_on_size_threshold,
+)
 from pippy.PipelineDriver import PipelineDriver1F1B, PipelineDriverFillDrain
 from pippy.utils import run_pippy
 
@@ -31,6 +35,7 @@ __all__ = [
     "PipelineDriverFillDrain",
     "PipelineDriver1F1B",
     "split_into_equal_size",
+    "split_into_equal_cost",
     "split_on_size_threshold",
     "compile",
     "all_compile",
@@ -12,20 +12,26 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Tuple
+from typing import Any, List, Optional, Tuple
 
 import numpy as np
+import torch
 
 import pippy.fx
 
 from pippy import pipe_split
+from pippy.ModelSplit import _analyze_node_flops_and_bytes
+from pippy.utils import _tensor_meta_bytes
 
 try:
     from numba import njit  # type: ignore
     from numba.typed import List as NumbaList  # type: ignore
+
+    HAS_NUMBA = True
 except ImportError:
+    HAS_NUMBA = False
 
     def njit(*args, **kwargs):
         def wrapper(func):
@@ -72,23 +78,203 @@ def get_possible_submesh_shapes(
     return submeshes
 
 
-NUMPY_RANDOM_SEED = 42
+@dataclass
+class DeviceProfile:
+    """
+    Throughput and capacity of the devices, and bandwidth of the links
+    between them, used to estimate the cost of running layers on a submesh
+    """
+
+    # Compute throughput of a device, FLOP/s
+    flops_per_sec: float = 100e12
+    # Memory bandwidth of a device, bytes/s
+    bytes_per_sec: float = 1e12
+    # Memory capacity of a device, bytes
+    memory_bytes: float = 16e9
+    # Bandwidth between devices on the same compute node, bytes/s
+    intra_node_bytes_per_sec: float = 100e9
+    # Bandwidth between devices on different compute nodes, bytes/s
+    inter_node_bytes_per_sec: float = 10e9
+
+
+def analyze_layer_costs(
+    fx_mod: pippy.fx.GraphModule,
+    example_inputs: Optional[List[Any]] = None,
+):
+    """
+    Per-layer (i.e. per graph node) FLOPs, bytes accessed, parameter bytes,
+    activation bytes, and bytes of the values crossing a cut before each
+    layer, as arrays indexed by the position of the node in the graph. Shapes
+    are propagated from `example_inputs`, one microbatch of inputs; without
+    them, only parameter bytes are known.
+
+    Parameters are attributed to the first layer using them, and the
+    activations of a layer are the outputs of the layers using parameters,
+    which is what tensor parallelism has to reduce.
+    """
+    nodes = list(fx_mod.graph.nodes)
+    n_layers = len(nodes)
+    node_idx = {node: i for i, node in enumerate(nodes)}
+    flops = np.zeros(n_layers)
+    mem_bytes = np.zeros(n_layers)
+    param_bytes = np.zeros(n_layers)
+    act_bytes = np.zeros(n_layers)
+    cut_bytes = np.zeros(n_layers + 1)
+
+    seen_params = set()
+
+    def _param_bytes(params):
+        nbytes = 0
+        for param in params:
+            if param not in seen_params:
+                seen_params.add(param)
+                nbytes += param.numel() * param.element_size()
+        return nbytes
+
+    for i, node in enumerate(nodes):
+        if node.op == "get_attr" and node.users:
+            attr = fx_mod
+            for atom in node.target.split("."):
+                attr = getattr(attr, atom)
+            if isinstance(attr, torch.Tensor):
+                first_user = min(node_idx[user] for user in node.users)
+                param_bytes[first_user] += _param_bytes([attr])
+        elif node.op == "call_module":
+            submod = fx_mod.get_submodule(node.target)
+            param_bytes[i] += _param_bytes(
+                list(submod.parameters()) + list(submod.buffers())
+            )
+
+    if example_inputs is None:
+        # Reading the parameters is all we know about
+        mem_bytes[:] = param_bytes
+        return flops, mem_bytes, param_bytes, act_bytes, cut_bytes
+
+    for node, (node_flops, node_bytes) in _analyze_node_flops_and_bytes(
+        fx_mod, example_inputs
+    ).items():
+        flops[node_idx[node]] = node_flops
+        mem_bytes[node_idx[node]] = node_bytes
+
+    # A value defined by nodes[i] and last used by nodes[j] crosses the cuts
+    # before nodes[i + 1], ..., nodes[j]
+    cut_diff = np.zeros(n_layers + 2)
+    for i, node in enumerate(nodes):
+        if node.op not in (
+            "placeholder",
+            "call_module",
+            "call_function",
+            "call_method",
+        ):
+            continue
+        nbytes = _tensor_meta_bytes(node.meta.get("tensor_meta", None))
+        uses_params = any(arg.op == "get_attr" for arg in node.all_input_nodes)
+        if node.op == "call_module":
+            submod = fx_mod.get_submodule(node.target)
+            uses_params = any(True for _ in submod.parameters())
+        if uses_params:
+            act_bytes[i] = nbytes
+        if nbytes and node.users:
+            last_use = max(node_idx[user] for user in node.users)
+            cut_diff[i + 1] += nbytes
+            cut_diff[last_use + 1] -= nbytes
+    cut_bytes[:] = np.cumsum(cut_diff)[: n_layers + 1]
+    cut_bytes[0] = 0
+
+    return flops, mem_bytes, param_bytes, act_bytes, cut_bytes
 
 
 def estimate_intra_costs(
-    n_submesh_choices,
-    n_layers,
+    fx_mod: pippy.fx.GraphModule,
+    submesh_shapes: List[Tuple[int, int]],
+    example_inputs: Optional[List[Any]] = None,
+    device_profile: Optional[DeviceProfile] = None,
     max_n_succ_stages=4096,
     n_autosharding_configs=1,
 ):
-    np.random.seed(NUMPY_RANDOM_SEED)
-    intra_costs = np.random.rand(
-        n_layers, n_layers, n_submesh_choices, n_autosharding_configs
+    """
+    Estimate the latency of running layers l, ..., i of `fx_mod` for one
+    microbatch as a stage on each submesh, and the number of stages that may
+    follow it before it runs out of memory.
+
+    The layers of a stage are sharded over the devices of the submesh, with
+    compute and memory traffic split evenly and their parameterized outputs
+    all-reduced, over the intra-node links if the submesh fits on a compute
+    node. The stage also receives its inputs from the previous stage over the
+    inter-node links. With s stages from a stage to the last one, a 1F1B
+    schedule stashes the activations of s microbatches in that stage.
+    """
+    if device_profile is None:
+        device_profile = DeviceProfile()
+    (
+        flops,
+        mem_bytes,
+        param_bytes,
+        act_bytes,
+        cut_bytes,
+    ) = analyze_layer_costs(fx_mod, example_inputs)
+    n_layers = len(flops)
+
+    def _range_sums(values):
+        # sums[l, i]: sum of values[l], ..., values[i]
+        prefix = np.concatenate([[0.0], np.cumsum(values)])
+        return prefix[np.newaxis, 1:] - prefix[:-1, np.newaxis]
+
+    range_flops = _range_sums(flops)
+    range_mem_bytes = _range_sums(mem_bytes)
+    range_param_bytes = _range_sums(param_bytes)
+    range_act_bytes = _range_sums(act_bytes)
+    inter_node_bytes_per_sec = device_profile.inter_node_bytes_per_sec
+    recv_time = cut_bytes[:n_layers, np.newaxis] / inter_node_bytes_per_sec
+    valid = np.triu(np.ones((n_layers, n_layers), dtype=bool))
+    # Stages after the first cannot start at an input or the output
+    for l, node in enumerate(fx_mod.graph.nodes):
+        if l > 0 and node.op in ("placeholder", "output"):
+            valid[l, :] = False
+
+    intra_costs = np.full(
+        (n_layers, n_layers, len(submesh_shapes), n_autosharding_configs),
+        np.inf,
     )
     max_n_succ_stages = np.full(
-        (n_layers, n_layers, n_submesh_choices, n_autosharding_configs),
+        (n_layers, n_layers, len(submesh_shapes), n_autosharding_configs),
         max_n_succ_stages,
     )
+    for submesh_idx, (n_compute_nodes, n_devices_per_node) in enumerate(
+        submesh_shapes
+    ):
+        n_devices = n_compute_nodes * n_devices_per_node
+        link_bytes_per_sec = (
+            device_profile.intra_node_bytes_per_sec
+            if n_compute_nodes == 1
+            else device_profile.inter_node_bytes_per_sec
+        )
+        compute_time = np.maximum(
+            range_flops / (n_devices * device_profile.flops_per_sec),
+            range_mem_bytes / (n_devices * device_profile.bytes_per_sec),
+        )
+        # Ring all-reduce
+        all_reduce_bytes = 2 * (n_devices - 1) / n_devices * range_act_bytes
+        all_reduce_time = all_reduce_bytes / link_bytes_per_sec
+        stage_cost = compute_time + all_reduce_time + recv_time
+        stage_cost = np.where(valid, stage_cost, np.inf)
+        intra_costs[:, :, submesh_idx, :] = stage_cost[:, :, np.newaxis]
+
+        free_memory = (
+            device_profile.memory_bytes - range_param_bytes / n_devices
+        )
+        act_memory = range_act_bytes / n_devices
+        with np.errstate(divide="ignore", invalid="ignore"):
+            n_stashed = np.where(
+                act_memory > 0,
+                np.floor(free_memory / act_memory),
+                np.inf,
+            )
+        n_stashed = np.where(free_memory < 0, 0, n_stashed)
+        max_n_succ_stages[:, :, submesh_idx, :] = np.minimum(
+            n_stashed - 1, max_n_succ_stages[:, :, submesh_idx, 0]
+        )[:, :, np.newaxis]
+
     return intra_costs, max_n_succ_stages
 
 
@@ -193,6 +379,82 @@ def inter_op_dp_inner_loop(
     return F, F_stage_max, F_argmin
 
 
+def inter_op_dp_inner_loop_numpy(
+    n_layers, n_devices, submesh_sizes, valid_idxs_costs, max_n_succ_stages
+):
+    """
+    Vectorized equivalent of `inter_op_dp_inner_loop`, used when numba is not
+    available. Placements on d devices only depend on placements on fewer
+    devices, so for each d all (stage count, layer range, submesh, sharding
+    config) candidates are evaluated at once, then reduced over the layer
+    ranges starting at the same layer. Ties go to the first candidate, as in
+    the sequential loop.
+    """
+    F = np.full(
+        (n_layers + 1, n_layers + 1, n_devices + 1), np.inf, dtype=np.float32
+    )
+    F_stage_max = np.full(
+        (n_layers + 1, n_layers + 1, n_devices + 1), 0.0, dtype=np.float32
+    )
+    F_argmin = np.full(
+        (n_layers + 1, n_layers + 1, n_devices + 1, 3), -1, dtype=np.int32
+    )
+    F[0, n_layers, 0] = 0
+
+    submesh_sizes = np.asarray(submesh_sizes)
+    idxs = valid_idxs_costs[:, :4].astype(np.int64)
+    stage_costs = valid_idxs_costs[:, 4]
+    # Group the candidates by l, keeping their order within a group. They
+    # usually are already, `inter_op_dp` lists them in lexicographic order
+    order = np.argsort(idxs[:, 0], kind="stable")
+    idxs, stage_costs = idxs[order], stage_costs[order]
+    l, i, submesh_shape_idx, sharding_config_idx = idxs.T
+    n_submesh_devices = submesh_sizes[submesh_shape_idx]
+    max_s = max_n_succ_stages[l, i, submesh_shape_idx, sharding_config_idx]
+    # s - 1 for s = 1, ..., n_layers
+    prev_s = np.arange(n_layers)[:, np.newaxis]
+
+    for d in range(1, n_devices + 1):
+        fits = n_submesh_devices <= d
+        if not fits.any():
+            continue
+        c_l, c_i, c_max_s = l[fits], i[fits], max_s[fits]
+        c_costs = stage_costs[fits]
+        c_prev_d = d - n_submesh_devices[fits]
+
+        # new_costs[s - 1, c]: cost of placing candidate c as the first of s
+        # stages
+        new_costs = F[:n_layers, c_i + 1, c_prev_d] + c_costs
+        new_costs[prev_s > c_max_s] = np.inf
+
+        # Reduce over the candidates starting at the same layer, keeping the
+        # first of the cheapest ones
+        group_starts = np.flatnonzero(np.r_[True, c_l[1:] != c_l[:-1]])
+        group_l = c_l[group_starts]
+        group_min = np.minimum.reduceat(new_costs, group_starts, axis=1)
+        group_sizes = np.diff(np.r_[group_starts, len(c_l)])
+        is_min = new_costs == np.repeat(group_min, group_sizes, axis=1)
+        candidate_idxs = np.where(is_min, np.arange(len(c_l)), len(c_l))
+        best = np.minimum.reduceat(candidate_idxs, group_starts, axis=1)
+
+        s_idx, g_idx = np.nonzero(np.isfinite(group_min))
+        best = best[s_idx, g_idx]
+        F[s_idx + 1, group_l[g_idx], d] = group_min[s_idx, g_idx]
+        F_argmin[s_idx + 1, group_l[g_idx], d] = np.stack(
+            [
+                c_i[best] + 1,
+                submesh_shape_idx[fits][best],
+                sharding_config_idx[fits][best],
+            ],
+            axis=-1,
+        )
+        F_stage_max[s_idx + 1, group_l[g_idx], d] = np.maximum(
+            F_stage_max[s_idx, c_i[best] + 1, c_prev_d[best]], c_costs[best]
+        )
+
+    return F, F_stage_max, F_argmin
+
+
 def inter_op_dp(
     n_layers: int,
     n_devices: int,
@@ -200,15 +462,25 @@ def inter_op_dp(
     submesh_shapes: List[Tuple[int, int]],
     intra_compute_costs,
     max_n_succ_stages,
+    inner_loop=None,
 ):
     """
     DP to compute optimal latency and number of pipeline stages and mapping of
-    stages to compute cluster submeshes.
+    stages to compute cluster submeshes. `inner_loop` defaults to the
+    numba-compiled loop if numba is installed, else to its NumPy equivalent.
     """
+    if inner_loop is None and HAS_NUMBA:
+        inner_loop = inter_op_dp_inner_loop
+    elif inner_loop is None:
+        inner_loop = inter_op_dp_inner_loop_numpy
+
     min_cost = np.inf
     best_solution = None
     prev_intra_cost = 0.0
-    gap = 1e-6
+    # Thresholds closer than this are not worth another pass, relative to
+    # the largest cost as costs may be tiny when measured in seconds
+    finite_costs = intra_compute_costs[np.isfinite(intra_compute_costs)]
+    gap = 1e-6 * (finite_costs.max() if finite_costs.size else 1.0)
 
     submesh_sizes: list = NumbaList()
     for n, m in submesh_shapes:
@@ -235,7 +507,7 @@ def inter_op_dp(
             [valid_cost_idxs, valid_costs[:, np.newaxis]]
         )
 
-        F, F_stage_max, F_argmin = inter_op_dp_inner_loop(
+        F, F_stage_max, F_argmin = inner_loop(
             n_layers,
             n_devices,
             submesh_sizes,
@@ -269,6 +541,10 @@ class AutoParallelConfig:
     n_devices_per_node: int
     n_microbatches: int
     submesh_space: SubmeshSpace = SubmeshSpace.ALL
+    # Example inputs of one microbatch, to estimate compute and activation
+    # costs from; without them the costs only account for parameters
+    example_inputs: Optional[List[Any]] = None
+    device_profile: DeviceProfile = field(default_factory=DeviceProfile)
 
 
 def dp_auto_parallel(config: AutoParallelConfig):
@@ -280,7 +556,10 @@ def dp_auto_parallel(config: AutoParallelConfig):
             submesh_space=config.submesh_space,
         )
         intra_costs, max_n_succ_stages = estimate_intra_costs(
-            len(submesh_shapes), n_layers=n_graph_nodes
+            fx_mod,
+            submesh_shapes,
+            example_inputs=config.example_inputs,
+            device_profile=config.device_profile,
         )
         optimal_layer_submesh_assignments = inter_op_dp(
             n_layers=n_graph_nodes,
@@ -1,10 +1,70 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates
-from typing import List
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 import torch
+from packaging import version
 
 from pippy.debug import map_debug_info
 
+# Starting a backward from `torch.autograd.graph.GradientEdge`s, i.e. from the
+# middle of the autograd graph, is needed to compute the weight gradients
+# apart from the input gradients
+torch_version = version.parse(torch.__version__)
+_HAS_GRADIENT_EDGE_BACKWARD = (
+    torch_version.major,
+    torch_version.minor,
+) >= (2, 4)
+
+
+def _extract_tensors_with_grads(
+    stage_output,
+    output_grads,
+    outputs_with_grads_idxs: List[int],
+) -> Tuple[List[torch.Tensor], List[Optional[torch.Tensor]]]:
+    """
+    Flatten the stage outputs that take part in backward, and the gradients
+    flowing into them, into two matching lists of tensors
+    """
+    stage_output_with_grads = [stage_output[i] for i in outputs_with_grads_idxs]
+    output_grads_with_grads = [output_grads[i] for i in outputs_with_grads_idxs]
+
+    # stage_output may be a composite datatype like dict. Extract all individual
+    # tensor values here
+    stage_output_tensors = []
+    output_grad_tensors = []
+
+    def extract_tensors_with_grads(output_val, grad_val):
+        if isinstance(output_val, torch.Tensor):
+            if not output_val.requires_grad and output_val.grad_fn is None:
+                return
+            assert isinstance(
+                grad_val, (torch.Tensor, type(None))
+            ), f"Expected Tensor or None gradient but got {type(grad_val)}"
+            stage_output_tensors.append(output_val)
+            output_grad_tensors.append(grad_val)
+        elif isinstance(output_val, (tuple, list)):
+            if grad_val is None:
+                return
+            assert isinstance(
+                grad_val, (tuple, list)
+            ), f"grad_value expected to have type {type(output_val)} but got {type(grad_val)}"
+            assert len(output_val) == len(grad_val)
+            for ov, gv in zip(output_val, grad_val):
+                extract_tensors_with_grads(ov, gv)
+        elif isinstance(output_val, dict):
+            if grad_val is None:
+                return
+            assert isinstance(grad_val, dict)
+            assert set(output_val.keys()) == set(grad_val.keys())
+            for k in output_val.keys():
+                extract_tensors_with_grads(output_val[k], grad_val[k])
+        else:
+            # Output is a non-tensor type; just ignore it
+            pass
+
+    extract_tensors_with_grads(stage_output_with_grads, output_grads_with_grads)
+    return stage_output_tensors, output_grad_tensors
+
 
 def stage_backward(
     stage_output,
@@ -21,49 +81,8 @@ def stage_backward(
     """
 
     try:
-        stage_output_with_grads = [
-            stage_output[i] for i in outputs_with_grads_idxs
-        ]
-        output_grads_with_grads = [
-            output_grads[i] for i in outputs_with_grads_idxs
-        ]
-
-        # stage_output may be a composite datatype like dict. Extract all individual
-        # tensor values here
-        stage_output_tensors = []
-        output_grad_tensors = []
-
-        def extract_tensors_with_grads(output_val, grad_val):
-            if isinstance(output_val, torch.Tensor):
-                if not output_val.requires_grad and output_val.grad_fn is None:
-                    return
-                assert isinstance(
-                    grad_val, (torch.Tensor, type(None))
-                ), f"Expected Tensor or None gradient but got {type(grad_val)}"
-                stage_output_tensors.append(output_val)
-                output_grad_tensors.append(grad_val)
-            elif isinstance(output_val, (tuple, list)):
-                if grad_val is None:
-                    return
-                assert isinstance(
-                    grad_val, (tuple, list)
-                ), f"grad_value expected to have type {type(output_val)} but got {type(grad_val)}"
-                assert len(output_val) == len(grad_val)
-                for ov, gv in zip(output_val, grad_val):
-                    extract_tensors_with_grads(ov, gv)
-            elif isinstance(output_val, dict):
-                if grad_val is None:
-                    return
-                assert isinstance(grad_val, dict)
-                assert set(output_val.keys()) == set(grad_val.keys())
-                for k in output_val.keys():
-                    extract_tensors_with_grads(output_val[k], grad_val[k])
-            else:
-                # Output is a non-tensor type; just ignore it
-                pass
-
-        extract_tensors_with_grads(
-            stage_output_with_grads, output_grads_with_grads
+        stage_output_tensors, output_grad_tensors = _extract_tensors_with_grads(
+            stage_output, output_grads, outputs_with_grads_idxs
         )
 
         torch.autograd.backward(
@@ -102,6 +121,249 @@ def stage_backward(
     return grad_inputs, barrier_token
 
 
+def _get_grad_node(t: torch.Tensor):
+    return torch.autograd.graph.get_gradient_edge(t).node
+
+
+def _get_weight_grad_groups(
+    stage_output_tensors: List[torch.Tensor],
+    output_grad_tensors: List[Optional[torch.Tensor]],
+    inputs_with_grad: List[torch.Tensor],
+):
+    """
+    Find where the weight gradients branch off from the input gradients in the
+    autograd graph of the stage outputs. Returns the nodes computing input
+    gradients that the weights depend on, along with the gradients flowing
+    into the stage outputs that do not depend on the inputs, and groups of
+    weight gradient accumulators. The accumulators of a group are reached from
+    the same such nodes, which are not on the path to the other groups.
+    """
+    input_nodes = {_get_grad_node(t) for t in inputs_with_grad}
+
+    # Reverse the graph, up to the stage inputs
+    parents: Dict = {}
+    roots = []
+    queue = []
+    for t in stage_output_tensors:
+        node = _get_grad_node(t)
+        roots.append(node)
+        if node not in parents:
+            parents[node] = []
+            queue.append(node)
+    while queue:
+        node = queue.pop()
+        if node in input_nodes:
+            continue
+        for child, _ in node.next_functions:
+            if child is None:
+                continue
+            if child not in parents:
+                parents[child] = []
+                queue.append(child)
+            parents[child].append(node)
+
+    # Nodes run by the input gradient pass
+    input_closure: Set = set()
+    queue = [node for node in input_nodes if node in parents]
+    while queue:
+        node = queue.pop()
+        if node not in input_closure:
+            input_closure.add(node)
+            queue.extend(parents[node])
+
+    # Gradients of the stage outputs that the input gradient pass never sees
+    output_grads: Dict = {}
+    for t, grad, node in zip(stage_output_tensors, output_grad_tensors, roots):
+        if node not in input_closure:
+            grads = output_grads.setdefault(node, {})
+            output_nr = torch.autograd.graph.get_gradient_edge(t).output_nr
+            grad = torch.ones_like(t) if grad is None else grad
+            if output_nr in grads:
+                grad = grads[output_nr] + grad
+            grads[output_nr] = grad
+
+    # Accumulators are grouped when sharing branch nodes
+    groups: List[Tuple[Set, Set]] = []
+    for leaf in parents:
+        if leaf in input_nodes or not hasattr(leaf, "variable"):
+            continue
+        branch_nodes = set()
+        seen = {leaf}
+        queue = [leaf]
+        while queue:
+            node = queue.pop()
+            if node in output_grads:
+                branch_nodes.add(node)
+            for parent in parents[node]:
+                if parent in input_closure:
+                    branch_nodes.add(parent)
+                elif parent not in seen:
+                    seen.add(parent)
+                    queue.append(parent)
+        leaves = {leaf}
+        for other in [g for g in groups if g[1] & branch_nodes]:
+            groups.remove(other)
+            leaves |= other[0]
+            branch_nodes |= other[1]
+        groups.append((leaves, branch_nodes))
+
+    branch_nodes = set().union(*(g[1] for g in groups)) & input_closure
+    return branch_nodes, output_grads, groups
+
+
+def stage_backward_input(
+    stage_output,
+    output_grads,
+    input_values,
+    stage_info: str,
+    outputs_with_grads_idxs: List[int],
+) -> Tuple[List[Optional[torch.Tensor]], Callable[[Iterable], None]]:
+    """
+    First half of a split `stage_backward`: compute and return the gradients
+    of the input values only, keeping the autograd graph alive. Gradients of
+    the parameters are computed when calling the returned function with the
+    parameters. Running the input half first unblocks the upstream stage
+    earlier, and the weight half can be deferred to a pipeline bubble.
+    """
+    # Gradients flowing into the nodes the weight gradients branch off from,
+    # saved by the input pass so that the weight pass starts from there
+    saved_grads: Dict = {}
+    groups: List[Tuple[Set, Set]] = []
+    hooked_nodes: Set = set()
+    handles = []
+    try:
+        stage_output_tensors, output_grad_tensors = _extract_tensors_with_grads(
+            stage_output, output_grads, outputs_with_grads_idxs
+        )
+
+        inputs_with_grad = [
+            val
+            for val in input_values
+            if isinstance(val, torch.Tensor) and val.requires_grad
+        ]
+        split_weight_grads = (
+            bool(inputs_with_grad) and _HAS_GRADIENT_EDGE_BACKWARD
+        )
+        if split_weight_grads:
+            hooked_nodes, saved_grads, groups = _get_weight_grad_groups(
+                stage_output_tensors, output_grad_tensors, inputs_with_grad
+            )
+
+            def save_grads_hook(node):
+                def hook(grad_outputs):
+                    saved_grads[node] = dict(enumerate(grad_outputs))
+
+                return hook
+
+            for node in hooked_nodes:
+                handles.append(node.register_prehook(save_grads_hook(node)))
+
+        grads_with_grad = iter(
+            torch.autograd.grad(
+                stage_output_tensors,
+                inputs_with_grad,
+                output_grad_tensors,  # type: ignore[arg-type]
+                retain_graph=True,
+                allow_unused=True,
+            )
+            if inputs_with_grad
+            else []
+        )
+        grad_inputs = [
+            next(grads_with_grad)
+            if isinstance(val, torch.Tensor) and val.requires_grad
+            else None
+            for val in input_values
+        ]
+
+    except Exception as e:
+        exc_msg = f"""
+        Failed to run input backward stage {stage_info}
+        Stage output: {map_debug_info(stage_output)}
+        Output gradient: {map_debug_info(output_grads)}
+        Input: {map_debug_info(input_values)}
+        """
+        raise RuntimeError(exc_msg) from e
+    finally:
+        for handle in handles:
+            handle.remove()
+
+    def stage_backward_weight(weights: Iterable):
+        """
+        Second half of a split `stage_backward`: accumulate the gradients of
+        `weights` into their `.grad`. Only the part of the autograd graph
+        between the weights and the gradients saved by the input pass is run
+        """
+        weights = [w for w in weights if w.requires_grad]
+        if not stage_output_tensors or not weights:
+            return
+        try:
+            if not split_weight_grads:
+                # Nothing ran in the input pass, e.g. in the first stage
+                torch.autograd.backward(
+                    stage_output_tensors,
+                    grad_tensors=output_grad_tensors,  # type: ignore[arg-type]
+                    inputs=weights,
+                )
+                return
+
+            node_to_weight = {_get_grad_node(w): w for w in weights}
+            for leaves, branch_nodes in groups:
+                group_weights = [
+                    node_to_weight[leaf]
+                    for leaf in leaves
+                    if leaf in node_to_weight
+                ]
+                edges = []
+                grads = []
+                for node in branch_nodes:
+                    for output_nr, grad in saved_grads.get(node, {}).items():
+                        if grad is not None:
+                            edges.append(
+                                torch.autograd.graph.GradientEdge(
+                                    node, output_nr
+                                )
+                            )
+                            grads.append(grad)
+                if not group_weights or not edges:
+                    continue
+
+                # With shared weights, a branch node may be reached from
+                # another one: keep its saved gradients rather than adding
+                # up the part flowing through the other branch node again
+                clamp_handles = []
+                if len(branch_nodes) > 1:
+                    for node in branch_nodes:
+                        if node in saved_grads and node in hooked_nodes:
+                            clamp_handles.append(
+                                node.register_prehook(
+                                    lambda grad_outputs, node=node: tuple(
+                                        saved_grads[node][i]
+                                        for i in range(len(grad_outputs))
+                                    )
+                                )
+                            )
+                try:
+                    torch.autograd.backward(
+                        edges,
+                        grad_tensors=grads,
+                        retain_graph=True,
+                        inputs=group_weights,
+                    )
+                finally:
+                    for handle in clamp_handles:
+                        handle.remove()
+        except Exception as e:
+            raise RuntimeError(
+                f"Failed to run weight backward stage {stage_info}"
+            ) from e
+        finally:
+            saved_grads.clear()
+            groups.clear()
+
+    return grad_inputs, stage_backward_weight
+
+
 def sync_barrier(loss, barrier_tokens, last_grads):
     return loss, last_grads
 
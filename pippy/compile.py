@@ -1,10 +1,13 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates
 import inspect
+import io
 import logging
-from typing import Any, Callable, List, Optional
+import threading
+from typing import Any, Callable, Dict, List, Optional, Union
 
 import torch
 import torch.distributed as dist
+import torch.distributed.rpc as rpc
 from torch._subclasses.fake_tensor import FakeTensorMode
 
 import pippy.fx as fx
@@ -20,8 +23,14 @@ from pippy.PipelineDriver import (
     PipelineDriver1F1B,
     PipelineDriverFillDrain,
     PipelineDriverInterleaved1F1B,
+    PipelineDriverZeroBubble,
+)
+from pippy.PipelineStage import (
+    PipelineStage,
+    PipelineStage1F1B,
+    PipelineStageInterleaved1F1B,
+    PipelineStageZeroBubble,
 )
-from pippy.PipelineStage import PipelineStage, PipelineStage1F1B
 from pippy.utils import get_device, get_pp_rank, get_rank
 
 
@@ -29,9 +38,41 @@ PIPELINE_SCHEDULE_DRIVERS = {
     "FillDrain": PipelineDriverFillDrain,
     "1F1B": PipelineDriver1F1B,
     "Interleaved1F1B": PipelineDriverInterleaved1F1B,
+    "ZeroBubble": PipelineDriverZeroBubble,
 }
 
 
+# Pipes traced by the first pipeline rank in `all_compile(..., trace_once=True)`,
+# serialized without weights, by compile call, for the other ranks to fetch
+_traced_pipes: Dict[int, bytes] = {}
+_traced_pipes_fetches: Dict[int, int] = {}
+_traced_pipes_cv = threading.Condition()
+# Number of `all_compile(..., trace_once=True)` calls on this rank
+_trace_once_calls = 0
+
+
+def _publish_traced_pipe(call_idx: int, pipe: Pipe, num_fetches: int):
+    f = io.BytesIO()
+    pipe._dump_without_weights(f)
+    with _traced_pipes_cv:
+        if num_fetches > 0:
+            _traced_pipes[call_idx] = f.getvalue()
+            _traced_pipes_fetches[call_idx] = num_fetches
+        _traced_pipes_cv.notify_all()
+
+
+def _fetch_traced_pipe(call_idx: int) -> bytes:
+    # Runs on the first pipeline rank, on behalf of another rank
+    with _traced_pipes_cv:
+        _traced_pipes_cv.wait_for(lambda: call_idx in _traced_pipes)
+        data = _traced_pipes[call_idx]
+        _traced_pipes_fetches[call_idx] -= 1
+        if _traced_pipes_fetches[call_idx] == 0:
+            del _traced_pipes[call_idx]
+            del _traced_pipes_fetches[call_idx]
+    return data
+
+
 def create_default_args(
     mod: torch.nn.Module,
     except_keys: List = None,
@@ -64,6 +105,7 @@ def _compile(
     _debug_mask_minibatches: bool = False,
     index_filename=None,
     checkpoint_prefix: str = None,
+    trace_once: bool = False,
     **kwargs,
 ):
     if ranks is None:
@@ -86,15 +128,33 @@ def _compile(
             output_chunk_spec, lambda v: isinstance(v, LossReducer)
         )
 
-    logging.info("[PiPPy] Tracing model ...")
-    pipe_model = Pipe.from_tracing(
-        mod,
-        multi_use_param_spec=multi_use_param_spec,
-        tracer=tracer,
-        output_loss_value_spec=output_loss_value_spec,
-        split_policy=split_policy,
-        **kwargs,
-    )
+    trace_once = all_compile and trace_once
+    if trace_once:
+        global _trace_once_calls
+        call_idx = _trace_once_calls
+        _trace_once_calls += 1
+
+    if not trace_once or pp_rank == 0:
+        logging.info("[PiPPy] Tracing model ...")
+        pipe_model = Pipe.from_tracing(
+            mod,
+            multi_use_param_spec=multi_use_param_spec,
+            tracer=tracer,
+            output_loss_value_spec=output_loss_value_spec,
+            split_policy=split_policy,
+            **kwargs,
+        )
+        if trace_once:
+            _publish_traced_pipe(call_idx, pipe_model, len(ranks) - 1)
+    else:
+        # Only the first pipeline rank traces and splits the model, the
+        # other ranks fetch the split graph and bind their own stage's
+        # parameters into it
+        logging.info(f"[PiPPy] Fetching traced model from rank {ranks[0]} ...")
+        data = rpc.rpc_sync(ranks[0], _fetch_traced_pipe, (call_idx,))
+        pipe_model = Pipe._load_without_weights(
+            io.BytesIO(data), mod, stage_idx=pp_rank
+        )
 
     # In all_compile mode, each rank calls pippy.all_compile, hence they will all have the pipe.
     # We can hence ask each rank to get its own stage from the pipe, and materialize it locally.
@@ -195,8 +255,16 @@ def all_compile(
     output_chunk_spec=None,
     checkpoint=False,
     _debug_mask_minibatches: bool = False,
+    trace_once: bool = False,
     **kwargs,
 ):
+    """
+    With ``trace_once``, only the first rank of ``ranks`` traces and splits
+    ``mod``; the other ranks fetch the split graph from it, without weights,
+    and only bind the parameters and buffers of ``mod`` used by their own
+    stage. Every rank should call `all_compile` the same number of times
+    with ``trace_once``.
+    """
     return _compile(
         True,
         mod,
@@ -212,6 +280,7 @@ def all_compile(
         output_chunk_spec=output_chunk_spec,
         checkpoint=checkpoint,
         _debug_mask_minibatches=_debug_mask_minibatches,
+        trace_once=trace_once,
         **kwargs,
     )
 
@@ -232,8 +301,12 @@ def compile_stage(
     kwargs_chunk_spec=None,
     output_chunk_spec=None,
     schedule="FillDrain",
+    coalesce_p2p: bool = False,
+    overlap_p2p: bool = False,
+    activation_offload_budget: Optional[int] = None,
+    dynamic_shapes: bool = False,
     **kwargs,
-) -> PipelineStage:
+) -> Union[PipelineStage, PipelineStageInterleaved1F1B]:
     # If a param will be used in multiple pipeline stages, we default the strategy to REPLICATE'ing the param across
     # stages instead of TRANSMIT'ting it
     multi_use_param_spec = MultiUseParameterConfig.REPLICATE
@@ -295,7 +368,41 @@ def compile_stage(
     )
 
     # Create pipeline stage based on schedule
-    if schedule == "1F1B":
+    if schedule == "Interleaved1F1B":
+        # The rank hosts stages `stage_index`, `stage_index + num_stages`, ...
+        # of the pipe, i.e. `num_stages` is the number of pipeline ranks
+        return PipelineStageInterleaved1F1B(
+            pipe,
+            stage_index,
+            num_stages,
+            num_chunks,
+            device,
+            group=group,
+            args_chunk_spec=args_chunk_spec,
+            kwargs_chunk_spec=kwargs_chunk_spec,
+            output_chunk_spec=output_chunk_spec,
+            coalesce_p2p=coalesce_p2p,
+            overlap_p2p=overlap_p2p,
+            activation_offload_budget=activation_offload_budget,
+            dynamic_shapes=dynamic_shapes,
+        )
+    elif schedule == "ZeroBubble":
+        return PipelineStageZeroBubble(
+            pipe,
+            stage_index,
+            num_stages,
+            num_chunks,
+            device,
+            group=group,
+            args_chunk_spec=args_chunk_spec,
+            kwargs_chunk_spec=kwargs_chunk_spec,
+            output_chunk_spec=output_chunk_spec,
+            coalesce_p2p=coalesce_p2p,
+            overlap_p2p=overlap_p2p,
+            activation_offload_budget=activation_offload_budget,
+            dynamic_shapes=dynamic_shapes,
+        )
+    elif schedule == "1F1B":
         return PipelineStage1F1B(
             pipe,
             stage_index,
@@ -306,6 +413,10 @@ def compile_stage(
             args_chunk_spec=args_chunk_spec,
             kwargs_chunk_spec=kwargs_chunk_spec,
             output_chunk_spec=output_chunk_spec,
+            coalesce_p2p=coalesce_p2p,
+            overlap_p2p=overlap_p2p,
+            activation_offload_budget=activation_offload_budget,
+            dynamic_shapes=dynamic_shapes,
         )
     else:
         return PipelineStage(
@@ -318,4 +429,8 @@ def compile_stage(
             args_chunk_spec=args_chunk_spec,
             kwargs_chunk_spec=kwargs_chunk_spec,
             output_chunk_spec=output_chunk_spec,
+            coalesce_p2p=coalesce_p2p,
+            overlap_p2p=overlap_p2p,
+            activation_offload_budget=activation_offload_budget,
+            dynamic_shapes=dynamic_shapes,
         )
@@ -1,11 +1,13 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates
+import functools
+import heapq
 import logging
 import warnings
-from typing import Any
+from typing import Any, List
 
 import torch
 
-from torch.utils._pytree import tree_flatten, tree_unflatten
+from torch.utils._pytree import LeafSpec, tree_flatten, tree_unflatten
 
 from pippy.IR import TrivialLossWrapper
 
@@ -39,30 +41,205 @@ class TensorChunkSpec:
         return f"TensorChunkSpec({self.split_dim})"
 
 
+# Class used to specify chunking of inputs into microbatches of roughly equal
+# token counts, e.g. for padded variable-length sequences. Rows along
+# `split_dim` are assigned to chunks based on the token counts of the input
+# named by `lengths` (a kwarg name or a positional arg index). That input is
+# either a 1-D tensor of per-row token counts or a mask whose nonzero entries
+# are tokens, with rows along dimension 0. Every `TokenBalancedChunkSpec` used
+# in one split must take its lengths from the same input.
+#
+# The assignment of the last split is recorded on the spec, so `merge_chunks`
+# can restore the original row order when the same instance is used in the
+# output chunk spec.
+class TokenBalancedChunkSpec(TensorChunkSpec):
+    def __init__(self, split_dim, lengths):
+        super().__init__(split_dim)
+        self.lengths = lengths
+        # Rows of chunk 0, then rows of chunk 1, etc.
+        self.row_order = None
+        self.chunk_sizes = None
+
+    def __repr__(self):
+        return f"{self.__class__.__module__}.{self.__class__.__name__}({self.split_dim}, {self.lengths!r})"
+
+    def __str__(self):
+        return f"TokenBalancedChunkSpec({self.split_dim}, {self.lengths!r})"
+
+
 # Class used to specify replication of inputs
 class Replicate:
     pass
 
 
-def shard_dict_of_args(
-    args_dict,
-    args_chunk_spec,
-    num_chunks,
-    _debug_mask_minibatches: bool = False,
-):
-    # Stage 1+2: flatten and shard/replicate
+class _ChunkPlan:
+    """
+    Precomputed recipe for splitting a dict of (nested) args into chunks.
+    Depends only on the args' tree structure, the chunk spec and the sizes of
+    the sharded dimensions, so it can be reused across steps. Applying a plan
+    costs one `split` per sharded tensor plus rebuilding each chunk's args
+    with unflatten functions specialized to their tree structure.
+    """
+
+    def __init__(self, arg_keys, arg_specs, split_leaves, num_chunks):
+        self.arg_keys = arg_keys
+        self.arg_unflatteners = [_compile_unflatten(spec) for spec in arg_specs]
+        # [(flat index, split dim, per-chunk sizes)] for each sharded tensor.
+        # Sizes are None for token-balanced tensors, whose rows are assigned
+        # per split.
+        self.split_leaves = split_leaves
+        self.num_chunks = num_chunks
+
+    def split(
+        self,
+        flat,
+        _debug_mask_minibatches: bool = False,
+        row_partition=None,
+    ):
+        # chunks_flat : [num chunks, num flat values]
+        chunks_flat = [list(flat) for _ in range(self.num_chunks)]
+        for flat_idx, split_dim, sizes in self.split_leaves:
+            v = flat[flat_idx]
+            if sizes is None:
+                # Token-balanced: gather the rows of all chunks, then split
+                if _debug_mask_minibatches:
+                    raise NotImplementedError(
+                        "_debug_mask_minibatches is not supported with "
+                        "TokenBalancedChunkSpec"
+                    )
+                assert row_partition is not None
+                row_order, sizes = row_partition
+                if v.size(split_dim) != len(row_order):
+                    raise RuntimeError(
+                        f"Tensor size on chunking dimension is {v.size(split_dim)}, "
+                        f"but the token lengths have {len(row_order)} rows"
+                    )
+                v = v.index_select(split_dim, row_order.to(v.device))
+            chunk_tensors = torch.split(v, sizes, split_dim)
+            if _debug_mask_minibatches:
+                chunk_tensors = _mask_chunks(v, chunk_tensors, split_dim)
+            for chunk_flat, chunk_tensor in zip(chunks_flat, chunk_tensors):
+                chunk_flat[flat_idx] = chunk_tensor
+
+        # args_split : [num chunks, num args]
+        args_split = []
+        for chunk_flat in chunks_flat:
+            values = iter(chunk_flat)
+            args_split.append(
+                {
+                    key: unflatten(values)
+                    for key, unflatten in zip(
+                        self.arg_keys, self.arg_unflatteners
+                    )
+                }
+            )
+        return args_split
+
+
+def _compile_unflatten(spec):
+    # Returns a function consuming values from an iterator and rebuilding the
+    # structure described by `spec`. Builtin containers are rebuilt directly,
+    # other pytree node types go through `tree_unflatten`.
+    if isinstance(spec, LeafSpec):
+        return next
+
+    children = getattr(spec, "children", None)
+    children = children() if callable(children) else spec.children_specs
+    child_fns = [_compile_unflatten(child) for child in children]
+
+    if spec.type is list:
+        return lambda values: [fn(values) for fn in child_fns]
+    elif spec.type is tuple:
+        return lambda values: tuple([fn(values) for fn in child_fns])
+    elif spec.type is dict:
+        keys = list(spec.context)
+        return lambda values: {
+            key: fn(values) for key, fn in zip(keys, child_fns)
+        }
+    else:
+        num_leaves = spec.num_leaves
+        return lambda values: tree_unflatten(
+            [next(values) for _ in range(num_leaves)], spec
+        )
 
-    # args_sharded_replicated : [num args, num flat values, num chunks]
-    args_sharded_replicated = {}
-    arg_specs = []
 
+def _mask_chunks(v, chunk_tensors, split_dim):
+    # Expand each chunk back to the size of `v`, with zeros outside the chunk
+    expanded_chunks = []
+    split_dim_idx = 0
+    for chunk_tensor in chunk_tensors:
+        new_val = torch.zeros_like(v)
+        chunk_size = chunk_tensor.size(split_dim)
+        new_val.narrow(split_dim, split_dim_idx, chunk_size).copy_(chunk_tensor)
+        expanded_chunks.append(new_val)
+        split_dim_idx += chunk_size
+    return expanded_chunks
+
+
+@functools.lru_cache(maxsize=64)
+def _build_chunk_plan(arg_keys, arg_specs, leaf_descs, num_chunks):
+    # `leaf_descs` has one entry per arg, holding a `(split_dim, size,
+    # balanced)` tuple for each value to be sharded and `None` for each value
+    # to be replicated
     real_num_chunks = num_chunks
     first_tensor = True
+    # Offset of the current arg's values in the flat list of all values
+    arg_offset = 0
+    sharded_leaves = []
+
+    for arg_key, arg_leaf_descs in zip(arg_keys, leaf_descs):
+        for i, desc in enumerate(arg_leaf_descs):
+            if desc is None:
+                continue
+            split_dim, v_split_dim_size, balanced = desc
+            if v_split_dim_size < real_num_chunks:
+                if first_tensor:
+                    # We can only adjust number of chunks when we hit this
+                    # issue at the first tensor encountered
+                    warnings.warn(
+                        f"Tensor size on chunking dimension is {v_split_dim_size}, "
+                        f"downsizing the number of chunks from {num_chunks} to {v_split_dim_size}."
+                    )
+                    real_num_chunks = v_split_dim_size
+                else:
+                    raise RuntimeError(
+                        f"Arg {arg_key} on chunking dimension has a size of {v_split_dim_size}, "
+                        f"smaller than the number of chunks {num_chunks}. "
+                        "PiPPy cannot reduce the number of chunks because "
+                        "other arguments have bigger chunk-dimension sizes. "
+                        "Please adjust your num_chunks setting."
+                    )
+            sharded_leaves.append(
+                (arg_offset + i, split_dim, v_split_dim_size, balanced)
+            )
+            first_tensor = False
+        arg_offset += len(arg_leaf_descs)
+
+    split_leaves = []
+    for flat_idx, split_dim, size, balanced in sharded_leaves:
+        if balanced:
+            sizes = None
+        else:
+            # Same chunk sizes as `torch.tensor_split`
+            q, r = divmod(size, real_num_chunks)
+            sizes = [q + 1] * r + [q] * (real_num_chunks - r)
+        split_leaves.append((flat_idx, split_dim, sizes))
 
+    return _ChunkPlan(arg_keys, arg_specs, split_leaves, real_num_chunks)
+
+
+def _flatten_args_dict(args_dict, args_chunk_spec):
+    # Flatten each arg and describe how each of its values is chunked. Returns
+    # all flat values, the key under which the chunk plan is cached and the
+    # `TokenBalancedChunkSpec`s in use.
     assert len(args_dict) == len(
         args_chunk_spec
     ), f"args_dict.keys() = {list(args_dict.keys())} args_chunk_spec.keys() = {list(args_chunk_spec.keys())}"
 
+    flat_all = []
+    arg_specs = []
+    leaf_descs = []
+    balanced_specs = []
     for arg_key, arg in args_dict.items():
         flat, spec = tree_flatten(arg)
         arg_specs.append(spec)
@@ -79,92 +256,98 @@ def shard_dict_of_args(
             # If user did not provide an args_chunk_spec, we would use a default spec which chunks along dim 0
             chunk_spec_flat = [TensorChunkSpec(DEFAULT_CHUNK_DIM)] * len(flat)
 
-        sharded_arg_flat = []
-
+        arg_leaf_descs = []
         for v, chunk_v in zip(flat, chunk_spec_flat):
             if chunk_v is Replicate or not isinstance(v, torch.Tensor):
-                sharded_arg_flat.append([v] * real_num_chunks)
+                arg_leaf_descs.append(None)
             elif isinstance(chunk_v, TensorChunkSpec):
-                # TODO: check type of v. If it's a tensor, use chunk (or debug mask).
-                # If it's a collection type, split it as you would expect. Otherwise,
-                # Throw an error
-                assert isinstance(v, torch.Tensor), f"{v} is not a tensor"
-
-                v_split_dim_size = v.size(chunk_v.split_dim)
-                if v_split_dim_size < real_num_chunks:
-                    if first_tensor:
-                        # We can only adjust number of chunks when we hit this
-                        # issue at the first tensor encountered
-                        warnings.warn(
-                            f"Tensor size on chunking dimension is {v_split_dim_size}, "
-                            f"downsizing the number of chunks from {num_chunks} to {v_split_dim_size}."
-                        )
-                        real_num_chunks = v_split_dim_size
-                    else:
-                        raise RuntimeError(
-                            f"Arg {arg_key} on chunking dimension has a size of {v_split_dim_size}, "
-                            f"smaller than the number of chunks {num_chunks}. "
-                            "PiPPy cannot reduce the number of chunks because "
-                            "other arguments have bigger chunk-dimension sizes. "
-                            "Please adjust your num_chunks setting."
-                        )
-
-                chunk_tensors = torch.tensor_split(
-                    v, real_num_chunks, chunk_v.split_dim
+                balanced = isinstance(chunk_v, TokenBalancedChunkSpec)
+                if balanced:
+                    balanced_specs.append(chunk_v)
+                arg_leaf_descs.append(
+                    (chunk_v.split_dim, v.size(chunk_v.split_dim), balanced)
                 )
+            else:
+                raise TypeError(f"Unrecognized chunk spec: {chunk_v}")
 
-                if _debug_mask_minibatches:
-                    expanded_chunks = []
-
-                    split_dim_idx = 0
-                    for chunk_tensor in chunk_tensors:
-                        new_val = torch.zeros_like(v)
-                        upper_idx = split_dim_idx + chunk_tensor.size(
-                            chunk_v.split_dim
-                        )
+        flat_all.extend(flat)
+        leaf_descs.append(tuple(arg_leaf_descs))
 
-                        slice_indices = [slice(None, None, None)] * new_val.ndim
-                        slice_indices[chunk_v.split_dim] = slice(
-                            split_dim_idx, upper_idx
-                        )
-                        new_val[slice_indices] = chunk_tensor
+    plan_key = (tuple(args_dict.keys()), tuple(arg_specs), tuple(leaf_descs))
+    return flat_all, plan_key, balanced_specs
 
-                        expanded_chunks.append(new_val)
 
-                        split_dim_idx += chunk_tensor.size(chunk_v.split_dim)
+def _get_chunk_plan(plan_key, num_chunks):
+    try:
+        return _build_chunk_plan(*plan_key, num_chunks)
+    except TypeError:
+        # Unhashable tree spec (older torch versions), build without caching
+        return _build_chunk_plan.__wrapped__(*plan_key, num_chunks)
 
-                    sharded_arg_flat.append(expanded_chunks)
-                else:
-                    sharded_arg_flat.append(chunk_tensors)
 
-                first_tensor = False
-            else:
-                raise TypeError(f"Unrecognized chunk spec: {chunk_v}")
+def shard_dict_of_args(
+    args_dict,
+    args_chunk_spec,
+    num_chunks,
+    _debug_mask_minibatches: bool = False,
+):
+    # Stage 1: flatten and look up (or compile) the chunk plan
+    flat, plan_key, balanced_specs = _flatten_args_dict(
+        args_dict, args_chunk_spec
+    )
+    plan = _get_chunk_plan(plan_key, num_chunks)
+    row_partition = _balance_rows(
+        balanced_specs, args_dict.get, plan.num_chunks
+    )
 
-        args_sharded_replicated[arg_key] = sharded_arg_flat
+    # Stage 2+3: shard/replicate and unflatten each chunk
+    return plan.split(flat, _debug_mask_minibatches, row_partition)
 
-    # chunks_flat : [num chunks, num args, num flat values]
-    chunks_flat = []
-    for chunk_idx in range(real_num_chunks):
-        chunk_args = {}
-        for key, arg in args_sharded_replicated.items():
-            arg_single_chunk = []
-            for v_flat in arg:
-                arg_single_chunk.append(v_flat[chunk_idx])
-            chunk_args[key] = arg_single_chunk
-        chunks_flat.append(chunk_args)
 
-    # args_split : [num chunks, num args]
-    args_split = []
+def _balance_rows(balanced_specs, get_input, num_chunks):
+    # Assign rows to chunks such that each chunk carries roughly the same
+    # number of tokens: longest rows first, each to the chunk with the fewest
+    # tokens so far. Returns `(row_order, chunk_sizes)` and records it on the
+    # specs for `merge_chunks`.
+    if not balanced_specs:
+        return None
 
-    for chunk in chunks_flat:
-        per_chunk_args = {}
-        assert len(arg_specs) == len(chunk)
-        for (key, arg), arg_spec in zip(chunk.items(), arg_specs):
-            per_chunk_args[key] = tree_unflatten(arg, arg_spec)
-        args_split.append(per_chunk_args)
+    lengths_keys = {spec.lengths for spec in balanced_specs}
+    if len(lengths_keys) != 1:
+        raise ValueError(
+            "All TokenBalancedChunkSpecs must take their lengths from the "
+            f"same input, got {sorted(lengths_keys, key=str)}"
+        )
+    (lengths_key,) = lengths_keys
+    lengths = get_input(lengths_key)
+    if not isinstance(lengths, torch.Tensor):
+        raise ValueError(
+            f"Token lengths input {lengths_key!r} is not a tensor: {lengths}"
+        )
 
-    return args_split
+    if lengths.dim() > 1:
+        lengths = (lengths != 0).reshape(lengths.size(0), -1).sum(1)
+    row_tokens = lengths.tolist()
+
+    # Heap of (tokens, rows, chunk index)
+    heap = [(0, 0, chunk) for chunk in range(num_chunks)]
+    chunk_rows: List[List[int]] = [[] for _ in range(num_chunks)]
+    for row in sorted(
+        range(len(row_tokens)), key=lambda r: row_tokens[r], reverse=True
+    ):
+        tokens, rows, chunk = heapq.heappop(heap)
+        chunk_rows[chunk].append(row)
+        heapq.heappush(heap, (tokens + row_tokens[row], rows + 1, chunk))
+
+    # Keep the original relative order of rows within a chunk
+    row_order = torch.tensor(
+        [row for rows in chunk_rows for row in sorted(rows)], dtype=torch.long
+    )
+    chunk_sizes = [len(rows) for rows in chunk_rows]
+    for spec in balanced_specs:
+        spec.row_order = row_order
+        spec.chunk_sizes = chunk_sizes
+    return row_order, chunk_sizes
 
 
 def split_args_kwargs_into_chunks(
@@ -217,36 +400,41 @@ def split_args_kwargs_into_chunks(
     if kwargs_chunk_spec is None:
         kwargs_chunk_spec = dict.fromkeys(kwargs, None)
 
-    args_split_dict = shard_dict_of_args(
-        dict(enumerate(args)),
-        dict(enumerate(args_chunk_spec)),
-        chunks,
-        _debug_mask_minibatches,
+    args_flat, args_plan_key, args_balanced_specs = _flatten_args_dict(
+        dict(enumerate(args)), dict(enumerate(args_chunk_spec))
     )
-    real_num_chunks = len(args_split_dict)
-
-    kwargs_split = shard_dict_of_args(
-        kwargs, kwargs_chunk_spec, real_num_chunks, _debug_mask_minibatches
+    kwargs_flat, kwargs_plan_key, kwargs_balanced_specs = _flatten_args_dict(
+        kwargs, kwargs_chunk_spec
     )
 
-    if len(kwargs_split) < real_num_chunks:
+    # Settle the number of chunks before sharding anything
+    args_plan = _get_chunk_plan(args_plan_key, chunks)
+    kwargs_plan = _get_chunk_plan(kwargs_plan_key, args_plan.num_chunks)
+    if kwargs_plan.num_chunks < args_plan.num_chunks:
         # In case kwargs are sharded into less chunks
         # e.g. when `args` has no tensor, just values
-        real_num_chunks = len(kwargs_split)
-        # Re-shard args
-        args_split_dict = shard_dict_of_args(
-            dict(enumerate(args)),
-            dict(enumerate(args_chunk_spec)),
-            real_num_chunks,
-            _debug_mask_minibatches,
-        )
+        args_plan = _get_chunk_plan(args_plan_key, kwargs_plan.num_chunks)
 
-    if len(args_split_dict) != len(kwargs_split):
+    if args_plan.num_chunks != kwargs_plan.num_chunks:
         raise RuntimeError(
             "args and kwargs are split into different number of chunks: "
-            f"{len(args_split_dict)}, {len(kwargs_split)}"
+            f"{args_plan.num_chunks}, {kwargs_plan.num_chunks}"
         )
 
+    # Token-balanced args and kwargs share one assignment of rows to chunks
+    row_partition = _balance_rows(
+        args_balanced_specs + kwargs_balanced_specs,
+        lambda key: kwargs.get(key) if isinstance(key, str) else args[key],
+        args_plan.num_chunks,
+    )
+
+    args_split_dict = args_plan.split(
+        args_flat, _debug_mask_minibatches, row_partition
+    )
+    kwargs_split = kwargs_plan.split(
+        kwargs_flat, _debug_mask_minibatches, row_partition
+    )
+
     args_split = []
     for chunk_args in args_split_dict:
         args_split.append(tuple(chunk_args[i] for i in range(len(chunk_args))))
@@ -313,7 +501,27 @@ def merge_chunks(chunks, chunk_spec, _debug_mask_minibatches: bool = False):
     # args_flattened : [num args]
     args_flattened = []
     for arg_idx, arg in enumerate(spec_flattened):
-        if isinstance(arg, TensorChunkSpec):
+        if isinstance(arg, TokenBalancedChunkSpec):
+            if arg.row_order is None:
+                raise RuntimeError(
+                    f"{arg} has not been used to split inputs, cannot "
+                    "restore the row order of its chunks"
+                )
+            if _debug_mask_minibatches:
+                raise NotImplementedError(
+                    "_debug_mask_minibatches is not supported with "
+                    "TokenBalancedChunkSpec"
+                )
+            catted = torch.cat(
+                [chunk_flat[arg_idx] for chunk_flat in chunks_flattened],
+                dim=arg.split_dim,
+            )
+            # Scatter rows back to their original positions
+            inverse_order = torch.argsort(arg.row_order).to(catted.device)
+            args_flattened.append(
+                catted.index_select(arg.split_dim, inverse_order)
+            )
+        elif isinstance(arg, TensorChunkSpec):
             partial_values = [
                 chunks_flattened[chunk_idx][arg_idx]
                 for chunk_idx in range(len(chunks_flattened))
@@ -374,6 +582,138 @@ def merge_chunks(chunks, chunk_spec, _debug_mask_minibatches: bool = False):
     return tree_unflatten(args_flattened, flatten_spec)
 
 
+class ChunkMerger:
+    """
+    Incremental version of `merge_chunks`, for merging chunks as they are
+    produced instead of holding all of them until the end.
+
+    Chunks must be added in chunk order. Values chunked by a
+    `TensorChunkSpec` are copied into one output tensor, allocated with the
+    first chunk for `num_chunks` chunks of that size (and grown if later
+    chunks are bigger); values of a `CustomReducer` are reduced right away.
+
+    Args:
+        chunk_spec: chunk spec of the values to merge, as for `merge_chunks`
+        num_chunks: number of chunks expected
+    """
+
+    def __init__(self, chunk_spec, num_chunks: int):
+        self.chunk_spec = chunk_spec
+        self.num_chunks = num_chunks
+        self.num_added = 0
+        self._spec_flattened: List[Any] = []
+        self._flatten_spec = None
+        # Per flat value: merged value so far (output tensor, reduced value
+        # or replicated value)
+        self._values: List[Any] = []
+        # Per flat value: number of entries written along the split dim
+        self._filled: List[int] = []
+
+    def add(self, chunk):
+        if self.num_added == 0:
+            if self.chunk_spec is not None:
+                self._spec_flattened, self._flatten_spec = tree_flatten(
+                    self.chunk_spec
+                )
+            else:
+                # Merge all outputs along the default dimension, as in
+                # `merge_chunks`
+                chunk0_flat, self._flatten_spec = tree_flatten(chunk)
+                self._spec_flattened = [
+                    TensorChunkSpec(DEFAULT_CHUNK_DIM)
+                ] * len(chunk0_flat)
+
+        chunk_flattened, _ = tree_flatten(chunk)
+        if len(chunk_flattened) != len(self._spec_flattened):
+            raise ValueError(
+                f"Chunk {chunk} did not match chunk spec {self.chunk_spec}"
+            )
+
+        for arg_idx, (arg, value) in enumerate(
+            zip(self._spec_flattened, chunk_flattened)
+        ):
+            if self.num_added == 0:
+                self._values.append(self._init_value(arg, value))
+                self._filled.append(0)
+            if isinstance(arg, TensorChunkSpec):
+                self._copy_chunk(arg_idx, arg, value)
+            elif isinstance(arg, CustomReducer):
+                self._values[arg_idx] = arg.reduce_fn(
+                    self._values[arg_idx], value
+                )
+            else:
+                assert self._values[arg_idx] == value
+
+        self.num_added += 1
+
+    def _init_value(self, arg, value):
+        if isinstance(arg, TokenBalancedChunkSpec):
+            if arg.row_order is None:
+                raise RuntimeError(
+                    f"{arg} has not been used to split inputs, cannot "
+                    "restore the row order of its chunks"
+                )
+            shape = list(value.shape)
+            shape[arg.split_dim] = len(arg.row_order)
+            return value.new_empty(shape)
+        elif isinstance(arg, TensorChunkSpec):
+            shape = list(value.shape)
+            shape[arg.split_dim] *= self.num_chunks
+            return value.new_empty(shape)
+        elif isinstance(arg, CustomReducer):
+            return arg.init_value
+        else:
+            return value
+
+    def _copy_chunk(self, arg_idx: int, arg: TensorChunkSpec, value):
+        out = self._values[arg_idx]
+        split_dim = arg.split_dim
+        start = self._filled[arg_idx]
+        size = value.size(split_dim)
+        expected_shape = list(out.shape)
+        expected_shape[split_dim] = size
+        if list(value.shape) != expected_shape:
+            raise ValueError(
+                f"Chunk {self.num_added} of shape {list(value.shape)} cannot "
+                f"be merged along dimension {split_dim} with chunks of shape "
+                f"{list(out.shape)}"
+            )
+
+        if isinstance(arg, TokenBalancedChunkSpec):
+            # Scatter rows to their original positions
+            rows = arg.row_order[start : start + size].to(out.device)
+            out.index_copy_(split_dim, rows, value)
+        else:
+            if start + size > out.size(split_dim):
+                # Chunk bigger than the first one, grow the output
+                grown_shape = list(out.shape)
+                grown_shape[split_dim] = max(
+                    2 * out.size(split_dim), start + size
+                )
+                grown = out.new_empty(grown_shape)
+                grown.narrow(split_dim, 0, start).copy_(
+                    out.narrow(split_dim, 0, start)
+                )
+                out = self._values[arg_idx] = grown
+            out.narrow(split_dim, start, size).copy_(value)
+        self._filled[arg_idx] = start + size
+
+    def result(self):
+        if self.num_added != self.num_chunks:
+            raise RuntimeError(
+                f"Expected {self.num_chunks} chunks, got {self.num_added}"
+            )
+        args_flattened = []
+        for arg_idx, arg in enumerate(self._spec_flattened):
+            value = self._values[arg_idx]
+            if isinstance(arg, TensorChunkSpec) and not isinstance(
+                arg, TokenBalancedChunkSpec
+            ):
+                value = value.narrow(arg.split_dim, 0, self._filled[arg_idx])
+            args_flattened.append(value)
+        return tree_unflatten(args_flattened, self._flatten_spec)
+
+
 def gen_output_chunk_spec(loss_spec, loss_reducer):
     output_chunk_spec: Any = None
     if loss_spec is None:
@@ -1,12 +1,14 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates
+import functools
 import logging
 import os
 import socket
-from typing import List
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import torch.distributed as dist
 
-
 # Pinning process to a separate GPU if not yet done by launch script
 # Notes:
 # 1. Previously this env was added to work around an issue that each RPC process creates an extra CUDA context on device
@@ -36,6 +38,7 @@ import torch.distributed.rpc as rpc
 import torch.multiprocessing as mp
 
 import pippy.fx
+from pippy.fx.passes import shape_prop
 
 
 def get_rank() -> int:
@@ -313,7 +316,336 @@ def flatten_args(args):
     return flat_args
 
 
-def _get_binary_filename(cur_idx: int, is_optim: bool = False) -> str:  # type: ignore[valid-type]
+def _storage_ptrs(values) -> set:
+    ptrs = set()
+    for a in flatten_args(values):
+        if isinstance(a, torch.Tensor):
+            ptr = a.untyped_storage().data_ptr()
+            if ptr != 0:
+                ptrs.add(ptr)
+    return ptrs
+
+
+class RecvBufferPool:
+    """
+    Pool of P2P receive buffers keyed by shape and dtype, reused across
+    microbatches and steps.
+
+    A buffer is only allocated when no idle buffer of the same key is
+    available. Released buffers are kept for reuse, so the number of buffers
+    held for a key equals the peak number of buffers of that key
+    simultaneously in use, i.e. the in-flight depth of the schedule using the
+    pool (all chunks for FillDrain, pipeline depth for 1F1B). After the first
+    step, steady-state steps hit the pool for every receive.
+
+    Args:
+        device: device on which buffers are allocated
+        max_buffers_per_key: optional hard cap on the number of idle buffers
+            kept per key; extra released buffers are dropped
+        max_keys: optional cap on the number of keys idle buffers are kept
+            for, e.g. when shapes vary from step to step; buffers of the
+            least recently used keys are dropped first
+    """
+
+    def __init__(
+        self,
+        device: torch.device,
+        max_buffers_per_key: Optional[int] = None,
+        max_keys: Optional[int] = None,
+    ):
+        self.device = device
+        self.max_buffers_per_key = max_buffers_per_key
+        self.max_keys = max_keys
+        self.hits = 0
+        self.misses = 0
+        # (shape, dtype) : idle buffers, least recently used key first
+        self._free: OrderedDict[Tuple, List[torch.Tensor]] = OrderedDict()
+        # Acquiring and releasing may happen on different threads (RPC
+        # handlers and the worker thread)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(shape, dtype) -> Tuple:
+        return tuple(shape), dtype
+
+    def acquire(self, shape, dtype) -> torch.Tensor:
+        key = self._key(shape, dtype)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                self.hits += 1
+                self._free.move_to_end(key)
+                return free.pop()
+            self.misses += 1
+        return torch.empty(shape, dtype=dtype, device=self.device)
+
+    def release(self, buffer: torch.Tensor):
+        """
+        Return `buffer` to the pool. The caller must not hold any other
+        reference to the buffer's storage.
+        """
+        # Drop autograd state left over by the previous user
+        buffer.grad = None
+        if buffer.requires_grad:
+            buffer.requires_grad_(False)
+        key = self._key(buffer.shape, buffer.dtype)
+        with self._lock:
+            free = self._free.setdefault(key, [])
+            self._free.move_to_end(key)
+            if (
+                self.max_buffers_per_key is None
+                or len(free) < self.max_buffers_per_key
+            ):
+                free.append(buffer)
+            if self.max_keys is not None:
+                while len(self._free) > self.max_keys:
+                    self._free.popitem(last=False)
+
+    def release_unaliased(self, buffers: List[torch.Tensor], live_values):
+        """
+        Release `buffers`, except for those sharing storage with a tensor in
+        `live_values` (e.g. a stage output that is its input); these are left
+        to their new owner and dropped from the pool.
+        """
+        if not buffers:
+            return
+        live_ptrs = _storage_ptrs(live_values)
+        for buffer in buffers:
+            if buffer.untyped_storage().data_ptr() not in live_ptrs:
+                self.release(buffer)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "buffers": sum(len(free) for free in self._free.values()),
+            }
+
+
+# Byte alignment of each tensor within a packed P2P buffer, so that unpacked
+# views are valid for any dtype
+_PACK_ALIGNMENT = 16
+
+
+def _numel(shape) -> int:
+    numel = 1
+    for d in shape:
+        numel *= d
+    return numel
+
+
+@functools.lru_cache(maxsize=None)
+def _element_size(dtype: torch.dtype) -> int:
+    return torch.empty(0, dtype=dtype).element_size()
+
+
+def _nbytes(shape, dtype) -> int:
+    return _numel(shape) * _element_size(dtype)
+
+
+def _tensor_meta_bytes(tensor_meta) -> int:
+    """
+    Total size of the tensors described by a (possibly nested) `tensor_meta`
+    """
+    if isinstance(tensor_meta, shape_prop.TensorMetadata):
+        return _nbytes(tensor_meta.shape, tensor_meta.dtype)
+    if isinstance(tensor_meta, (tuple, list)):
+        return sum(_tensor_meta_bytes(tm) for tm in tensor_meta)
+    if isinstance(tensor_meta, dict):
+        return sum(_tensor_meta_bytes(tm) for tm in tensor_meta.values())
+    return 0
+
+
+def _packed_offsets(metas) -> Tuple[List[int], int]:
+    """
+    Byte offset of each `(shape, dtype)` in `metas` within a packed buffer,
+    and the total size of that buffer
+    """
+    offsets = []
+    size = 0
+    for shape, dtype in metas:
+        offsets.append(size)
+        nbytes = _nbytes(shape, dtype)
+        size += -(-nbytes // _PACK_ALIGNMENT) * _PACK_ALIGNMENT
+    return offsets, size
+
+
+def pack_tensors(tensors: List[torch.Tensor]) -> torch.Tensor:
+    """
+    Copy `tensors` into a single flat uint8 buffer, to be sent as one P2P
+    message and unpacked by `unpack_tensors` on the receiver
+    """
+    offsets, size = _packed_offsets([(t.shape, t.dtype) for t in tensors])
+    packed = torch.empty(size, dtype=torch.uint8, device=tensors[0].device)
+    for t, offset in zip(tensors, offsets):
+        if t.numel() == 0:
+            continue
+        flat = t.detach().reshape(-1).view(torch.uint8)
+        packed[offset : offset + flat.numel()].copy_(flat)
+    return packed
+
+
+def unpack_tensors(packed: torch.Tensor, metas) -> List[torch.Tensor]:
+    """
+    Zero-copy views of the tensors described by `metas` (a list of
+    `(shape, dtype)`) in a buffer produced by `pack_tensors`
+    """
+    offsets, _ = _packed_offsets(metas)
+    return [
+        packed[offset : offset + _nbytes(shape, dtype)].view(dtype).view(shape)
+        for (shape, dtype), offset in zip(metas, offsets)
+    ]
+
+
+class _OffloadedTensor:
+    """
+    Saved tensor moved to host memory by `ActivationOffloader`
+    """
+
+    def __init__(self, host_tensor: torch.Tensor, device: torch.device):
+        self.host_tensor = host_tensor
+        self.device = device
+        # Copy back to `device`, set by `ActivationOffloader.prefetch`
+        self.device_tensor: Optional[torch.Tensor] = None
+
+
+class ActivationOffloader:
+    """
+    Offloads the activations that forward passes save for backward (i.e. the
+    tensors saved by autograd) to host memory, pinned on CUDA, and brings
+    them back to the device for backward.
+
+    On CUDA, copies run on a side stream: offloading overlaps with the rest of
+    the forward, and a prefetch issued ahead of a backward overlaps with the
+    compute before it.
+
+    Activations are grouped by a key, e.g. a microbatch ID:
+
+        with offloader.offload(microbatch_id, exclude=mod.parameters()):
+            out = mod(*args)
+        ...
+        offloader.prefetch(microbatch_id)
+        torch.autograd.backward(out, grad)
+        offloader.release(microbatch_id)
+
+    Args:
+        device: device of the activations
+        budget_bytes: bytes of activations of the unreleased keys kept on the
+            device; activations saved beyond that are offloaded. 0 offloads
+            everything
+    """
+
+    def __init__(self, device: torch.device, budget_bytes: int = 0):
+        self.device = device
+        self.budget_bytes = budget_bytes
+        use_cuda = device.type == "cuda"
+        self._pin_memory = use_cuda
+        self._stream = torch.cuda.Stream(device) if use_cuda else None
+        # Bytes of saved activations kept on the device, by key
+        self._device_bytes: Dict[Any, int] = {}
+        # Offloaded activations not released yet, by key
+        self._offloaded: Dict[Any, List[_OffloadedTensor]] = {}
+        self.offloaded_bytes = 0
+
+    def offload(self, key, exclude: Iterable[torch.Tensor] = ()):
+        """
+        Context manager under which activations saved by autograd are
+        recorded under `key`, and offloaded once over the budget. Tensors
+        sharing storage with `exclude` (e.g. the parameters, which autograd
+        saves as well but stay on the device anyway) are never offloaded.
+        """
+        excluded_ptrs = {t.untyped_storage().data_ptr() for t in exclude}
+
+        def pack(tensor: torch.Tensor):
+            nbytes = tensor.numel() * tensor.element_size()
+            if (
+                tensor.device.type != self.device.type
+                or tensor.untyped_storage().data_ptr() in excluded_ptrs
+            ):
+                return tensor
+            device_bytes = sum(self._device_bytes.values())
+            if device_bytes + nbytes <= self.budget_bytes:
+                self._device_bytes[key] = (
+                    self._device_bytes.get(key, 0) + nbytes
+                )
+                return tensor
+            offloaded = self._copy_to_host(tensor)
+            self._offloaded.setdefault(key, []).append(offloaded)
+            self.offloaded_bytes += nbytes
+            return offloaded
+
+        return torch.autograd.graph.saved_tensors_hooks(pack, self._unpack)
+
+    def _copy_to_host(self, tensor: torch.Tensor) -> _OffloadedTensor:
+        host_tensor = torch.empty(
+            tensor.size(),
+            dtype=tensor.dtype,
+            layout=tensor.layout,
+            pin_memory=self._pin_memory,
+        )
+        if self._stream is None:
+            host_tensor.copy_(tensor)
+        else:
+            self._stream.wait_stream(torch.cuda.current_stream(self.device))
+            with torch.cuda.stream(self._stream):
+                host_tensor.copy_(tensor, non_blocking=True)
+            # Keep the device memory alive until the copy is done
+            tensor.record_stream(self._stream)
+        return _OffloadedTensor(host_tensor, tensor.device)
+
+    def _copy_to_device(self, offloaded: _OffloadedTensor):
+        if offloaded.device_tensor is not None:
+            return
+        if self._stream is None:
+            offloaded.device_tensor = offloaded.host_tensor.to(
+                offloaded.device
+            )
+        else:
+            # Queued after the copy to host on the same stream
+            with torch.cuda.stream(self._stream):
+                offloaded.device_tensor = offloaded.host_tensor.to(
+                    offloaded.device, non_blocking=True
+                )
+
+    def _unpack(self, packed):
+        if isinstance(packed, torch.Tensor):
+            return packed
+        self._copy_to_device(packed)
+        device_tensor = packed.device_tensor
+        if self._stream is not None:
+            current_stream = torch.cuda.current_stream(self.device)
+            current_stream.wait_stream(self._stream)
+            device_tensor.record_stream(current_stream)
+        return device_tensor
+
+    def prefetch(self, key):
+        """
+        Start copying the offloaded activations of `key` back to the device
+        """
+        for offloaded in self._offloaded.get(key, []):
+            self._copy_to_device(offloaded)
+
+    def release(self, key):
+        """
+        Forget `key`, whose backward has run. Its activations kept on the
+        device no longer count towards the budget
+        """
+        self._device_bytes.pop(key, None)
+        for offloaded in self._offloaded.pop(key, []):
+            self.offloaded_bytes -= (
+                offloaded.host_tensor.numel()
+                * offloaded.host_tensor.element_size()
+            )
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "device_bytes": sum(self._device_bytes.values()),
+            "offloaded_bytes": self.offloaded_bytes,
+        }
+
+
+def _get_binary_filename(cur_idx: int, is_optim: bool = False, use_safetensors: bool = False) -> str:  # type: ignore[valid-type]
     """
     Gets filename for pytorch checkpoint binary based on current index and world size.
 
@@ -321,6 +653,8 @@ def _get_binary_filename(cur_idx: int, is_optim: bool = False) -> str:  # type:
         cur_idx (int): current device index
         is_optim (bool): True if generating binary filename for optimizer,
                          False otherwise
+        use_safetensors (bool): True if generating the filename of a
+                         safetensors model binary, False otherwise
 
     Returns:
         str: checkpoint filename
@@ -328,6 +662,9 @@ def _get_binary_filename(cur_idx: int, is_optim: bool = False) -> str:  # type:
     idx = str(cur_idx + 1).zfill(5)
     world_size = str(dist.get_world_size()).zfill(5)
 
+    if use_safetensors and not is_optim:
+        return f"model-{idx}-of-{world_size}.safetensors"
+
     state_type = "optim" if is_optim else "model"
 
     return f"pytorch_{state_type}-{idx}-of-{world_size}.bin"
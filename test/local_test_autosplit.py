@@ -158,6 +158,23 @@ def test_split_into_equal_size(_, args):
     run_pipe_driver(ec_pipe, args)
 
 
+def test_split_into_equal_cost(_, args):
+    ec = ExampleCode()
+    ec.to(args.device)
+    ec_input = torch.randn(bs, d_hid, device=args.device)
+
+    # Auto-split based on given number of stages and estimated compute cost
+    nstages = 5
+    split_policy = pippy.ModelSplit.split_into_equal_cost(nstages, [ec_input])
+    ec_pipe = Pipe.from_tracing(
+        ec, MULTI_USE_PARAM_CONFIG, split_policy=split_policy
+    )
+
+    inspect_split_module(ec_pipe, expected_stages=nstages)
+
+    run_pipe_driver(ec_pipe, args)
+
+
 def main(args=None):
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -201,6 +218,7 @@ def main(args=None):
 
     run_pippy(test_split_on_size_threshold, args)
     run_pippy(test_split_into_equal_size, args)
+    run_pippy(test_split_into_equal_cost, args)
 
 
 if __name__ == "__main__":
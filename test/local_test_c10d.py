@@ -56,6 +56,8 @@ def run_worker(args):
         args.device,
         None,
         [ec_x, ec_y],
+        coalesce_p2p=bool(args.coalesce_p2p),
+        overlap_p2p=bool(args.overlap_p2p),
     )
 
     # Run
@@ -98,6 +100,16 @@ def main(args=None):
         type=int,
         default=4,
     )
+    parser.add_argument(
+        "--coalesce_p2p",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--overlap_p2p",
+        type=int,
+        default=0,
+    )
     args = parser.parse_args(args)
 
     if args.cuda:
@@ -13,6 +13,7 @@ from pippy.IR import pipe_split
 schedules = [
     "FillDrain",
     "1F1B",
+    "ZeroBubble",
 ]
 
 d_hid = 512
@@ -54,6 +55,14 @@ def run_worker(args):
 
     ec_x = torch.randn(args.chunks * chunk_size, d_hid, device=args.device)
     target = torch.randn(args.chunks * chunk_size, d_hid, device=args.device)
+    batches = [(ec_x, target)] * 2
+    if args.dynamic_shapes:
+        # Batch size changes between steps, and chunks of a step are uneven
+        batch_size = args.chunks * chunk_size // 2 + 1
+        batches[1] = (
+            torch.randn(batch_size, d_hid, device=args.device),
+            torch.randn(batch_size, d_hid, device=args.device),
+        )
 
     stage = compile_stage(
         ec,
@@ -64,15 +73,29 @@ def run_worker(args):
         None,
         [ec_x, target],
         schedule=args.schedule,
+        coalesce_p2p=bool(args.coalesce_p2p),
+        overlap_p2p=bool(args.overlap_p2p),
+        activation_offload_budget=args.activation_offload_budget,
+        dynamic_shapes=bool(args.dynamic_shapes),
     )
 
-    # Run
-    if args.rank == 0:
-        out = stage(ec_x)
-    elif args.rank == args.world_size - 1:
-        out = stage(target)
-    else:
-        stage()
+    # Run twice: recv buffers allocated in the first step are reused by the
+    # second one
+    for step, (ec_x, target) in enumerate(batches):
+        if step == 1:
+            misses = stage.recv_buffer_pool.misses
+        if args.rank == 0:
+            out = stage(ec_x)
+        elif args.rank == args.world_size - 1:
+            out = stage(target)
+        else:
+            stage()
+
+    if not args.dynamic_shapes:
+        assert stage.recv_buffer_pool.misses == misses, (
+            f"Rank {args.rank} allocated recv buffers in steady state: "
+            f"{stage.recv_buffer_pool.stats()}"
+        )
 
     dist.barrier()
     print(f"Rank {args.rank} completes")
@@ -106,6 +129,26 @@ def main(args=None):
         type=int,
         default=4,
     )
+    parser.add_argument(
+        "--coalesce_p2p",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--overlap_p2p",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--activation_offload_budget",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--dynamic_shapes",
+        type=int,
+        default=0,
+    )
     parser.add_argument(
         "--schedule",
         type=str,
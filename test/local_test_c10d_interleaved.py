@@ -0,0 +1,151 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates
+import argparse
+import os
+import unittest
+
+import torch
+import torch.distributed as dist
+
+from pippy.compile import compile_stage
+from pippy.IR import pipe_split
+
+
+d_hid = 512
+chunk_size = 64
+n_layers = 8
+
+torch.manual_seed(0)
+
+
+class ExampleCode(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        for i in range(n_layers):
+            self.add_module(f"lin{i}", torch.nn.Linear(d_hid, d_hid))
+        self.mse_loss = torch.nn.MSELoss(reduction="sum")
+
+    def forward(self, x, target):
+        for i in range(n_layers):
+            if i > 0:
+                pipe_split()
+            x = torch.relu(getattr(self, f"lin{i}")(x))
+        loss = self.mse_loss(x, target)
+        return {"logits": x, "loss": loss}
+
+
+def run_worker(args):
+    ec = ExampleCode()
+    ec.to(args.device)
+    ec.train()
+
+    ec_x = torch.randn(args.chunks * chunk_size, d_hid, device=args.device)
+    target = torch.randn(args.chunks * chunk_size, d_hid, device=args.device)
+
+    runtime = compile_stage(
+        ec,
+        args.rank,
+        args.world_size,
+        args.chunks,
+        args.device,
+        None,
+        [ec_x, target],
+        schedule="Interleaved1F1B",
+        coalesce_p2p=bool(args.coalesce_p2p),
+        overlap_p2p=bool(args.overlap_p2p),
+    )
+    # Each rank hosts `n_layers / world_size` stages
+    assert len(runtime.stages) == n_layers // args.world_size
+
+    # Run
+    if args.rank == 0:
+        out = runtime(ec_x)
+    elif args.rank == args.world_size - 1:
+        out = runtime(target)
+    else:
+        runtime()
+
+    dist.barrier()
+    print(f"Rank {args.rank} completes")
+
+    ref_out = ec(ec_x, target)
+    ref_out["loss"].backward()
+
+    # Every rank checks the grads of the stages it hosts
+    for stage in runtime.stages:
+        for name, param in stage.submod.named_parameters():
+            torch.testing.assert_close(
+                param.grad, ec.get_parameter(name).grad, rtol=1e-3, atol=1e-3
+            )
+    print(f"Rank {args.rank} gradient equivalence test passed")
+
+    # Last rank checks result
+    if args.rank == args.world_size - 1:
+        torch.testing.assert_close(out, ref_out)
+        print(
+            f"equivalence test passed, loss = {out['loss']}, ref loss = {ref_out['loss']}"
+        )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--world_size", type=int, default=int(os.getenv("WORLD_SIZE", 4))
+    )
+    parser.add_argument("--rank", type=int, default=int(os.getenv("RANK", -1)))
+    parser.add_argument(
+        "--master_addr", type=str, default=os.getenv("MASTER_ADDR", "localhost")
+    )
+    parser.add_argument(
+        "--master_port", type=str, default=os.getenv("MASTER_PORT", "29500")
+    )
+    parser.add_argument(
+        "--cuda", type=int, default=int(torch.cuda.is_available())
+    )
+    parser.add_argument(
+        "--chunks",
+        type=int,
+        default=8,
+    )
+    parser.add_argument(
+        "--coalesce_p2p",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--overlap_p2p",
+        type=int,
+        default=0,
+    )
+    args = parser.parse_args(args)
+
+    if args.cuda:
+        dev_id = args.rank % torch.cuda.device_count()
+        args.device = torch.device(f"cuda:{dev_id}")
+    else:
+        args.device = torch.device("cpu")
+
+    # Init process group
+    backend = "nccl" if args.cuda else "gloo"
+    dist.init_process_group(
+        backend=backend,
+        rank=args.rank,
+        world_size=args.world_size,
+    )
+
+    run_worker(args)
+
+
+if __name__ == "__main__":
+    main()
+
+
+class LocalTestC10DInterleavedTest(unittest.TestCase):
+    def test_c10d_interleaved(self):
+        import random
+
+        port = random.randint(29500, 30000)
+        args = [
+            "--master_port",
+            str(port),
+        ]
+        main(args)
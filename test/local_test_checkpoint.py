@@ -15,7 +15,11 @@ from pippy.compile import compile_stage
 from pippy.IR import pipe_split, TrivialLossWrapper
 from pippy.LoadModule import load_checkpoint
 
-from pippy.SaveModule import save_checkpoint
+from pippy.SaveModule import (
+    HAS_SAFETENSORS,
+    SAFETENSORS_INDEX_JSON_FILENAME,
+    save_checkpoint,
+)
 
 
 DEFAULT_FILENAME = "pytorch_model.bin.index.json"
@@ -149,6 +153,61 @@ def run_worker(args: List[str | int]) -> None:
         torch.testing.assert_close(mod.state_dict(), ref_state_dict)
         torch.testing.assert_close(optimizer.state_dict(), ref_optim_state_dict)
 
+        # without memory-mapping the checkpoint binaries
+        mod = load_checkpoint(
+            stage.submod,
+            os.path.join(CKPT_DIR, DEFAULT_FILENAME),
+            device=args.device,
+            mmap=False,
+        )
+        torch.testing.assert_close(mod.state_dict(), ref_state_dict)
+
+    # safetensors round trip
+    if HAS_SAFETENSORS:
+        ref_state_dict = deepcopy(stage.submod.state_dict())
+        save_checkpoint(stage, CKPT_DIR, use_safetensors=True)
+        dist.barrier()
+
+        index_filename = os.path.join(CKPT_DIR, SAFETENSORS_INDEX_JSON_FILENAME)
+        with open(index_filename) as f:
+            data = json.loads(f.read())
+        assert len(data["weight_map"]) == 7
+        assert all(
+            file.endswith(".safetensors")
+            for file in data["weight_map"].values()
+        )
+
+        # perturb the weights to check that they are loaded back
+        with torch.no_grad():
+            for param in stage.submod.parameters():
+                param.zero_()
+        mod = load_checkpoint(stage.submod, index_filename, device=args.device)
+        torch.testing.assert_close(mod.state_dict(), ref_state_dict)
+
+    # async save: the checkpoint is a snapshot of the state at save time
+    ref_state_dict = deepcopy(stage.submod.state_dict())
+    ref_optim_state_dict = deepcopy(optimizer.state_dict())
+    handle = save_checkpoint(stage, CKPT_DIR, optimizer, async_save=True)
+    optimizer.zero_grad()
+    if args.rank == 0:
+        stage(ec_x)
+    elif args.rank == args.world_size - 1:
+        stage(target)
+    else:
+        stage()
+    optimizer.step()
+    handle.result()
+    dist.barrier()
+
+    mod, optimizer = load_checkpoint(
+        stage.submod,
+        os.path.join(CKPT_DIR, DEFAULT_FILENAME),
+        optim=optimizer,
+        device=args.device,
+    )
+    torch.testing.assert_close(mod.state_dict(), ref_state_dict)
+    torch.testing.assert_close(optimizer.state_dict(), ref_optim_state_dict)
+
     dist.barrier()
     print(f"Rank {args.rank} completes")
 
@@ -80,6 +80,7 @@ def run_master(_, args):
         _debug_mask_minibatches=True,
         _record_mem_dumps=bool(args.record_mem_dumps),
         checkpoint=bool(args.checkpoint),
+        fused_dispatch=bool(args.fused_dispatch),
     )
 
     # # Warm up and correctness runs
@@ -143,6 +144,8 @@ def main(args=None):
         "--record_mem_dumps", type=int, default=0, choices=[0, 1]
     )
     parser.add_argument("--checkpoint", type=int, default=0, choices=[0, 1])
+    # Send all the work of a stage in a step with one RPC
+    parser.add_argument("--fused_dispatch", type=int, default=0, choices=[0, 1])
     args = parser.parse_args(args)
 
     # Interleaved 1F1B uses less ranks than number of stages
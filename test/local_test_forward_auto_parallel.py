@@ -69,7 +69,10 @@ def run_master(_, args):
     ec(ec_input)
 
     auto_parallel_ctx = AutoParallelConfig(
-        n_compute_nodes=args.world_size, n_devices_per_node=1, n_microbatches=5
+        n_compute_nodes=args.world_size,
+        n_devices_per_node=1,
+        n_microbatches=5,
+        example_inputs=[ec_input[: bs // 5]],
     )
     ec_pipe = Pipe.from_tracing(
         ec,
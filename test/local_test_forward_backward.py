@@ -17,10 +17,12 @@ from pippy.IR import (
 )
 from pippy.microbatch import split_args_kwargs_into_chunks
 from pippy.PipelineDriver import (
+    CheckpointPolicy,
     PipelineDriver1F1B,
     PipelineDriverBase,
     PipelineDriverFillDrain,
     PipelineDriverInterleaved1F1B,
+    PipelineDriverZeroBubble,
 )
 
 # TODOs for implementing forward/backward/loss with schedules:
@@ -35,6 +37,7 @@ schedules = {
     "FillDrain": PipelineDriverFillDrain,
     "1F1B": PipelineDriver1F1B,
     "Interleaved1F1B": PipelineDriverInterleaved1F1B,
+    "ZeroBubble": PipelineDriverZeroBubble,
 }
 
 
@@ -145,13 +148,20 @@ def run_master(_, args):
     ec_pipe = Pipe.from_tracing(wrapper, MULTI_USE_PARAM_CONFIG)
     print(ec_pipe.split_gm)
 
+    checkpoint = (
+        CheckpointPolicy(max_stashed_microbatches=args.max_stashed_microbatches)
+        if args.max_stashed_microbatches is not None
+        else bool(args.checkpoint)
+    )
     pipe_driver: PipelineDriverBase = schedules[args.schedule](
         ec_pipe,
         CHUNKS,
         args.world_size,
         _debug_mask_minibatches=DEBUG_MASK_MINIBATCHES,
         _record_mem_dumps=bool(args.record_mem_dumps),
-        checkpoint=bool(args.checkpoint),
+        checkpoint=checkpoint,
+        activation_offload_budget=args.activation_offload_budget,
+        fused_dispatch=bool(args.fused_dispatch),
     )
 
     target = torch.randn(bs, d_hid, device=args.device)
@@ -321,6 +331,12 @@ def main(args=None):
         "--record_mem_dumps", type=int, default=0, choices=[0, 1]
     )
     parser.add_argument("--checkpoint", type=int, default=0, choices=[0, 1])
+    # Send all the work of a stage in a step with one RPC
+    parser.add_argument("--fused_dispatch", type=int, default=0, choices=[0, 1])
+    # Checkpoint the microbatches beyond the first N in flight on a stage
+    parser.add_argument("--max_stashed_microbatches", type=int, default=None)
+    # Offload stashed activations beyond this many bytes per stage to host
+    parser.add_argument("--activation_offload_budget", type=int, default=None)
     args = parser.parse_args(args)
 
     # Interleaved 1F1B uses less ranks than number of stages
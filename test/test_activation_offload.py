@@ -0,0 +1,74 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates
+import unittest
+
+import torch
+
+from pippy.utils import ActivationOffloader
+
+
+class TestActivationOffloader(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.lin = torch.nn.Linear(8, 8)
+        self.inputs = [torch.randn(4, 8) for _ in range(3)]
+
+    def forward(self, x):
+        return torch.relu(self.lin(x)).sum()
+
+    def reference_grads(self):
+        grads = []
+        for x in self.inputs:
+            x = x.clone().requires_grad_(True)
+            self.forward(x).backward()
+            grads.append(x.grad)
+        self.lin.zero_grad()
+        return grads
+
+    def run_offloaded(self, offloader):
+        stashed = []
+        for key, x in enumerate(self.inputs):
+            x = x.clone().requires_grad_(True)
+            with offloader.offload(key, exclude=self.lin.parameters()):
+                stashed.append((x, self.forward(x)))
+        stats = offloader.stats()
+        for key, (x, out) in enumerate(stashed):
+            offloader.prefetch(key)
+            out.backward()
+            offloader.release(key)
+        return [x.grad for x, _ in stashed], stats
+
+    def test_offload_everything(self):
+        ref_grads = self.reference_grads()
+        offloader = ActivationOffloader(torch.device("cpu"))
+        grads, stats = self.run_offloaded(offloader)
+        for grad, ref in zip(grads, ref_grads):
+            torch.testing.assert_close(grad, ref)
+        # Each forward saves its input and the output of relu, [4, 8] fp32
+        # each; the parameters are not offloaded
+        self.assertEqual(
+            stats, {"device_bytes": 0, "offloaded_bytes": 3 * 2 * 4 * 8 * 4}
+        )
+        self.assertEqual(
+            offloader.stats(), {"device_bytes": 0, "offloaded_bytes": 0}
+        )
+
+    def test_budget(self):
+        ref_grads = self.reference_grads()
+        # Room for the activations of one forward
+        offloader = ActivationOffloader(
+            torch.device("cpu"), budget_bytes=2 * 4 * 8 * 4
+        )
+        grads, stats = self.run_offloaded(offloader)
+        for grad, ref in zip(grads, ref_grads):
+            torch.testing.assert_close(grad, ref)
+        self.assertEqual(
+            stats,
+            {
+                "device_bytes": 2 * 4 * 8 * 4,
+                "offloaded_bytes": 2 * 2 * 4 * 8 * 4,
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates
+import unittest
+
+import numpy as np
+import torch
+
+import pippy.fx
+from pippy.auto_parallelization import (
+    analyze_layer_costs,
+    AutoParallelConfig,
+    DeviceProfile,
+    dp_auto_parallel,
+    get_possible_submesh_shapes,
+    inter_op_dp,
+    inter_op_dp_inner_loop,
+    inter_op_dp_inner_loop_numpy,
+    SubmeshSpace,
+)
+from pippy.IR import Pipe
+
+
+d_hid = 256
+bs = 32
+n_layers = 8
+
+
+class ExampleCode(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.layers = torch.nn.ModuleList(
+            [torch.nn.Linear(d_hid, d_hid) for _ in range(n_layers)]
+        )
+
+    def forward(self, x):
+        for layer in self.layers:
+            x = torch.relu(layer(x))
+        return x
+
+
+def stage_modules(pipe):
+    return [
+        [n.target for n in submod.graph.nodes if n.op == "call_module"]
+        for submod in pipe.split_gm.children()
+    ]
+
+
+class TestAutoParallelization(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.mod = ExampleCode()
+        self.x = torch.randn(bs, d_hid)
+
+    def test_layer_costs(self):
+        gm = pippy.fx.symbolic_trace(self.mod)
+        (
+            flops,
+            mem_bytes,
+            param_bytes,
+            act_bytes,
+            cut_bytes,
+        ) = analyze_layer_costs(gm, [self.x])
+        nodes = [str(node) for node in gm.graph.nodes]
+        lin = nodes.index("layers_0")
+        relu = nodes.index("relu")
+        layer_param_bytes = (d_hid * d_hid + d_hid) * 4
+        act = bs * d_hid * 4
+        self.assertEqual(flops[lin], 2 * bs * d_hid * d_hid)
+        self.assertEqual(mem_bytes[lin], 2 * act + layer_param_bytes)
+        self.assertEqual(param_bytes[lin], layer_param_bytes)
+        self.assertEqual(param_bytes.sum(), n_layers * layer_param_bytes)
+        # Only the outputs of parameterized layers need reducing
+        self.assertEqual(act_bytes[lin], act)
+        self.assertEqual(act_bytes[relu], 0)
+        # Cutting anywhere but before the inputs sends one activation
+        self.assertEqual(cut_bytes[0], 0)
+        self.assertEqual(cut_bytes[lin], act)
+        self.assertEqual(cut_bytes[relu], act)
+        self.assertEqual(cut_bytes[relu + 1], act)
+
+        # Without example inputs, only parameters are accounted for
+        flops, mem_bytes, _, act_bytes, cut_bytes = analyze_layer_costs(gm)
+        self.assertEqual(flops.sum(), 0)
+        self.assertEqual(mem_bytes.sum(), n_layers * layer_param_bytes)
+        self.assertEqual(cut_bytes.sum(), 0)
+
+    def test_compute_bound(self):
+        # Slow devices and links: with enough microbatches, pipelining the
+        # layers evenly over the devices beats sharding them
+        config = AutoParallelConfig(
+            n_compute_nodes=4,
+            n_devices_per_node=1,
+            n_microbatches=64,
+            example_inputs=[self.x],
+            device_profile=DeviceProfile(
+                flops_per_sec=1e9, inter_node_bytes_per_sec=1e8
+            ),
+        )
+        pipe = Pipe.from_tracing(
+            self.mod, split_policy=dp_auto_parallel(config)
+        )
+        self.assertEqual(
+            [len(modules) for modules in stage_modules(pipe)], [2, 2, 2, 2]
+        )
+        torch.testing.assert_close(pipe(self.x), self.mod(self.x))
+
+    def test_memory_bound(self):
+        # A device only fits the parameters of three layers
+        layer_param_bytes = (d_hid * d_hid + d_hid) * 4
+        config = AutoParallelConfig(
+            n_compute_nodes=4,
+            n_devices_per_node=1,
+            n_microbatches=8,
+            example_inputs=[self.x],
+            device_profile=DeviceProfile(memory_bytes=3.5 * layer_param_bytes),
+        )
+        pipe = Pipe.from_tracing(
+            self.mod, split_policy=dp_auto_parallel(config)
+        )
+        for modules in stage_modules(pipe):
+            self.assertLessEqual(len(modules), 3)
+        torch.testing.assert_close(pipe(self.x), self.mod(self.x))
+
+    def test_inner_loop_numpy(self):
+        inner_loop = getattr(
+            inter_op_dp_inner_loop, "py_func", inter_op_dp_inner_loop
+        )
+        submesh_shapes = get_possible_submesh_shapes(2, 2, SubmeshSpace.ALL)
+        submesh_sizes = [n * m for n, m in submesh_shapes]
+        rng = np.random.RandomState(0)
+        n_layers, n_devices = 10, 4
+        intra_costs = rng.rand(n_layers, n_layers, len(submesh_shapes), 1)
+        max_n_succ_stages = rng.randint(0, n_layers, size=intra_costs.shape)
+
+        valid_cost_idxs = np.transpose((intra_costs <= 0.7).nonzero())
+        valid_cost_idxs = valid_cost_idxs[
+            valid_cost_idxs[:, 0] <= valid_cost_idxs[:, 1]
+        ]
+        valid_costs = intra_costs[tuple(valid_cost_idxs.T)]
+        valid_idxs_costs = np.hstack(
+            [valid_cost_idxs, valid_costs[:, np.newaxis]]
+        )
+        for expected, actual in zip(
+            inner_loop(
+                n_layers,
+                n_devices,
+                submesh_sizes,
+                valid_idxs_costs,
+                max_n_succ_stages,
+            ),
+            inter_op_dp_inner_loop_numpy(
+                n_layers,
+                n_devices,
+                submesh_sizes,
+                valid_idxs_costs,
+                max_n_succ_stages,
+            ),
+        ):
+            np.testing.assert_array_equal(actual, expected)
+
+        self.assertEqual(
+            inter_op_dp(
+                n_layers,
+                n_devices,
+                8,
+                submesh_shapes,
+                intra_costs,
+                max_n_succ_stages,
+                inner_loop=inner_loop,
+            ),
+            inter_op_dp(
+                n_layers,
+                n_devices,
+                8,
+                submesh_shapes,
+                intra_costs,
+                max_n_succ_stages,
+                inner_loop=inter_op_dp_inner_loop_numpy,
+            ),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
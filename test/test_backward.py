@@ -0,0 +1,114 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates
+import unittest
+
+import torch
+
+from pippy.backward import stage_backward, stage_backward_input
+
+
+class TestSplitBackward(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.lin = torch.nn.Linear(8, 8)
+        self.unused = torch.nn.Linear(8, 8)
+        self.x = torch.randn(4, 8)
+        self.output_grad = torch.randn(4, 8)
+
+    def run_stage(self, backward_fn):
+        self.lin.zero_grad()
+        x = self.x.clone().requires_grad_(True)
+        # `y` does not require grad, e.g. a user input to the first stage
+        y = torch.randn(4, 8)
+        out = torch.relu(self.lin(x)) * self.lin(y)
+        return backward_fn(
+            stage_output=(out,),
+            output_grads=(self.output_grad,),
+            input_values=[x, y, 3],
+            stage_info="test",
+            outputs_with_grads_idxs=[0],
+        )
+
+    def test_matches_stage_backward(self):
+        torch.manual_seed(1)
+        ref_grads, _ = self.run_stage(stage_backward)
+        ref_param_grads = [p.grad.clone() for p in self.lin.parameters()]
+
+        torch.manual_seed(1)
+        grads, weight_grad_fn = self.run_stage(stage_backward_input)
+        # Input grads only, weights are untouched until the weight pass
+        self.assertTrue(all(p.grad is None for p in self.lin.parameters()))
+        torch.testing.assert_close(grads[0], ref_grads[0])
+        self.assertEqual(grads[1:], [None, None])
+
+        weight_grad_fn(
+            list(self.lin.parameters()) + list(self.unused.parameters())
+        )
+        for p, ref in zip(self.lin.parameters(), ref_param_grads):
+            torch.testing.assert_close(p.grad, ref)
+        self.assertTrue(all(p.grad is None for p in self.unused.parameters()))
+
+    def test_no_input_requires_grad(self):
+        lin = self.lin
+        out = lin(self.x)
+        grads, weight_grad_fn = stage_backward_input(
+            stage_output=(out,),
+            output_grads=(self.output_grad,),
+            input_values=[self.x],
+            stage_info="test",
+            outputs_with_grads_idxs=[0],
+        )
+        self.assertEqual(grads, [None])
+        weight_grad_fn(lin.parameters())
+        torch.testing.assert_close(
+            lin.weight.grad, self.output_grad.t() @ self.x
+        )
+
+    def test_weight_pass_runs_weight_grads_only(self):
+        backward_calls = []
+
+        class Identity(torch.autograd.Function):
+            @staticmethod
+            def forward(ctx, x):
+                return x.clone()
+
+            @staticmethod
+            def backward(ctx, grad):
+                backward_calls.append(grad)
+                return grad
+
+        lin1, lin2, lin3 = (torch.nn.Linear(8, 8) for _ in range(3))
+        params = [p for lin in (lin1, lin2, lin3) for p in lin.parameters()]
+
+        def run_stage(backward_fn):
+            for p in params:
+                p.grad = None
+            x = self.x.clone().requires_grad_(True)
+            # The second output does not depend on the stage input
+            outs = (
+                lin2(Identity.apply(torch.relu(lin1(x)))),
+                lin3(torch.ones(4, 8)),
+            )
+            return backward_fn(
+                stage_output=outs,
+                output_grads=(self.output_grad, self.output_grad),
+                input_values=[x],
+                stage_info="test",
+                outputs_with_grads_idxs=[0, 1],
+            )
+
+        ref_grads, _ = run_stage(stage_backward)
+        ref_param_grads = [p.grad.clone() for p in params]
+
+        backward_calls.clear()
+        grads, weight_grad_fn = run_stage(stage_backward_input)
+        torch.testing.assert_close(grads[0], ref_grads[0])
+        self.assertEqual(len(backward_calls), 1)
+        weight_grad_fn(params)
+        # Gradients of the non-parameter ops are not computed again
+        self.assertEqual(len(backward_calls), 1)
+        for p, ref in zip(params, ref_param_grads):
+            torch.testing.assert_close(p.grad, ref)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,7 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates
 import copy
+import io
+import os
 import pickle
 import tempfile
 import unittest
@@ -19,11 +21,15 @@ from pippy.IR import (
     TrivialLossWrapper,
 )
 from pippy.microbatch import (
+    ChunkMerger,
+    LossReducer,
     merge_chunks,
     Replicate,
     split_args_kwargs_into_chunks,
     TensorChunkSpec,
+    TokenBalancedChunkSpec,
 )
+from pippy.ModelSplit import split_into_equal_size
 
 
 @pippy.fx.wrap
@@ -814,6 +820,134 @@ class TestIR(unittest.TestCase):
             chunks_merged_masked["multiplied"], ref_out["multiplied"]
         )
 
+    def test_split_args_kwargs_chunk_plan(self):
+        x = torch.randn(7, 3)
+        mask = torch.randn(2, 7)
+        kwargs = {
+            "inputs": {"ids": torch.randn(7, 5), "scale": 2.0},
+            "mask": mask,
+        }
+        kwargs_chunk_spec = {
+            "inputs": {"ids": TensorChunkSpec(0), "scale": Replicate},
+            "mask": TensorChunkSpec(1),
+        }
+
+        for _ in range(2):
+            # Second iteration runs with the cached chunk plan
+            args_split, kwargs_split = split_args_kwargs_into_chunks(
+                (x,),
+                kwargs,
+                chunks=3,
+                kwargs_chunk_spec=kwargs_chunk_spec,
+            )
+            ref_x = torch.tensor_split(x, 3)
+            ref_ids = torch.tensor_split(kwargs["inputs"]["ids"], 3)
+            ref_mask = torch.tensor_split(mask, 3, 1)
+            assert len(args_split) == len(kwargs_split) == 3
+            for i in range(3):
+                torch.testing.assert_close(args_split[i][0], ref_x[i])
+                torch.testing.assert_close(
+                    kwargs_split[i]["inputs"]["ids"], ref_ids[i]
+                )
+                torch.testing.assert_close(kwargs_split[i]["mask"], ref_mask[i])
+                assert kwargs_split[i]["inputs"]["scale"] == 2.0
+                # Chunks are views of the inputs
+                assert args_split[i][0]._base is x
+
+        # kwargs reduce the number of chunks, args follow
+        args_split, kwargs_split = split_args_kwargs_into_chunks(
+            (3.0,),
+            {"y": torch.randn(2, 4)},
+            chunks=4,
+        )
+        assert len(args_split) == len(kwargs_split) == 2
+
+    def test_token_balanced_chunking(self):
+        # Equal row splits would carry [24, 4, 4] tokens
+        lengths = [9, 8, 7, 1, 1, 2, 1, 3]
+        attention_mask = torch.zeros(len(lengths), max(lengths))
+        for row, length in enumerate(lengths):
+            attention_mask[row, :length] = 1
+        input_ids = torch.arange(len(lengths)).unsqueeze(1).expand(-1, 9)
+
+        balanced = TokenBalancedChunkSpec(0, "attention_mask")
+        args_split, kwargs_split = split_args_kwargs_into_chunks(
+            (input_ids,),
+            {"attention_mask": attention_mask},
+            chunks=3,
+            args_chunk_spec=(balanced,),
+            kwargs_chunk_spec={"attention_mask": balanced},
+        )
+
+        assert len(args_split) == len(kwargs_split) == 3
+        chunk_tokens = [
+            int(kwargs["attention_mask"].sum()) for kwargs in kwargs_split
+        ]
+        assert max(chunk_tokens) - min(chunk_tokens) <= 1, chunk_tokens
+        for args, kwargs in zip(args_split, kwargs_split):
+            rows = args[0][:, 0]
+            # Rows keep their relative order and stay aligned across inputs
+            assert rows.tolist() == sorted(rows.tolist())
+            torch.testing.assert_close(
+                kwargs["attention_mask"], attention_mask[rows]
+            )
+
+        # Outputs are merged back in the original row order
+        outputs = [
+            {"out": args[0] * 2, "n": kwargs["attention_mask"].sum()}
+            for args, kwargs in zip(args_split, kwargs_split)
+        ]
+        merged = merge_chunks(
+            outputs,
+            {"out": balanced, "n": LossReducer(0.0, lambda a, b: a + b)},
+        )
+        torch.testing.assert_close(merged["out"], input_ids * 2)
+        assert merged["n"] == sum(lengths)
+
+        merger = ChunkMerger({"out": balanced, "n": None}, len(outputs))
+        for output in outputs:
+            merger.add({"out": output["out"], "n": None})
+        torch.testing.assert_close(merger.result()["out"], input_ids * 2)
+
+        with self.assertRaises(RuntimeError):
+            merge_chunks(
+                outputs, {"out": TokenBalancedChunkSpec(0, 0), "n": None}
+            )
+
+    def test_chunk_merger(self):
+        x = torch.randn(10, 3)
+        chunks = [
+            {"out": c, "loss": c.sum(), "n": 5}
+            for c in torch.tensor_split(x, 4)
+        ]
+        chunk_spec = {
+            "out": TensorChunkSpec(0),
+            "loss": LossReducer(0.0, lambda a, b: a + b),
+            "n": None,
+        }
+        merger = ChunkMerger(chunk_spec, len(chunks))
+        for chunk in chunks:
+            merger.add(chunk)
+        merged = merger.result()
+        ref = merge_chunks(chunks, chunk_spec)
+        torch.testing.assert_close(merged["out"], ref["out"])
+        torch.testing.assert_close(merged["loss"], ref["loss"])
+        assert merged["n"] == 5
+
+        # Chunks bigger than the first one, default chunk spec
+        parts = [x[:1], x[1:4], x[4:]]
+        merger = ChunkMerger(None, len(parts))
+        for part in parts:
+            merger.add(part)
+        torch.testing.assert_close(merger.result(), x)
+
+        with self.assertRaises(RuntimeError):
+            ChunkMerger(None, 2).result()
+        with self.assertRaises(ValueError):
+            merger = ChunkMerger(None, 2)
+            merger.add(x)
+            merger.add(x.t())
+
     def test_remap_qualname_transmit(self):
         ec_pipe = Pipe.from_tracing(self.ec, MultiUseParameterConfig.TRANSMIT)
 
@@ -860,6 +994,124 @@ class TestIR(unittest.TestCase):
                     old_name in old_names
                 ), f"Remapped parameter {old_name} not found in {old_names}"
 
+    def test_pipe_cache(self):
+        x = torch.randn(5, 512)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for multi_use_param_spec in (
+                MultiUseParameterConfig.TRANSMIT,
+                MultiUseParameterConfig.REPLICATE,
+            ):
+                ec_pipe = Pipe.from_tracing(
+                    self.ec, multi_use_param_spec, cache_dir=cache_dir
+                )
+
+                # A new instance of the model loads the cached pipe instead
+                # of tracing it
+                ec = ExampleCode()
+                from_traced = Pipe._from_traced
+                try:
+                    Pipe._from_traced = None  # type: ignore[assignment]
+                    cached_pipe = Pipe.from_tracing(
+                        ec, multi_use_param_spec, cache_dir=cache_dir
+                    )
+                finally:
+                    Pipe._from_traced = from_traced  # type: ignore[assignment]
+                self.assertEqual(str(cached_pipe), str(ec_pipe))
+                self.assertEqual(
+                    cached_pipe.replicated_params, ec_pipe.replicated_params
+                )
+                torch.testing.assert_close(cached_pipe(x), ec(x))
+
+                # The cached pipe uses the parameters of the new model
+                for name, param in cached_pipe.named_parameters():
+                    if not any(
+                        name.startswith(f"split_gm.{submod}.")
+                        for use_mapping in cached_pipe.replicated_params
+                        for submod in use_mapping
+                    ):
+                        self.assertIs(
+                            param,
+                            ec.get_parameter(cached_pipe.remap_qualname(name)),
+                        )
+
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+            # A different split is cached separately
+            Pipe.from_tracing(
+                self.ec,
+                MultiUseParameterConfig.TRANSMIT,
+                cache_dir=cache_dir,
+                split_policy=split_into_equal_size(4),
+            )
+            self.assertEqual(len(os.listdir(cache_dir)), 3)
+
+    def test_pipe_cache_attributes(self):
+        # Plain attributes are baked into the graph by tracing, so pipes of
+        # modules only differing by them are cached separately
+        class ScaledCode(torch.nn.Module):
+            def __init__(self, scale):
+                super().__init__()
+                self.lin = torch.nn.Linear(512, 512)
+                self.scale = scale
+
+            def forward(self, x):
+                x = self.lin(x) * self.scale
+                pipe_split()
+                return torch.relu(x)
+
+        x = torch.randn(5, 512)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            Pipe.from_tracing(ScaledCode(1.0), cache_dir=cache_dir)
+            mod = ScaledCode(3.0)
+            pipe = Pipe.from_tracing(mod, cache_dir=cache_dir)
+            torch.testing.assert_close(pipe(x), mod(x))
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+    def test_pipe_cache_unpicklable(self):
+        # A pipe that cannot be pickled is still built, just not cached
+        self.ec.lin.act = lambda x: x
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with self.assertLogs(level="WARNING"):
+                pipe = Pipe.from_tracing(self.ec, cache_dir=cache_dir)
+            self.assertEqual(os.listdir(cache_dir), [])
+        x = torch.randn(5, 512)
+        torch.testing.assert_close(pipe(x), self.ec(x))
+
+    def test_load_stage_without_weights(self):
+        x = torch.randn(5, 512)
+        ec_pipe = Pipe.from_tracing(self.ec, MultiUseParameterConfig.TRANSMIT)
+        f = io.BytesIO()
+        ec_pipe._dump_without_weights(f)
+
+        ec = ExampleCode()
+        for stage_idx in range(ec_pipe.num_stages):
+            f.seek(0)
+            stage_pipe = Pipe._load_without_weights(f, ec, stage_idx=stage_idx)
+            self.assertEqual(str(stage_pipe), str(ec_pipe))
+
+            # Only the stage gets the parameters of the new model, the other
+            # stages are left on meta
+            stage = stage_pipe.split_gm.get_submodule(f"submod_{stage_idx}")
+            stage_params = {id(param) for param in stage.parameters()}
+            for name, param in stage_pipe.named_parameters():
+                if id(param) in stage_params:
+                    self.assertFalse(param.is_meta)
+                    if not any(
+                        f"submod_{stage_idx}" in use_mapping
+                        for use_mapping in stage_pipe.replicated_params
+                    ):
+                        self.assertIs(
+                            param,
+                            ec.get_parameter(stage_pipe.remap_qualname(name)),
+                        )
+                else:
+                    self.assertTrue(param.is_meta)
+
+        # With all stages loaded, the pipe runs the new model
+        f.seek(0)
+        full_pipe = Pipe._load_without_weights(f, ec)
+        torch.testing.assert_close(full_pipe(x), ec(x))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,206 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates
+import itertools
+import json
+import os
+import tempfile
+import unittest
+
+import torch
+
+from pippy.IR import Pipe
+from pippy.LoadModule import (
+    _get_read_ranges,
+    _read_safetensors_header,
+    load_checkpoint,
+)
+from pippy.ModelSplit import split_into_equal_size
+from pippy.SaveModule import _get_params_state_dict, HAS_SAFETENSORS
+
+if HAS_SAFETENSORS:
+    from safetensors.torch import save_file
+
+
+d_hid = 64
+n_layers = 5
+
+
+class ExampleCode(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        for i in range(n_layers):
+            setattr(self, f"lin{i}", torch.nn.Linear(d_hid, d_hid))
+        self.register_buffer("scale", torch.ones(d_hid))
+
+    def forward(self, x):
+        for i in range(n_layers):
+            x = torch.relu(getattr(self, f"lin{i}")(x))
+        return x * self.scale
+
+    def remap_qualname(self, qualname):
+        # Stands for the qualname mapping of a pipeline stage
+        return qualname
+
+
+def save_sharded(state_dict, checkpoint_dir, use_safetensors, legacy=False):
+    """
+    Saves `state_dict` with one binary per layer, and the buffer in the last
+    one. `legacy` pickles the binaries in the legacy, non-zip, format
+    """
+    extension = "safetensors" if use_safetensors else "bin"
+    shards = {}
+    weight_map = {}
+    for name, tensor in state_dict.items():
+        idx = int(name[3]) if name.startswith("lin") else n_layers - 1
+        file = f"model-{idx}.{extension}"
+        shards.setdefault(file, {})[name] = tensor
+        weight_map[name] = file
+    for file, shard in shards.items():
+        file_path = os.path.join(checkpoint_dir, file)
+        if use_safetensors:
+            save_file(shard, file_path)
+        else:
+            torch.save(
+                shard, file_path, _use_new_zipfile_serialization=not legacy
+            )
+    index_filename = os.path.join(checkpoint_dir, f"model.{extension}.json")
+    with open(index_filename, "w") as f:
+        json.dump({"weight_map": weight_map}, f)
+    return index_filename
+
+
+class TestLoadModule(unittest.TestCase):
+    def test_load_sharded_checkpoint(self):
+        torch.manual_seed(0)
+        ref = ExampleCode()
+        ref_state_dict = ref.state_dict()
+        x = torch.randn(8, d_hid)
+
+        formats = [False, True] if HAS_SAFETENSORS else [False]
+        for use_safetensors in formats:
+            with tempfile.TemporaryDirectory() as checkpoint_dir:
+                index_filename = save_sharded(
+                    ref_state_dict, checkpoint_dir, use_safetensors
+                )
+                # Sequential and read-ahead loads, the cap of a byte only
+                # allowing one binary in flight at once
+                configs = itertools.product([True, False], [1, 3], [None, 1])
+                for mmap, num_io_threads, max_inflight_bytes in configs:
+                    with self.subTest(
+                        use_safetensors=use_safetensors,
+                        mmap=mmap,
+                        num_io_threads=num_io_threads,
+                        max_inflight_bytes=max_inflight_bytes,
+                    ):
+                        with torch.device("meta"):
+                            mod = ExampleCode()
+                        mod = load_checkpoint(
+                            mod,
+                            index_filename,
+                            device=torch.device("cpu"),
+                            mmap=mmap,
+                            num_io_threads=num_io_threads,
+                            max_inflight_bytes=max_inflight_bytes,
+                        )
+                        torch.testing.assert_close(
+                            mod.state_dict(), ref_state_dict
+                        )
+                        torch.testing.assert_close(mod(x), ref(x))
+
+    def test_load_legacy_checkpoint(self):
+        # Legacy binaries cannot be memory-mapped, and are read in full
+        torch.manual_seed(0)
+        ref_state_dict = ExampleCode().state_dict()
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            index_filename = save_sharded(
+                ref_state_dict, checkpoint_dir, False, legacy=True
+            )
+            for mmap in (True, False):
+                with self.subTest(mmap=mmap):
+                    mod = load_checkpoint(
+                        ExampleCode(), index_filename, mmap=mmap
+                    )
+                    torch.testing.assert_close(mod.state_dict(), ref_state_dict)
+
+    @unittest.skipIf(not HAS_SAFETENSORS, "requires safetensors")
+    def test_read_ranges(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            file_path = os.path.join(checkpoint_dir, "model.safetensors")
+            save_file(ExampleCode().state_dict(), file_path)
+            with open(file_path, "rb") as f:
+                header, _ = _read_safetensors_header(f)
+
+            # Tensors adjacent in the binary are read at once
+            names = sorted(
+                header, key=lambda name: header[name]["data_offsets"]
+            )
+            ranges = _get_read_ranges(header, names[1:3] + names[4:5])
+            self.assertEqual(
+                ranges,
+                [
+                    (
+                        header[names[1]]["data_offsets"][0],
+                        header[names[2]]["data_offsets"][1],
+                        names[1:3],
+                    ),
+                    (*header[names[4]]["data_offsets"], names[4:5]),
+                ],
+            )
+
+    def test_reshard(self):
+        torch.manual_seed(0)
+        ref = ExampleCode()
+        x = torch.randn(8, d_hid)
+        saved_pipe = Pipe.from_tracing(
+            ref, split_policy=split_into_equal_size(4)
+        )
+
+        formats = [False, True] if HAS_SAFETENSORS else [False]
+        for use_safetensors in formats:
+            with tempfile.TemporaryDirectory() as checkpoint_dir:
+                # Save a binary per stage, as `save_checkpoint` does
+                extension = "safetensors" if use_safetensors else "bin"
+                weight_map = {}
+                for idx, submod in enumerate(saved_pipe.split_gm.children()):
+                    file = f"model-{idx}.{extension}"
+                    state_dict = _get_params_state_dict(submod)
+                    if use_safetensors:
+                        save_file(
+                            state_dict, os.path.join(checkpoint_dir, file)
+                        )
+                    else:
+                        torch.save(
+                            state_dict, os.path.join(checkpoint_dir, file)
+                        )
+                    weight_map.update({name: file for name in state_dict})
+                index_filename = os.path.join(checkpoint_dir, "index.json")
+                with open(index_filename, "w") as f:
+                    json.dump({"weight_map": weight_map}, f)
+
+                # Load it into stages split differently
+                for nstages in (1, 2, 3):
+                    with self.subTest(
+                        use_safetensors=use_safetensors, nstages=nstages
+                    ):
+                        mod = ExampleCode()
+                        pipe = Pipe.from_tracing(
+                            mod, split_policy=split_into_equal_size(nstages)
+                        )
+                        for submod in pipe.split_gm.children():
+                            load_checkpoint(submod, index_filename)
+                        torch.testing.assert_close(pipe(x), ref(x))
+
+    def test_missing_weight(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            state_dict = ExampleCode().state_dict()
+            index_filename = save_sharded(state_dict, checkpoint_dir, False)
+            # Drop a weight from its binary, but not from the index
+            file_path = os.path.join(checkpoint_dir, "model-0.bin")
+            shard = torch.load(file_path)
+            del shard["lin0.bias"]
+            torch.save(shard, file_path)
+            with self.assertRaises(AssertionError):
+                load_checkpoint(ExampleCode(), index_filename)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates
+import itertools
+import random
+import unittest
+
+import torch
+
+import pippy.fx
+from pippy.IR import Pipe
+from pippy.ModelSplit import (
+    _analyze_cut_bytes,
+    _analyze_node_flops_and_bytes,
+    _min_max_partition,
+    split_into_equal_cost,
+    split_into_equal_size,
+)
+
+
+d_hid = 64
+vocab = 4096
+bs = 8
+
+
+class EmbeddingMLP(torch.nn.Module):
+    """
+    A large, cheap embedding followed by linear layers of increasing width:
+    splitting on parameter size would give the embedding a stage of its own
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.emb = torch.nn.Embedding(vocab, d_hid)
+        self.lin0 = torch.nn.Linear(d_hid, d_hid)
+        self.lin1 = torch.nn.Linear(d_hid, 2 * d_hid)
+        self.lin2 = torch.nn.Linear(2 * d_hid, 4 * d_hid)
+        self.lin3 = torch.nn.Linear(4 * d_hid, d_hid)
+        self.mm_param = torch.nn.Parameter(torch.randn(d_hid, d_hid))
+
+    def forward(self, x):
+        x = self.emb(x)
+        x = torch.relu(self.lin0(x))
+        x = torch.relu(self.lin1(x))
+        x = torch.relu(self.lin2(x))
+        x = torch.relu(self.lin3(x))
+        return torch.mm(x, self.mm_param)
+
+
+class TestModelSplit(unittest.TestCase):
+    def test_flops_and_bytes(self):
+        mod = EmbeddingMLP()
+        gm = pippy.fx.symbolic_trace(mod)
+        x = torch.randint(vocab, (bs,))
+        costs = {
+            str(node): cost
+            for node, cost in _analyze_node_flops_and_bytes(gm, [x]).items()
+        }
+        self.assertEqual(costs["lin0"][0], 2 * bs * d_hid * d_hid)
+        self.assertEqual(costs["lin2"][0], 2 * bs * 2 * d_hid * 4 * d_hid)
+        self.assertEqual(costs["mm"][0], 2 * bs * d_hid * d_hid)
+        # Embedding: one FLOP per output element
+        self.assertEqual(costs["emb"][0], bs * d_hid)
+        # Embedding: reads the looked up rows only, not its whole table
+        self.assertEqual(costs["emb"][1], bs * 8 + 2 * bs * d_hid * 4)
+        # mm reads the parameter through a `get_attr` node
+        self.assertEqual(costs["mm"][1], (2 * bs * d_hid + d_hid * d_hid) * 4)
+
+    def test_split_into_equal_cost(self):
+        torch.manual_seed(0)
+        mod = EmbeddingMLP()
+        x = torch.randint(vocab, (bs,))
+        nstages = 2
+        pipe = Pipe.from_tracing(
+            mod,
+            split_policy=split_into_equal_cost(nstages, [x]),
+        )
+        self.assertEqual(len(list(pipe.split_gm.children())), nstages)
+        torch.testing.assert_close(pipe(x), mod(x))
+
+        # The embedding shares the first stage with the narrow layers
+        submod_names = [
+            [n.target for n in submod.graph.nodes if n.op == "call_module"]
+            for submod in pipe.split_gm.children()
+        ]
+        self.assertIn("emb", submod_names[0])
+        self.assertIn("lin0", submod_names[0])
+        self.assertIn("lin3", submod_names[1])
+
+    def test_split_into_equal_cost_profiled(self):
+        mod = EmbeddingMLP()
+        x = torch.randint(vocab, (bs,))
+        pipe = Pipe.from_tracing(
+            mod,
+            split_policy=split_into_equal_cost(3, [x], profile_iters=2),
+        )
+        self.assertEqual(len(list(pipe.split_gm.children())), 3)
+        torch.testing.assert_close(pipe(x), mod(x))
+
+    def test_cut_bytes(self):
+        mod = EmbeddingMLP()
+        gm = pippy.fx.symbolic_trace(mod)
+        x = torch.randint(vocab, (bs,))
+        _analyze_node_flops_and_bytes(gm, [x])
+        cut_bytes = {
+            str(node): nbytes for node, nbytes in _analyze_cut_bytes(gm).items()
+        }
+        # Nothing is defined before the first node but the input, which is
+        # only used by it
+        self.assertEqual(cut_bytes["emb"], 0)
+        self.assertEqual(cut_bytes["lin0"], bs * d_hid * 4)
+        self.assertEqual(cut_bytes["lin3"], bs * 4 * d_hid * 4)
+        self.assertEqual(cut_bytes["mm"], bs * d_hid * 4)
+
+    def test_min_max_partition(self):
+        rng = random.Random(0)
+        for n, nstages in [(1, 1), (5, 5), (8, 3), (10, 4)]:
+            node_costs = [rng.random() for _ in range(n)]
+            cut_costs = [rng.random() for _ in range(n + 1)]
+
+            def bottleneck(split_indices):
+                bounds = [0] + list(split_indices) + [n]
+                return max(
+                    sum(node_costs[start:end])
+                    + (cut_costs[start] if start > 0 else 0)
+                    + (cut_costs[end] if end < n else 0)
+                    for start, end in zip(bounds[:-1], bounds[1:])
+                )
+
+            best = min(
+                bottleneck(split_indices)
+                for split_indices in itertools.combinations(
+                    range(1, n), nstages - 1
+                )
+            )
+            split_indices = _min_max_partition(node_costs, cut_costs, nstages)
+            self.assertEqual(len(split_indices), nstages - 1)
+            self.assertAlmostEqual(bottleneck(split_indices), best)
+
+    def test_split_into_equal_size(self):
+        mod = EmbeddingMLP()
+        x = torch.randint(vocab, (bs,))
+        pipe = Pipe.from_tracing(mod, split_policy=split_into_equal_size(2))
+        self.assertEqual(len(list(pipe.split_gm.children())), 2)
+        torch.testing.assert_close(pipe(x), mod(x))
+        # The embedding table outweighs all the other layers
+        submod_names = [
+            [n.target for n in submod.graph.nodes if n.op == "call_module"]
+            for submod in pipe.split_gm.children()
+        ]
+        self.assertEqual(submod_names[0], ["emb"])
+
+    def test_too_many_stages(self):
+        mod = EmbeddingMLP()
+        x = torch.randint(vocab, (bs,))
+        with self.assertRaises(ValueError):
+            Pipe.from_tracing(mod, split_policy=split_into_equal_cost(100, [x]))
+
+
+if __name__ == "__main__":
+    unittest.main()
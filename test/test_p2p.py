@@ -0,0 +1,107 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates
+import unittest
+
+import torch
+
+from pippy.utils import pack_tensors, RecvBufferPool, unpack_tensors
+
+
+class TestRecvBufferPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = RecvBufferPool(torch.device("cpu"))
+
+    def test_reuse_by_shape_and_dtype(self):
+        buf = self.pool.acquire((2, 3), torch.float32)
+        self.pool.release(buf)
+        self.assertIs(self.pool.acquire((2, 3), torch.float32), buf)
+        self.assertIsNot(self.pool.acquire((2, 3), torch.float32), buf)
+        self.pool.acquire((2, 3), torch.float16)
+        self.assertEqual(self.pool.hits, 1)
+        self.assertEqual(self.pool.misses, 3)
+
+    def test_steady_state_has_no_misses(self):
+        in_flight = 4
+        for step in range(3):
+            if step == 1:
+                misses = self.pool.misses
+            bufs = [
+                self.pool.acquire((8,), torch.float32) for _ in range(in_flight)
+            ]
+            for buf in bufs:
+                self.pool.release(buf)
+        self.assertEqual(self.pool.misses, misses)
+        # Pool does not grow past the in-flight depth
+        self.assertEqual(self.pool.stats()["buffers"], in_flight)
+
+    def test_release_resets_autograd_state(self):
+        buf = self.pool.acquire((4,), torch.float32)
+        buf.requires_grad_(True)
+        buf.sum().backward()
+        self.pool.release(buf)
+        buf = self.pool.acquire((4,), torch.float32)
+        self.assertIsNone(buf.grad)
+        self.assertFalse(buf.requires_grad)
+
+    def test_aliased_buffers_are_not_reused(self):
+        aliased = self.pool.acquire((4,), torch.float32)
+        free = self.pool.acquire((4,), torch.float32)
+        self.pool.release_unaliased([aliased, free], (aliased.view(2, 2),))
+        self.assertEqual(self.pool.stats()["buffers"], 1)
+        self.assertIs(self.pool.acquire((4,), torch.float32), free)
+
+    def test_max_buffers_per_key(self):
+        pool = RecvBufferPool(torch.device("cpu"), max_buffers_per_key=1)
+        bufs = [pool.acquire((4,), torch.float32) for _ in range(3)]
+        for buf in bufs:
+            pool.release(buf)
+        self.assertEqual(pool.stats()["buffers"], 1)
+
+    def test_max_keys(self):
+        pool = RecvBufferPool(torch.device("cpu"), max_keys=2)
+        bufs = [pool.acquire((n,), torch.float32) for n in (1, 2, 3)]
+        pool.release(bufs[0])
+        pool.release(bufs[1])
+        # Key (1,) becomes the most recently used one
+        bufs[0] = pool.acquire((1,), torch.float32)
+        pool.release(bufs[0])
+        # Evicts key (2,)
+        pool.release(bufs[2])
+        self.assertEqual(pool.stats()["buffers"], 2)
+        self.assertIs(pool.acquire((1,), torch.float32), bufs[0])
+        self.assertIs(pool.acquire((3,), torch.float32), bufs[2])
+        misses = pool.misses
+        pool.acquire((2,), torch.float32)
+        self.assertEqual(pool.misses, misses + 1)
+
+
+class TestPackTensors(unittest.TestCase):
+    def test_round_trip(self):
+        tensors = [
+            torch.randn(3, 5),
+            torch.tensor(True),
+            torch.arange(7),
+            torch.empty(0, 4),
+            # Non-contiguous
+            torch.randn(2, 3).t(),
+            torch.randn(3, dtype=torch.float16),
+        ]
+        packed = pack_tensors(tensors)
+        self.assertEqual(packed.dtype, torch.uint8)
+        views = unpack_tensors(packed, [(t.shape, t.dtype) for t in tensors])
+        for t, v in zip(tensors, views):
+            self.assertEqual(v.dtype, t.dtype)
+            torch.testing.assert_close(v, t)
+
+    def test_views_share_packed_buffer(self):
+        packed = pack_tensors([torch.zeros(2), torch.zeros(3)])
+        views = unpack_tensors(
+            packed, [((2,), torch.float32), ((3,), torch.float32)]
+        )
+        packed.fill_(0)
+        views[1].fill_(1.0)
+        self.assertEqual(views[0].sum().item(), 0.0)
+        self.assertGreater(packed.sum().item(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
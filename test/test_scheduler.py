@@ -0,0 +1,396 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates
+import functools
+import types
+import unittest
+
+import torch
+
+from pippy.IR import Pipe, pipe_split, TrivialLossWrapper
+from pippy.PipelineDriver import (
+    _StaticSchedule,
+    CheckpointPolicy,
+    Phase,
+    PhasePriorityPolicy,
+    PipelineDriver1F1B,
+    PipelineDriverFillDrain,
+    PipeStageExecutor,
+    WorkItem,
+    WorkItemScheduler,
+)
+from pippy.PipelineStage import (
+    _interleaved_1f1b_order,
+    PipelineStageInterleaved1F1B,
+)
+
+
+def make_work_item(phase, microbatch_id, batch_id=0):
+    return WorkItem(
+        stage_id=0,
+        phase=phase,
+        args=(),
+        kwargs={},
+        future=None,
+        microbatch_id=microbatch_id,
+        blocked_args_count=0,
+        ready_args={},
+        batch_id=batch_id,
+        num_microbatches=8,
+    )
+
+
+def always(phase):
+    return True
+
+
+class TestWorkItemScheduler(unittest.TestCase):
+    def test_phase_priority(self):
+        sched = WorkItemScheduler()
+        sched.push("f0", make_work_item(Phase.FORWARD, 0))
+        sched.push("a0", make_work_item(Phase.ACCUMULATE_GRAD, 0))
+        sched.push("b0", make_work_item(Phase.BACKWARD, 0))
+        self.assertEqual(len(sched), 3)
+        order = [sched.pop(always)[0] for _ in range(3)]
+        self.assertEqual(order, ["b0", "a0", "f0"])
+        self.assertEqual(len(sched), 0)
+        self.assertIsNone(sched.pop(always))
+
+    def test_microbatch_order_within_phase(self):
+        sched = WorkItemScheduler()
+        for mb in [3, 1, 2, 0]:
+            sched.push(f"f{mb}", make_work_item(Phase.FORWARD, mb))
+        sched.push("f0_next", make_work_item(Phase.FORWARD, 0, batch_id=1))
+        order = [sched.pop(always)[0] for _ in range(5)]
+        self.assertEqual(order, ["f0", "f1", "f2", "f3", "f0_next"])
+
+    def test_blocked_phase_is_skipped(self):
+        sched = WorkItemScheduler()
+        sched.push("f0", make_work_item(Phase.FORWARD, 0))
+        no_forward = lambda phase: phase != Phase.FORWARD  # noqa: E731
+        self.assertIsNone(sched.pop(no_forward))
+        sched.push("b0", make_work_item(Phase.BACKWARD, 0))
+        self.assertEqual(sched.pop(no_forward)[0], "b0")
+        self.assertEqual(sched.pop(always)[0], "f0")
+
+    def test_custom_phase_order(self):
+        policy = PhasePriorityPolicy(
+            (
+                Phase.FORWARD,
+                Phase.BACKWARD,
+                Phase.ACCUMULATE_GRAD,
+                Phase.SYNC_BARRIER,
+            )
+        )
+        sched = WorkItemScheduler(policy)
+        sched.push("b0", make_work_item(Phase.BACKWARD, 0))
+        sched.push("f1", make_work_item(Phase.FORWARD, 1))
+        self.assertEqual(sched.pop(always)[0], "f1")
+
+        with self.assertRaises(ValueError):
+            PhasePriorityPolicy((Phase.FORWARD,))
+
+
+class ExampleCode(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.lin0 = torch.nn.Linear(4, 4)
+        self.lin1 = torch.nn.Linear(4, 4)
+
+    def forward(self, x):
+        x = self.lin0(x)
+        pipe_split()
+        return self.lin1(x)
+
+
+class TestStaticSchedule(unittest.TestCase):
+    def test_program_covers_graph(self):
+        pipe = Pipe.from_tracing(
+            TrivialLossWrapper(ExampleCode(), torch.nn.MSELoss())
+        )
+        node_list = list(pipe.split_gm.graph.nodes)
+        num_chunks = 5
+        program = _StaticSchedule._compile_program(node_list, num_chunks)
+
+        next_idx = [0] * num_chunks
+        for chunk, start, end, _ in program:
+            # Segments of a chunk are contiguous and in order
+            self.assertEqual(start, next_idx[chunk])
+            self.assertLess(start, end)
+            next_idx[chunk] = end
+        self.assertEqual(next_idx, [len(node_list)] * num_chunks)
+
+        # Ramp-up admits a diagonal wavefront: chunk 0 runs its first stage,
+        # then chunk 0 runs its second stage and chunk 1 its first one
+        stage_segments = [seg for seg in program if seg[1] > 0]
+        self.assertEqual([seg[0] for seg in stage_segments[:3]], [0, 0, 1])
+
+
+class RecordingExecutor:
+    stage_id = 0
+
+    def __init__(self):
+        self.calls = []
+
+    def invoke(self, key, *args, **kwargs):
+        self.calls.append(("invoke", key))
+
+    def coalesced_index_value(self, indices):
+        self.calls.append(("coalesced_index_value", len(indices)))
+
+
+class TestInvokeMany(unittest.TestCase):
+    def test_runs_calls_in_order(self):
+        executor = RecordingExecutor()
+        PipeStageExecutor.invoke_many(
+            executor,
+            [
+                ("invoke", ("0_submod_0",), {}),
+                ("coalesced_index_value", ([],), {}),
+                ("invoke", ("1_submod_0",), {"batch_id": 0}),
+            ],
+        )
+        self.assertEqual(
+            executor.calls,
+            [
+                ("invoke", "0_submod_0"),
+                ("coalesced_index_value", 0),
+                ("invoke", "1_submod_0"),
+            ],
+        )
+
+    def test_rejects_unknown_method(self):
+        with self.assertRaises(ValueError):
+            PipeStageExecutor.invoke_many(
+                RecordingExecutor(), [("get_value", (), {})]
+            )
+
+
+class TestFusedDispatch(unittest.TestCase):
+    def test_requires_static_schedule(self):
+        # Rejected before any RPC is made
+        pipe = Pipe.from_tracing(
+            TrivialLossWrapper(ExampleCode(), torch.nn.MSELoss())
+        )
+        for driver_cls in (PipelineDriverFillDrain, PipelineDriver1F1B):
+            with self.assertRaises(ValueError):
+                driver_cls(
+                    pipe,
+                    2,
+                    2,
+                    static_schedule=False,
+                    fused_dispatch=True,
+                )
+
+
+class TestCheckpointPolicy(unittest.TestCase):
+    def test_no_limit(self):
+        policy = CheckpointPolicy()
+        self.assertFalse(policy.should_checkpoint(0, 7, 7, 1 << 40, 1 << 40))
+
+    def test_max_stashed_microbatches(self):
+        policy = CheckpointPolicy(max_stashed_microbatches=2)
+        decisions = [
+            policy.should_checkpoint(0, mbid, min(mbid, 2), 0, 0)
+            for mbid in range(4)
+        ]
+        self.assertEqual(decisions, [False, False, True, True])
+
+    def test_activation_budget(self):
+        policy = CheckpointPolicy(activation_budget_bytes=100)
+        self.assertFalse(policy.should_checkpoint(0, 0, 0, 0, 60))
+        self.assertTrue(policy.should_checkpoint(0, 1, 1, 60, 60))
+        # A small stage still fits
+        self.assertFalse(policy.should_checkpoint(1, 1, 1, 60, 40))
+
+    def test_estimate_activation_bytes(self):
+        pipe = Pipe.from_tracing(ExampleCode())
+        executor = types.SimpleNamespace(
+            stage_id=0,
+            mod=pipe.split_gm.submod_0,
+            activation_bytes_cache={},
+        )
+        x = torch.randn(5, 4)
+        rng_state = torch.get_rng_state()
+        activation_bytes = PipeStageExecutor.estimate_activation_bytes(
+            executor, (x,), {}
+        )
+        # Shapes are propagated without running compute
+        self.assertTrue(torch.equal(rng_state, torch.get_rng_state()))
+        # One [5, 4] fp32 intermediate, the output of lin0
+        self.assertEqual(activation_bytes, 5 * 4 * 4)
+        self.assertEqual(
+            executor.activation_bytes_cache,
+            {(((5, 4), torch.float32),): activation_bytes},
+        )
+
+
+class TestInterleaved1F1BOrder(unittest.TestCase):
+    def check_order(self, num_ranks, num_virtual, chunks):
+        nstages = num_ranks * num_virtual
+        orders = [
+            _interleaved_1f1b_order(num_ranks, rank, num_virtual, chunks)
+            for rank in range(num_ranks)
+        ]
+        for order in orders:
+            # Every forward and backward runs exactly once, forward first
+            self.assertEqual(len(order), len(set(order)))
+            self.assertEqual(len(order), 2 * num_virtual * chunks)
+            for is_forward, v, chunk in order:
+                if not is_forward:
+                    self.assertLess(
+                        order.index((True, v, chunk)),
+                        order.index((False, v, chunk)),
+                    )
+
+        # Simulate the ranks with asynchronous sends and blocking receives:
+        # the schedule must not deadlock
+        done = set()
+        next_op = [0] * num_ranks
+        progress = True
+        while progress:
+            progress = False
+            for rank, order in enumerate(orders):
+                if next_op[rank] == len(order):
+                    continue
+                is_forward, v, chunk = order[next_op[rank]]
+                stage = rank + v * num_ranks
+                if is_forward:
+                    deps = [(True, stage - 1, chunk)] if stage > 0 else []
+                else:
+                    deps = [(True, stage, chunk)]
+                    if stage < nstages - 1:
+                        deps.append((False, stage + 1, chunk))
+                if all(dep in done for dep in deps):
+                    done.add((is_forward, stage, chunk))
+                    next_op[rank] += 1
+                    progress = True
+        self.assertEqual(next_op, [len(order) for order in orders])
+
+    def test_orders(self):
+        for num_ranks, num_virtual, chunks in [
+            (2, 2, 2),
+            (2, 2, 8),
+            (4, 2, 4),
+            (4, 2, 8),
+            (4, 3, 12),
+            (3, 4, 6),
+        ]:
+            with self.subTest(
+                num_ranks=num_ranks, num_virtual=num_virtual, chunks=chunks
+            ):
+                self.check_order(num_ranks, num_virtual, chunks)
+
+    def check_p2p_order(self, num_ranks, num_virtual, chunks, overlap_p2p):
+        nstages = num_ranks * num_virtual
+        # Messages between each pair of ranks, as (is_grad, src stage, dst
+        # stage, chunk), in the order they are sent and their recvs posted
+        sends = {}
+        recvs = {}
+
+        def post(peer, rank, *msg):
+            recvs.setdefault((peer, rank), []).append(msg)
+            return [msg]
+
+        def send(rank, peer, *msg):
+            sends.setdefault((rank, peer), []).append(msg)
+
+        def make_stage(rank, stage_index):
+            stage = types.SimpleNamespace(
+                pending_act_recvs={}, pending_grad_recvs={}
+            )
+            prev_rank = (stage_index - 1) % num_ranks
+            next_rank = (stage_index + 1) % num_ranks
+
+            def post_act_recvs(chunk):
+                if stage_index == 0:
+                    return []
+                return post(prev_rank, rank, False, stage_index - 1, chunk)
+
+            def post_grad_recvs(chunk):
+                if stage_index == nstages - 1:
+                    return []
+                return post(next_rank, rank, True, stage_index + 1, chunk)
+
+            def forward_one_chunk(chunk):
+                # Posts the recvs unless prefetched, as `_take_recvs`
+                if stage.pending_act_recvs.pop(chunk, None) is None:
+                    post_act_recvs(chunk)
+                if stage_index < nstages - 1:
+                    send(rank, next_rank, False, stage_index, chunk)
+
+            def backward_one_chunk(chunk):
+                if stage.pending_grad_recvs.pop(chunk, None) is None:
+                    post_grad_recvs(chunk)
+                if stage_index > 0:
+                    send(rank, prev_rank, True, stage_index, chunk)
+
+            stage.__dict__.update(
+                _post_act_recvs=post_act_recvs,
+                _post_grad_recvs=post_grad_recvs,
+                forward_one_chunk=forward_one_chunk,
+                backward_one_chunk=backward_one_chunk,
+                clear_runtime_states=lambda: None,
+                wait_sends=lambda: None,
+                log_step_timing=lambda: None,
+                is_last=lambda: stage_index == nstages - 1,
+                merge_output_chunks=lambda: None,
+            )
+            return stage
+
+        for rank in range(num_ranks):
+            runtime = types.SimpleNamespace(
+                stages=[
+                    make_stage(rank, stage_index)
+                    for stage_index in range(rank, nstages, num_ranks)
+                ],
+                order=_interleaved_1f1b_order(
+                    num_ranks, rank, num_virtual, chunks
+                ),
+                overlap_p2p=overlap_p2p,
+                _takes_inputs=lambda stage: False,
+            )
+            runtime._prefetch_recvs = functools.partial(
+                PipelineStageInterleaved1F1B._prefetch_recvs, runtime
+            )
+            PipelineStageInterleaved1F1B.forward(runtime)
+
+        # NCCL matches sends and recvs between two ranks in order
+        self.assertEqual(sends, recvs)
+
+    def test_p2p_order(self):
+        for num_ranks, num_virtual, chunks in [
+            (2, 2, 4),
+            (2, 2, 8),
+            (4, 2, 8),
+            (4, 3, 12),
+            (3, 4, 6),
+        ]:
+            for overlap_p2p in (False, True):
+                with self.subTest(
+                    num_ranks=num_ranks,
+                    num_virtual=num_virtual,
+                    chunks=chunks,
+                    overlap_p2p=overlap_p2p,
+                ):
+                    self.check_p2p_order(
+                        num_ranks, num_virtual, chunks, overlap_p2p
+                    )
+
+    def test_forward_only(self):
+        order = _interleaved_1f1b_order(2, 0, 2, 4, has_backward=False)
+        self.assertEqual(
+            order,
+            [
+                (True, 0, 0),
+                (True, 0, 1),
+                (True, 1, 0),
+                (True, 1, 1),
+                (True, 0, 2),
+                (True, 0, 3),
+                (True, 1, 2),
+                (True, 1, 3),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()